@@ -0,0 +1,344 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Batch engine for parsing directories with nasl scripts under per-file budgets"""
+
+import os
+import time
+import signal
+import logging
+import threading
+from contextlib import contextmanager
+
+from pynasl import nasllex
+from pynasl.naslparse import naslparse_string
+from pynasl.naslAST import iter_child_nodes
+from pynasl.exceptions import BudgetExceeded, LexicalError
+
+
+logger = logging.getLogger("batch")
+logger.setLevel(logging.INFO)
+
+
+class Budget(object):
+    """Resource limits for processing one file. None means no limit.
+
+    @ivar max_time: wall time in seconds for lexing and parsing
+    @ivar max_tokens: number of tokens
+    @ivar max_nodes: number of AST nodes
+    @ivar max_depth: nesting depth of AST
+    """
+
+    def __init__(self, max_time=None, max_tokens=None, max_nodes=None, max_depth=None):
+        self.max_time = max_time
+        self.max_tokens = max_tokens
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+
+
+class BatchHooks(object):
+    """Base class for BatchParser hooks. All methods do nothing,
+    subclasses override those they need.
+    """
+
+    def file_started(self, name, full_path, size):
+        """Called before file with size bytes is parsed"""
+
+    def file_parsed(self, name, tokens, nodes):
+        """Called after file is parsed. nodes is None if tree wasn't walked"""
+
+    def stage_finished(self, name, stage, elapsed):
+        """Called when stage ('lex', 'parse' or stage name given to
+        BatchParser.stage) of file processing took elapsed seconds
+        """
+
+    def file_skipped(self, name, error):
+        """Called when file is skipped because of BudgetExceeded error"""
+
+    def file_failed(self, name, error):
+        """Called when file is skipped because of parsing error
+        (only if BatchParser skips errors)
+        """
+
+    def file_finished(self, name):
+        """Called after all stages of file processing"""
+
+
+class _BudgetLexer(object):
+    """Lexer wrapper counting tokens and checking deadline while parser pulls tokens.
+    If timed is True it also measures time spent in lexer.
+    """
+
+    # how often (in tokens) deadline is checked when SIGALRM can't be used
+    _check_interval = 256
+
+    def __init__(self, lexer, budget, deadline, timed=False):
+        self.lexer = lexer
+        self.budget = budget
+        self.deadline = deadline
+        self.tokens = 0
+        self.elapsed = 0.0
+        if timed:
+            self.token = self._timed_token
+
+    def input(self, data):
+        self.lexer.lineno = 1
+        self.lexer.input(data)
+
+    def token(self):
+        tok = self.lexer.token()
+        if tok is not None:
+            self.tokens += 1
+            if self.budget.max_tokens is not None and self.tokens > self.budget.max_tokens:
+                raise BudgetExceeded('tokens', self.tokens)
+            if self.deadline is not None and self.tokens % self._check_interval == 0 \
+                    and time.time() > self.deadline:
+                raise BudgetExceeded('time', '%.2fs' % self.budget.max_time)
+        return tok
+
+    def _timed_token(self):
+        start = time.time()
+        try:
+            return _BudgetLexer.token(self)
+        finally:
+            self.elapsed += time.time() - start
+
+
+def _on_alarm(signum, frame):
+    raise BudgetExceeded('time', 'alarm')
+
+
+def _can_use_alarm():
+    return hasattr(signal, 'setitimer') and \
+        threading.current_thread().name == 'MainThread'
+
+
+def check_tree(tree, budget):
+    """Walk tree without recursion and raise BudgetExceeded if it has
+    more nodes or deeper nesting than budget allows
+
+    @return: tuple (number of nodes, depth of tree)
+    """
+    nodes = 0
+    max_depth = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, depth = stack.pop()
+        nodes += 1
+        if depth > max_depth:
+            max_depth = depth
+        if budget.max_nodes is not None and nodes > budget.max_nodes:
+            raise BudgetExceeded('nodes', nodes)
+        if budget.max_depth is not None and depth > budget.max_depth:
+            raise BudgetExceeded('depth', depth)
+        stack.extend((child, depth + 1) for child in iter_child_nodes(node))
+
+    return nodes, max_depth
+
+
+class BatchParser(object):
+    """Parse nasl scripts one by one, each one under the same Budget.
+
+    Scripts exceeding the budget are logged and recorded in skipped instead of
+    blocking the whole walk. Every step of file processing is reported to hooks.
+
+    @ivar budget: Budget applied to every file
+    @ivar hooks: list of BatchHooks
+    @ivar skipped: list of (file name, reason) for skipped files
+    @ivar failed: list of (file name, error) for files with parsing errors
+    @ivar total_files: number of successfully processed files
+    """
+
+    def __init__(self, budget=None, debugging_script=True, hooks=None, skip_errors=False,
+                 arena=None):
+        """
+        @param debugging_script: True, that means syntax errors are printed
+            and parsing is continued, see naslparse_string
+        @param skip_errors: True, that means files with lexical or syntax errors
+            are logged, recorded in failed and skipped instead of stopping the
+            walk. It implies debugging_script=False, otherwise syntax errors
+            are never raised
+        @param arena: pynasl.hashcons.HashConsArena for sharing equal subtrees
+            of all parsed files
+        """
+        self.budget = budget or Budget()
+        self.debugging_script = debugging_script and not skip_errors
+        self.arena = arena
+        self.hooks = hooks or []
+        self.skip_errors = skip_errors
+        self.skipped = []
+        self.failed = []
+        self.total_files = 0
+        self._lexer = nasllex.lexer.clone()
+        self._file_name = None
+
+    def _notify(self, event, *args):
+        for hook in self.hooks:
+            getattr(hook, event)(*args)
+
+    def parse_string(self, s):
+        """Parse string with nasl script, raise BudgetExceeded if budget is exceeded"""
+        max_time = self.budget.max_time
+        deadline = None
+        use_alarm = False
+        if max_time is not None:
+            deadline = time.time() + max_time
+            use_alarm = _can_use_alarm()
+
+        lexer = _BudgetLexer(self._lexer, self.budget, deadline, bool(self.hooks))
+
+        if use_alarm:
+            prev_handler = signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, max_time)
+        start = time.time()
+        try:
+            tree = naslparse_string(s, self.debugging_script, lexer)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, prev_handler)
+
+        if self.hooks:
+            elapsed = time.time() - start
+            self._notify('stage_finished', self._file_name, 'lex', lexer.elapsed)
+            self._notify('stage_finished', self._file_name, 'parse', elapsed - lexer.elapsed)
+
+        nodes = None
+        if tree is not None and (self.hooks or self.budget.max_nodes is not None or
+                                 self.budget.max_depth is not None):
+            nodes, depth = check_tree(tree, self.budget)
+
+        self._notify('file_parsed', self._file_name, lexer.tokens, nodes)
+
+        if self.arena is not None:
+            tree = self.arena.intern(tree)
+
+        return tree
+
+    def parse(self, full_path):
+        """Parse nasl script, raise BudgetExceeded if budget is exceeded"""
+        with open(full_path) as script:
+            return self.parse_string(script.read())
+
+    @contextmanager
+    def stage(self, stage):
+        """Context manager for measuring stage of current file processing,
+        e.g. visiting of parsed tree:
+
+            for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+                with batch.stage('NaslStatistic'):
+                    stat.visit(tree)
+        """
+        if not self.hooks:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._notify('stage_finished', self._file_name, stage, time.time() - start)
+
+    def process(self, paths):
+        """Generate (file name, full path, AST) for scripts with paths"""
+        for full_path in paths:
+            name = os.path.basename(full_path)
+            self._file_name = name
+            if self.hooks:
+                self._notify('file_started', name, full_path, os.path.getsize(full_path))
+
+            try:
+                tree = self.parse(full_path)
+            except BudgetExceeded, why:
+                logger.warning("Skipped %s: %s" % (name, why))
+                self.skipped.append((name, str(why)))
+                self._notify('file_skipped', name, why)
+                continue
+            except (LexicalError, SyntaxError), why:
+                if not self.skip_errors:
+                    raise
+                logger.error("Failed %s: %r" % (name, why))
+                self.failed.append((name, why))
+                self._notify('file_failed', name, why)
+                continue
+
+            yield name, full_path, tree
+
+            self._notify('file_finished', name)
+            self.total_files += 1
+            if self.total_files % 1000 == 0:
+                logger.info("Processed %s files" % self.total_files)
+
+        self._file_name = None
+
+    def walk(self, top, accept):
+        """Generate (file name, full path, AST) for scripts in directory tree
+
+        @param top: string with path to directory with nasl scripts
+        @param accept: tuple of file extensions or function that takes file name
+            and returns True if the file must be processed
+        """
+        if isinstance(accept, tuple):
+            extensions = accept
+            accept = lambda name: name.endswith(extensions)
+
+        def paths():
+            for root, dirs, files in os.walk(top):
+                for name in files:
+                    if accept(name):
+                        yield os.path.join(root, name)
+
+        for result in self.process(paths()):
+            yield result
+
+        if self.skipped:
+            logger.warning("%s files were skipped because of budget" % len(self.skipped))
+
+
+def update_index(top, indexed, remove, add, stage, budget=None, hooks=None,
+                 extensions=('.nasl', '.inc')):
+    """Synchronize index of scripts with directory tree. Scripts are compared
+    by (mtime, size), removed scripts are removed from index, new and modified
+    ones are parsed and added to index
+
+    @param top: string with path to directory with nasl scripts
+    @param indexed: dictionary file name => (mtime, size) of indexed scripts
+    @param remove: function that takes file name and removes it from index
+    @param add: function that takes file name, full path, AST and (mtime, size)
+        and adds file to index. Files that can't be parsed are added with
+        AST None, so they aren't parsed again until they are changed
+    @param stage: name of stage of add() reported to hooks
+    @param budget: Budget with per-file limits
+    @param hooks: list of BatchHooks
+    @param extensions: tuple of extensions of indexed files
+    @return: set of names of added, modified and removed files
+    """
+    stats = {}
+    paths = {}
+    for root, dirs, files in os.walk(top):
+        for name in files:
+            if name.endswith(extensions):
+                full_path = os.path.join(root, name)
+                stat = os.stat(full_path)
+                stats[name] = (stat.st_mtime, stat.st_size)
+                paths[name] = full_path
+
+    changed = set(name for name in indexed if name not in stats)
+    for name in changed:
+        remove(name)
+
+    modified = [name for name, stat in stats.iteritems() if indexed.get(name) != stat]
+    changed.update(modified)
+
+    batch = BatchParser(budget, debugging_script=False, hooks=hooks, skip_errors=True)
+    for name, full_path, tree in batch.process(sorted(paths[name] for name in modified)):
+        with batch.stage(stage):
+            add(name, full_path, tree, stats[name])
+
+    for name, error in batch.skipped + batch.failed:
+        add(name, paths[name], None, stats[name])
+
+    return changed
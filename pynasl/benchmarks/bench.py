@@ -0,0 +1,251 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Benchmarks of pynasl pipeline stages on synthetic corpus.
+
+Results are stored as JSON. Stored results can be used as baseline, stage is
+regressed when its time exceeds baseline time multiplied by baseline threshold.
+"""
+
+import sys
+import time
+import json
+import logging
+import platform
+
+from pynasl import nasllex
+from pynasl.naslAST import BaseNodeVisitor
+from pynasl.naslparse import naslparse_string
+from pynasl.benchmarks.generator import ScriptGenerator
+
+
+logger = logging.getLogger("bench")
+logger.setLevel(logging.INFO)
+
+
+# default allowed slowdown of stage compared with baseline
+DEFAULT_THRESHOLD = 1.25
+
+
+def _parse_all(corpus):
+    return [(name, naslparse_string(source, True)) for name, source in corpus]
+
+
+def bench_lex(corpus):
+    lexer = nasllex.lexer.clone()
+    for name, source in corpus:
+        lexer.input(source)
+        while lexer.token():
+            pass
+
+
+def bench_parse(corpus):
+    _parse_all(corpus)
+
+
+def bench_visit(trees):
+    visitor = BaseNodeVisitor()
+    for name, tree in trees:
+        visitor.visit(tree)
+
+
+def bench_ast2py(trees):
+    from pynasl.visitors.ast2py.translator import Translator
+    from pynasl.visitors.constfold import fold_constants
+
+    # the same steps as ast2py_str
+    for name, tree in trees:
+        if name.endswith('.nasl'):
+            Translator().visit(fold_constants(tree))
+
+
+def bench_statistic(trees):
+    from pynasl.visitors.statistic.statistic import NaslStatistic
+
+    stat = NaslStatistic()
+    for name, tree in trees:
+        stat.preprocess_file(name)
+        stat.visit(tree)
+    stat.finalize_calculations()
+
+
+def bench_callgraph(trees):
+    from pynasl.visitors.callgraph.callgraph import CallGraph
+
+    call_graph = CallGraph()
+    for name, tree in trees:
+        call_graph.set_caller_func(name)
+        call_graph.set_file_name(name)
+        call_graph.visit(tree)
+
+
+# stage name => (function, function takes parsed trees, stage modifies trees)
+STAGES = (
+    ('lex', bench_lex, False, False),
+    ('parse', bench_parse, False, False),
+    ('visit', bench_visit, True, False),
+    ('ast2py', bench_ast2py, True, True),
+    ('statistic', bench_statistic, True, False),
+    ('callgraph', bench_callgraph, True, False),
+)
+
+
+def run_benchmarks(generator, scripts=200, inc_files=10, repeat=3, stages=None):
+    """Run benchmarks for pipeline stages on corpus from generator
+
+    @param generator: ScriptGenerator
+    @param scripts: number of *.nasl scripts in corpus
+    @param inc_files: number of *.inc scripts in corpus
+    @param repeat: every stage is run repeat times, the best time is taken
+    @param stages: list of stage names to run. Default value - None, that means all stages
+    @return dictionary with results which can be saved as JSON
+    """
+    corpus = generator.corpus(scripts, inc_files)
+    total_bytes = sum(len(source) for name, source in corpus)
+
+    results = {
+        'python': platform.python_version(),
+        'corpus': {'seed': generator.seed,
+                   'scripts': scripts,
+                   'inc_files': inc_files,
+                   'statements': generator.statements,
+                   'nesting': generator.nesting,
+                   'description_lines': generator.description_lines,
+                   'includes': generator.includes,
+                   'literal_size': generator.literal_size,
+                   'bytes': total_bytes},
+        'stages': {},
+    }
+
+    trees = None
+    for name, func, use_trees, modifies_trees in STAGES:
+        if stages is not None and name not in stages:
+            continue
+
+        best = None
+        for i in range(repeat):
+            if use_trees and (trees is None or modifies_trees):
+                trees = _parse_all(corpus)
+            arg = trees if use_trees else corpus
+
+            start = time.time()
+            func(arg)
+            elapsed = time.time() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        if modifies_trees:
+            trees = None
+
+        results['stages'][name] = {'time': best,
+                                   'files_per_sec': len(corpus) / best if best else None,
+                                   'bytes_per_sec': total_bytes / best if best else None,
+                                   'threshold': DEFAULT_THRESHOLD}
+        logger.info("%-10s %8.3fs" % (name, best))
+
+    return results
+
+
+def bench_memory(corpus):
+    """Measure memory of all parsed trees with and without hash-consing
+
+    @return dictionary with results which can be saved as JSON
+    """
+    from pynasl.hashcons import HashConsArena
+    from pynasl.memusage import memory_report
+
+    plain = memory_report(tree for name, tree in _parse_all(corpus))
+
+    arena = HashConsArena()
+    trees = [naslparse_string(source, True, arena=arena) for name, source in corpus]
+    shared = memory_report(trees)
+
+    return {'plain_bytes': plain.total_bytes,
+            'hashcons_bytes': shared.total_bytes,
+            'memory_ratio': float(plain.total_bytes) / shared.total_bytes,
+            'total_nodes': arena.total_nodes,
+            'unique_nodes': len(arena),
+            'dedup_ratio': arena.dedup_ratio}
+
+
+def compare(results, baseline):
+    """Compare results with baseline
+
+    @return list of (stage name, baseline time, current time) for regressed stages
+    """
+    regressions = []
+    for name, stage in results['stages'].iteritems():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        threshold = base.get('threshold', DEFAULT_THRESHOLD)
+        if stage['time'] > base['time'] * threshold:
+            regressions.append((name, base['time'], stage['time']))
+    return regressions
+
+
+def save_results(results, file_name):
+    with open(file_name, 'w') as result_file:
+        json.dump(results, result_file, indent=2, sort_keys=True)
+
+
+def load_results(file_name):
+    with open(file_name) as result_file:
+        return json.load(result_file)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scripts', type=int, default=200)
+    parser.add_argument('--inc-files', type=int, default=10)
+    parser.add_argument('--statements', type=int, default=40)
+    parser.add_argument('--nesting', type=int, default=3)
+    parser.add_argument('--description-lines', type=int, default=10)
+    parser.add_argument('--includes', type=int, default=3)
+    parser.add_argument('--literal-size', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stage', action='append', dest='stages',
+                        help='run only this stage, can be used several times')
+    parser.add_argument('--memory', action='store_true',
+                        help='measure memory of parsed corpus with and without hash-consing')
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--baseline', help='compare results with this JSON file')
+    args = parser.parse_args(argv)
+
+    generator = ScriptGenerator(seed=args.seed,
+                                statements=args.statements,
+                                nesting=args.nesting,
+                                description_lines=args.description_lines,
+                                includes=args.includes,
+                                literal_size=args.literal_size)
+    results = run_benchmarks(generator, args.scripts, args.inc_files, args.repeat, args.stages)
+
+    if args.memory:
+        results['memory'] = bench_memory(generator.corpus(args.scripts, args.inc_files))
+        logger.info("Hash-consing: %(plain_bytes)s => %(hashcons_bytes)s bytes, "
+                    "dedup ratio %(dedup_ratio).2f" % results['memory'])
+
+    if args.output:
+        save_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline))
+        for name, base_time, cur_time in regressions:
+            logger.error("Stage %s regressed: %.3fs -> %.3fs" % (name, base_time, cur_time))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    sys.exit(main())
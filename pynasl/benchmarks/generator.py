@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Deterministic generator of synthetic nasl scripts for benchmarks"""
+
+import os
+import random
+from hashlib import md5
+
+
+_WORDS = ('apache', 'http', 'server', 'version', 'detect', 'remote', 'host',
+          'overflow', 'banner', 'request', 'response', 'port', 'service',
+          'vulnerable', 'update', 'patch', 'module', 'proxy', 'windows', 'linux')
+
+_BUILTINS = ('get_kb_item', 'get_port_state', 'http_get', 'recv', 'send',
+             'egrep', 'eregmatch', 'strlen', 'string', 'display')
+
+
+class ScriptGenerator(object):
+    """Generator of synthetic *.nasl and *.inc scripts.
+
+    The same seed and parameters always give the same scripts.
+
+    @ivar seed: seed of random generator
+    @ivar statements: number of top level statements in *.nasl script body
+    @ivar nesting: maximal nesting depth of if/for/while blocks
+    @ivar description_lines: number of concatenated lines in script description
+    @ivar includes: number of include() in every *.nasl script (include fan-in)
+    @ivar literal_size: length of string literals
+    @ivar inc_functions: number of function declarations in every *.inc file
+    """
+
+    def __init__(self, seed=0, statements=40, nesting=3, description_lines=10,
+                 includes=3, literal_size=30, inc_functions=10):
+        self.seed = seed
+        self.statements = statements
+        self.nesting = nesting
+        self.description_lines = description_lines
+        self.includes = includes
+        self.literal_size = literal_size
+        self.inc_functions = inc_functions
+
+    def _random(self, kind, index):
+        # string seed is hashed with hash(), which depends on PYTHONHASHSEED
+        key = '%s:%s:%s' % (self.seed, kind, index)
+        return random.Random(int(md5(key).hexdigest(), 16))
+
+    def _literal(self, rnd, size=None):
+        size = size or self.literal_size
+        words = []
+        length = 0
+        while length < size:
+            word = rnd.choice(_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return '"%s"' % ' '.join(words)[:size]
+
+    def _expr(self, rnd, variables):
+        kind = rnd.randint(0, 3)
+        if kind == 0:
+            return str(rnd.randint(0, 65535))
+        elif kind == 1:
+            return self._literal(rnd)
+        elif kind == 2 and variables:
+            return '%s + %s' % (rnd.choice(variables), rnd.randint(1, 100))
+        else:
+            return '%s(%s)' % (rnd.choice(_BUILTINS), self._literal(rnd, 10))
+
+    def _block(self, rnd, count, depth, functions, variables, indent):
+        lines = []
+        pad = '  ' * indent
+        for i in range(count):
+            kind = rnd.randint(0, 5)
+            if depth < self.nesting and kind == 0:
+                lines.append('%sif (%s) {' % (pad, self._expr(rnd, variables)))
+                lines.extend(self._block(rnd, 3, depth + 1, functions, variables, indent + 1))
+                lines.append('%s} else {' % pad)
+                lines.extend(self._block(rnd, 2, depth + 1, functions, variables, indent + 1))
+                lines.append('%s}' % pad)
+            elif depth < self.nesting and kind == 1:
+                var = 'i%s' % depth
+                lines.append('%sfor (%s = 0; %s < %s; %s++) {' %
+                             (pad, var, var, rnd.randint(2, 10), var))
+                lines.extend(self._block(rnd, 3, depth + 1, functions, variables + [var], indent + 1))
+                lines.append('%s}' % pad)
+            elif depth < self.nesting and kind == 2:
+                lines.append('%swhile (%s) {' % (pad, self._expr(rnd, variables)))
+                lines.extend(self._block(rnd, 2, depth + 1, functions, variables, indent + 1))
+                lines.append('%s  break;' % pad)
+                lines.append('%s}' % pad)
+            elif functions and kind == 3:
+                lines.append('%sres = %s(data:%s, port:%s);' %
+                             (pad, rnd.choice(functions), self._literal(rnd), rnd.randint(1, 65535)))
+            elif variables and kind == 4:
+                lines.append('%sset_kb_item(name:"www/" + %s + "/%s", value:%s);' %
+                             (pad, rnd.choice(variables), rnd.choice(_WORDS), self._expr(rnd, variables)))
+            else:
+                var = 'v%s' % rnd.randint(0, 20)
+                lines.append('%s%s = %s;' % (pad, var, self._expr(rnd, variables)))
+                variables = variables + [var]
+        return lines
+
+    def inc_name(self, index):
+        return 'bench_func_%s.inc' % index
+
+    def inc_function_names(self, index):
+        return ['bench_%s_%s' % (index, i) for i in range(self.inc_functions)]
+
+    def include(self, index):
+        """Return source of *.inc script with index"""
+        rnd = self._random('inc', index)
+        lines = []
+        for name in self.inc_function_names(index):
+            lines.append('function %s(data, port) {' % name)
+            lines.append('  local_var res, v0;')
+            lines.extend(self._block(rnd, 5, 1, [], ['data', 'port'], 1))
+            lines.append('  return res;')
+            lines.append('}')
+            lines.append('')
+        return '\n'.join(lines)
+
+    def script(self, index, inc_count=0):
+        """Return source of *.nasl script with index
+
+        @param inc_count: number of available *.inc files
+        """
+        rnd = self._random('nasl', index)
+        lines = ['if (description)', '{',
+                 '  script_id(%s);' % (100000 + index),
+                 '  script_version("$Revision: 1.%s $");' % rnd.randint(1, 99),
+                 '  script_name(%s);' % self._literal(rnd)]
+        desc = ' +\n         '.join([self._literal(rnd) for i in range(self.description_lines)])
+        lines.append('  desc = %s;' % (desc or '""'))
+        lines.extend(['  script_description(desc);',
+                      '  script_summary(%s);' % self._literal(rnd),
+                      '  script_category(ACT_GATHER_INFO);',
+                      '  script_family("Service detection");',
+                      '  script_dependencies("find_service.nes", "bench_%s.nasl");' % rnd.randint(0, 1000),
+                      '  script_require_ports("Services/www", 80);',
+                      '  exit(0);', '}', ''])
+
+        functions = []
+        if inc_count:
+            for inc_index in rnd.sample(range(inc_count), min(self.includes, inc_count)):
+                lines.append('include("%s");' % self.inc_name(inc_index))
+                functions.extend(self.inc_function_names(inc_index))
+            lines.append('')
+
+        lines.append('port = get_kb_item("Services/www");')
+        lines.extend(self._block(rnd, self.statements, 0, functions, ['port'], 0))
+        return '\n'.join(lines) + '\n'
+
+    def corpus(self, scripts, inc_files):
+        """Return list of (file name, source) with inc_files *.inc and scripts *.nasl"""
+        files = [(self.inc_name(i), self.include(i)) for i in range(inc_files)]
+        files.extend(('bench_%s.nasl' % i, self.script(i, inc_files)) for i in range(scripts))
+        return files
+
+    def write_corpus(self, path, scripts, inc_files):
+        """Write corpus into directory path"""
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for name, source in self.corpus(scripts, inc_files):
+            with open(os.path.join(path, name), 'w') as script:
+                script.write(source)
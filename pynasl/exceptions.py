@@ -9,4 +9,16 @@ class LexicalError(Exception):
     An Exception indicating a lexical error in script.
     """
     pass
+
+
+class BudgetExceeded(Exception):
+    """
+    An Exception indicating that processing of script exceeded its resource budget.
     
+    @ivar limit: name of exceeded limit
+    @ivar value: value that exceeded the limit
+    """
+    def __init__(self, limit, value):
+        Exception.__init__(self, "%s limit exceeded (%s)" % (limit, value))
+        self.limit = limit
+        self.value = value
@@ -0,0 +1,87 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Hash-consing of AST: structurally equal subtrees of all parsed scripts
+are stored only once.
+
+    arena = HashConsArena()
+    trees = [naslparser(path, arena=arena) for path in paths]
+
+Interned nodes are shared between trees, so they must never be changed.
+Analyses that keep data keyed by node identity (positions, symbol tables)
+need trees parsed without arena.
+"""
+
+from pynasl.naslAST import Node, iter_child_nodes, _node_digest
+
+
+class HashConsArena(object):
+    """Storage of unique immutable subtrees
+
+    @ivar nodes: dictionary structural hash => canonical node
+    @ivar strings: dictionary string => canonical string
+    @ivar total_nodes: number of interned nodes (including duplicates)
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.strings = {}
+        self.total_nodes = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def dedup_ratio(self):
+        """Number of interned nodes per stored node"""
+        if not self.nodes:
+            return 1.0
+        return float(self.total_nodes) / len(self.nodes)
+
+    def _string(self, value):
+        return self.strings.setdefault(value, value)
+
+    def _canonical_field(self, value, canonical):
+        if isinstance(value, Node):
+            return canonical[id(value)]
+        elif isinstance(value, basestring):
+            return self._string(value)
+        return value
+
+    def intern(self, tree):
+        """Return canonical tree equal to tree. Nodes of tree are reused for
+        subtrees that weren't stored in arena before, so tree must be fresh
+        (not referenced by anything else).
+        """
+        if tree is None:
+            return None
+
+        # id of fresh node => canonical node
+        canonical = {}
+        stack = [(tree, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in iter_child_nodes(node))
+                continue
+
+            for field_name in node.__slots__:
+                value = getattr(node, field_name)
+                if isinstance(value, list):
+                    value[:] = [self._canonical_field(elem, canonical) for elem in value]
+                else:
+                    setattr(node, field_name, self._canonical_field(value, canonical))
+
+            digest = _node_digest(node)
+            self.total_nodes += 1
+            existing = self.nodes.get(digest)
+            if existing is None:
+                node._hash = digest
+                self.nodes[digest] = existing = node
+            canonical[id(node)] = existing
+
+        return canonical[id(tree)]
@@ -0,0 +1,177 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Persistent index of include dependencies between nasl scripts.
+
+Index keeps includes of every *.nasl and *.inc file and reverse edges
+(dependents). It is updated incrementally: only files with changed
+modification time or size are parsed again. For changed include files it
+gives the set of plugins which must be analysed again:
+
+    graph = IncludeGraph.load('includes.idx')
+    changed = graph.update(plugins_dir)
+    graph.save('includes.idx')
+    plugins = graph.affected(changed)
+
+Files are identified by file name, as in include("http_func.inc").
+"""
+
+import os
+import cPickle
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor
+
+
+logger = logging.getLogger("includegraph")
+logger.setLevel(logging.INFO)
+
+
+class _IncludesCollector(BaseNodeVisitor):
+
+    def __init__(self):
+        self.includes = []
+
+    def visit_Include(self, node):
+        name = node.filename[1:-1]
+        if name not in self.includes:
+            self.includes.append(name)
+
+
+class IncludeGraph(object):
+    """Include dependency graph
+
+    @ivar files: dictionary file name => (modification time, size) of indexed file
+    @ivar includes: dictionary file name => tuple of names of directly included files
+    @ivar dependents: dictionary file name => set of names of files which include it directly
+    """
+
+    # version of saved index, indexes of other versions are rebuilt
+    VERSION = 1
+
+    def __init__(self):
+        self.files = {}
+        self.includes = {}
+        self.dependents = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def set_includes(self, name, includes):
+        """Replace includes of file name"""
+        for inc in self.includes.get(name, ()):
+            dependents = self.dependents.get(inc)
+            if dependents is not None:
+                dependents.discard(name)
+                if not dependents:
+                    del self.dependents[inc]
+
+        self.includes[name] = tuple(includes)
+        for inc in includes:
+            self.dependents.setdefault(inc, set()).add(name)
+
+    def remove(self, name):
+        """Remove file from index"""
+        self.set_includes(name, ())
+        del self.includes[name]
+        del self.files[name]
+
+    def update(self, plugins_dir, budget=None, hooks=None):
+        """Synchronize index with *.nasl and *.inc files in plugins_dir
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        @return set of names of added, changed and removed files
+        """
+        from pynasl.batch import update_index
+
+        def add(name, full_path, tree, stat):
+            collector = _IncludesCollector()
+            if tree is not None:
+                collector.visit(tree)
+            self.set_includes(name, collector.includes)
+            self.files[name] = stat
+
+        changed = update_index(plugins_dir, dict(self.files), self.remove, add,
+                               'IncludesCollector', budget, hooks)
+
+        logger.info("%s files indexed, %s changed" % (len(self.files), len(changed)))
+        return changed
+
+    def affected(self, names, plugins_only=True):
+        """Return set of files that include any of names directly or transitively
+
+        @param names: iterable with names of changed files
+        @param plugins_only: True, that means only *.nasl files are returned.
+            Changed files themselves are returned too
+        """
+        result = set(names)
+        pending = list(result)
+        while pending:
+            name = pending.pop()
+            for dependent in self.dependents.get(name, ()):
+                if dependent not in result:
+                    result.add(dependent)
+                    pending.append(dependent)
+
+        if plugins_only:
+            result = set(name for name in result if name.endswith('.nasl'))
+        return result
+
+    def unused(self):
+        """Return sorted list of *.inc files which aren't included anywhere"""
+        return sorted(name for name in self.files
+                      if name.endswith('.inc') and name not in self.dependents)
+
+    def missing(self):
+        """Return dictionary name of included file which isn't indexed => set of dependents"""
+        return dict((name, dependents) for name, dependents in self.dependents.iteritems()
+                    if name not in self.files)
+
+    def save(self, file_name):
+        data = {'version': self.VERSION,
+                'files': self.files,
+                'includes': self.includes}
+        with open(file_name, 'wb') as index_file:
+            cPickle.dump(data, index_file, cPickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_name):
+        """Load index saved with save(). Empty index is returned if file doesn't
+        exist or was saved by other version, so it is rebuilt by update()
+        """
+        graph = cls()
+        if not os.path.exists(file_name):
+            return graph
+
+        with open(file_name, 'rb') as index_file:
+            data = cPickle.load(index_file)
+        if data.get('version') != cls.VERSION:
+            logger.info("Index %s has other version and will be rebuilt" % file_name)
+            return graph
+
+        graph.files = data['files']
+        for name, includes in data['includes'].iteritems():
+            graph.set_includes(name, includes)
+        return graph
+
+
+def _log_affected(plugins_dir, index_file, changed_files):
+    graph = IncludeGraph.load(index_file)
+    changed = graph.update(plugins_dir)
+    graph.save(index_file)
+
+    affected = graph.affected(set(changed_files) | changed)
+    logger.info("%s plugins are affected" % len(affected))
+    logger.info("%s unused *.inc files" % len(graph.unused()))
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_affected(os.environ['KAFTI_NASLSCRIPTS_PATH'], 'includes.idx', sys.argv[1:])
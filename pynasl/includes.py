@@ -0,0 +1,182 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Resolution of include("x.inc") with shared cache of parsed include files.
+
+Thousands of plugins include the same http_func.inc or misc_func.inc. Cache
+keeps the recently used include files parsed together with tables of
+functions and globals they export, so every include file is parsed once per
+process no matter how many plugins include it:
+
+    includes = IncludeCache([plugins_dir])
+    for entry in includes.closure(['http_func.inc']):
+        ...
+    resolution = resolve(tree, includes)
+
+Cached trees are shared between all users, so they must never be changed.
+"""
+
+import os
+import logging
+from collections import OrderedDict
+
+from pynasl.exceptions import LexicalError, BudgetExceeded
+
+
+logger = logging.getLogger("includes")
+logger.setLevel(logging.INFO)
+
+
+class IncludeEntry(object):
+    """Parsed include file
+
+    @ivar name: name of include file as it is written in include()
+    @ivar path: full path to include file
+    @ivar tree: AST of include file
+    @ivar functions: dictionary function name => FuncDecl of functions declared in file
+    @ivar globals: dictionary name => declaring node of global variables of file
+    @ivar values: dictionary name => list of expressions assigned to global
+        variable with '=' outside of functions
+    @ivar includes: list of names of files included by file directly
+    """
+    __slots__ = ['name', 'path', 'tree', 'functions', 'globals', 'values', 'includes']
+
+    def __init__(self, name, path, tree):
+        from pynasl.visitors.resolver import DeclarationsCollector
+
+        collector = DeclarationsCollector()
+        collector.visit(tree)
+
+        self.name = name
+        self.path = path
+        self.tree = tree
+        self.functions = collector.functions
+        self.globals = collector.globals
+        self.values = collector.values
+        self.includes = collector.includes
+
+
+def include_closure(names, get_entry):
+    """Return list of IncludeEntry for names and all files included by them
+    transitively, in order of loading. Every file is returned once, so cyclic
+    includes are safe. Files which can't be loaded are skipped.
+
+    @param names: list of names of include files
+    @param get_entry: function which takes name and returns IncludeEntry or None
+    """
+    result = []
+    seen = set()
+    pending = list(reversed(names))
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+
+        entry = get_entry(name)
+        if entry is None:
+            continue
+        result.append(entry)
+        pending.extend(reversed(entry.includes))
+    return result
+
+
+class IncludeCache(object):
+    """LRU cache of parsed include files
+
+    Cache can be given to pynasl.visitors.resolver.resolve as includes.
+
+    @ivar hits: number of lookups of already parsed files
+    @ivar misses: number of lookups which required parsing or file search
+    """
+
+    def __init__(self, include_dirs, max_size=512, budget=None, metrics=None):
+        """
+        @param include_dirs: list of directories in which include files are searched
+        @param max_size: maximal number of parsed files in cache
+        @param budget: pynasl.batch.Budget with limits for parsing of include file
+        @param metrics: pynasl.metrics.Metrics, cache hits and misses are counted in it
+        """
+        from pynasl.batch import BatchParser
+
+        self.include_dirs = include_dirs
+        self.max_size = max_size
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self._batch = BatchParser(budget, debugging_script=False)
+        self._entries = OrderedDict()
+        # names of files that aren't found or can't be parsed
+        self._missing = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.metrics is not None:
+            self.metrics.cache_lookup('includes', hit)
+
+    def _find(self, name):
+        for include_dir in self.include_dirs:
+            path = os.path.join(include_dir, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def get(self, name):
+        """Return IncludeEntry for include file or None if it can't be loaded"""
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._entries[name] = entry
+            self._lookup(True)
+            return entry
+        if name in self._missing:
+            self._lookup(True)
+            return None
+
+        self._lookup(False)
+        path = self._find(name)
+        if path is None:
+            logger.debug("Include file %s isn't found" % name)
+            self._missing.add(name)
+            return None
+        try:
+            tree = self._batch.parse(path)
+        except (LexicalError, SyntaxError, BudgetExceeded), why:
+            logger.error("Include file %s can't be parsed: %r" % (name, why))
+            self._missing.add(name)
+            return None
+
+        entry = IncludeEntry(name, path, tree)
+        self._entries[name] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __call__(self, name):
+        """Return AST of include file or None"""
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return entry.tree
+
+    def closure(self, names):
+        """Return list of IncludeEntry for names and files included by them transitively"""
+        return include_closure(names, self.get)
+
+    def functions(self, names):
+        """Return dictionary function name => IncludeEntry with its declaration
+        for all functions available after including names
+        """
+        result = {}
+        for entry in self.closure(names):
+            for func_name in entry.functions:
+                result.setdefault(func_name, entry)
+        return result
@@ -0,0 +1,206 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Memory accounting of parsed AST.
+
+    report = memory_report(trees)
+    report.write(sys.stdout)
+
+trace_parse uses tracemalloc, it is optional (Python 3.4+ or pytracemalloc),
+without it scripts are parsed but allocations aren't traced.
+"""
+
+import sys
+from collections import defaultdict
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pynasl.naslAST import Node
+
+
+# leaf nodes which are identified by their value, so equal ones could be shared
+_LEAF_NODES = ('Atom', 'IpAddr', 'VarName', 'Include', 'BreakInstr', 'ContinueInstr', 'Empty')
+
+# node class => list of slots of class and all its bases
+_class_slots = {}
+
+
+def _slots(cls):
+    """Return list of slots of cls and of its bases (e.g. Node._hash), because
+    __slots__ of class lists only slots added by class itself
+    """
+    slots = _class_slots.get(cls)
+    if slots is None:
+        slots = _class_slots[cls] = [name for base in reversed(cls.__mro__)
+                                     for name in base.__dict__.get('__slots__', ())]
+    return slots
+
+
+class StringTable(object):
+    """Strings stored in one field of one node class (e.g. 'FuncCall.name')
+
+    @ivar count: number of references to strings
+    @ivar objects: number of string objects (not referenced by other tables before)
+    @ivar values: number of distinct string values
+    @ivar bytes: size of string objects (not referenced by other tables before)
+    """
+    __slots__ = ['count', 'objects', 'values', 'bytes', '_seen_values']
+
+    def __init__(self):
+        self.count = 0
+        self.objects = 0
+        self.values = 0
+        self.bytes = 0
+        self._seen_values = set()
+
+    def add(self, value, size, new_object):
+        self.count += 1
+        if new_object:
+            self.objects += 1
+            self.bytes += size
+        if value not in self._seen_values:
+            self._seen_values.add(value)
+            self.values += 1
+
+
+class MemoryReport(object):
+    """Memory used by AST nodes
+
+    @ivar classes: dictionary node class name => [instances, bytes]
+        (bytes include lists owned by nodes, but not strings)
+    @ivar strings: dictionary 'Class.field' => StringTable
+    @ivar total_bytes: size of all nodes, lists and strings
+    @ivar interning_savings: bytes saved if equal strings were interned
+    @ivar sharing_savings: bytes saved if equal leaf nodes were shared
+    """
+
+    def __init__(self):
+        self.classes = defaultdict(lambda: [0, 0])
+        self.strings = defaultdict(StringTable)
+        self.total_bytes = 0
+        self.interning_savings = 0
+        self.sharing_savings = 0
+        # id => accounted object, objects are referenced, so their ids aren't
+        # reused when trees are freed (e.g. trees from generator)
+        self._seen = {}
+        self._leaves = set()
+        self._string_values = set()
+
+    def _add_string(self, table_name, value):
+        new_object = id(value) not in self._seen
+        size = sys.getsizeof(value)
+        if new_object:
+            self._seen[id(value)] = value
+            self.total_bytes += size
+            if value in self._string_values:
+                self.interning_savings += size
+            else:
+                self._string_values.add(value)
+        self.strings[table_name].add(value, size, new_object)
+
+    def add_tree(self, tree):
+        """Account all nodes of tree, already accounted nodes are skipped"""
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if id(node) in self._seen:
+                continue
+            self._seen[id(node)] = node
+
+            class_name = node.__class__.__name__
+            size = sys.getsizeof(node)
+            leaf_key = [class_name]
+            for field_name in _slots(node.__class__):
+                # private slots (cached hash, position) may be unset
+                field = getattr(node, field_name, None)
+                if isinstance(field, list):
+                    if id(field) not in self._seen:
+                        self._seen[id(field)] = field
+                        size += sys.getsizeof(field)
+                    for elem in field:
+                        if isinstance(elem, Node):
+                            stack.append(elem)
+                        elif isinstance(elem, basestring):
+                            self._add_string('%s.%s' % (class_name, field_name), elem)
+                elif isinstance(field, Node):
+                    stack.append(field)
+                elif isinstance(field, basestring):
+                    self._add_string('%s.%s' % (class_name, field_name), field)
+                    if not field_name.startswith('_'):
+                        leaf_key.append(field)
+
+            stats = self.classes[class_name]
+            stats[0] += 1
+            stats[1] += size
+            self.total_bytes += size
+
+            if class_name in _LEAF_NODES:
+                leaf_key = tuple(leaf_key)
+                if leaf_key in self._leaves:
+                    self.sharing_savings += size
+                else:
+                    self._leaves.add(leaf_key)
+
+    def write(self, out):
+        """Write report to out"""
+        out.write("Total: %s bytes\n" % self.total_bytes)
+        out.write("-" * 100 + '\n')
+        out.write("%-20s %12s %14s\n" % ('Node class', 'Instances', 'Bytes'))
+        for class_name, (instances, size) in sorted(self.classes.items(), key=lambda item: -item[1][1]):
+            out.write("%-20s %12s %14s\n" % (class_name, instances, size))
+        out.write("-" * 100 + '\n')
+        out.write("%-25s %10s %10s %10s %14s\n" %
+                  ('String table', 'Refs', 'Objects', 'Values', 'Bytes'))
+        for table_name, table in sorted(self.strings.items(), key=lambda item: -item[1].bytes):
+            out.write("%-25s %10s %10s %10s %14s\n" %
+                      (table_name, table.count, table.objects, table.values, table.bytes))
+        out.write("-" * 100 + '\n')
+        out.write("Interning of strings would save %s bytes\n" % self.interning_savings)
+        out.write("Sharing of equal leaf nodes would save %s bytes\n" % self.sharing_savings)
+
+
+def memory_report(trees):
+    """Return MemoryReport for trees
+
+    @param trees: iterable of AST (e.g. values of cache with parsed scripts)
+    """
+    report = MemoryReport()
+    for tree in trees:
+        if tree is not None:
+            report.add_tree(tree)
+    return report
+
+
+def trace_parse(paths, top=10):
+    """Parse scripts while tracing allocations with tracemalloc
+
+    @param paths: iterable of paths to nasl scripts
+    @param top: number of returned statistics
+    @return tuple (list of AST, list of top tracemalloc.Statistic grouped by line).
+        Statistics are None if tracemalloc isn't available
+    """
+    from pynasl.batch import BatchParser
+
+    if tracemalloc is None:
+        batch = BatchParser()
+        return [tree for name, full_path, tree in batch.process(paths)], None
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        batch = BatchParser()
+        trees = [tree for name, full_path, tree in batch.process(paths)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    return trees, after.compare_to(before, 'lineno')[:top]
@@ -0,0 +1,281 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Metrics of long-running corpus jobs in Prometheus text format.
+
+Metrics is BatchHooks, so it works with every driver that accepts hooks:
+
+    metrics = Metrics(file_name='/var/lib/node_exporter/pynasl.prom', interval=30)
+    metrics.serve(9123)
+    create_statistic(plugins_dir, hooks=[metrics])
+"""
+
+import os
+import time
+import bisect
+import random
+import logging
+import threading
+from array import array
+from collections import defaultdict
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from pynasl.batch import BatchHooks
+
+
+logger = logging.getLogger("metrics")
+logger.setLevel(logging.INFO)
+
+
+# upper bounds (seconds) of parse latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# number of latencies kept for quantiles, they are uniform random sample
+# (reservoir) of all observed latencies
+RESERVOIR_SIZE = 1024
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _value(value):
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    return repr(value)
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('"', '\\"'))
+                             for name, value in sorted(labels.items()))
+
+
+class Metrics(BatchHooks):
+    """Collects throughput, latency, errors, cache and worker metrics of
+    batch processing and renders them in Prometheus text format.
+
+    @ivar files: number of processed files
+    @ivar bytes: number of bytes in processed files
+    @ivar errors: dictionary error type => count
+    @ivar cache_hits: dictionary cache name => number of hits
+    @ivar cache_misses: dictionary cache name => number of misses
+    @ivar busy_time: dictionary worker => seconds spent processing files
+    """
+
+    def __init__(self, file_name=None, interval=60, worker='main', prefix='pynasl'):
+        """
+        @param file_name: string with path to file where metrics are written
+            every interval seconds. Default value - None, that means metrics
+            aren't written periodically
+        @param interval: seconds between writes of file_name
+        @param worker: name of the worker that runs hooks
+        @param prefix: prefix of metric names
+        """
+        self.file_name = file_name
+        self.interval = interval
+        self.worker = worker
+        self.prefix = prefix
+
+        self.files = 0
+        self.bytes = 0
+        self.errors = defaultdict(int)
+        self.cache_hits = defaultdict(int)
+        self.cache_misses = defaultdict(int)
+        self.busy_time = defaultdict(float)
+
+        self._latencies = array('d')
+        self._sorted_latencies = None
+        self._random = random.Random(0)
+        self._buckets = [0] * len(LATENCY_BUCKETS)
+        self._latency_sum = 0.0
+        self._latency_count = 0
+
+        self._start = time.time()
+        self._last_write = self._start
+        self._file_start = None
+        self._file_size = 0
+        self._file_latency = 0.0
+        self._lock = threading.Lock()
+        self._server = None
+
+    # BatchHooks
+
+    def file_started(self, name, full_path, size):
+        self._file_start = time.time()
+        self._file_size = size
+        self._file_latency = 0.0
+
+    def stage_finished(self, name, stage, elapsed):
+        if stage in ('lex', 'parse'):
+            self._file_latency += elapsed
+
+    def file_skipped(self, name, error):
+        self._end_file('%s:%s' % (error.__class__.__name__, error.limit))
+
+    def file_failed(self, name, error):
+        self._end_file(error.__class__.__name__)
+
+    def file_finished(self, name):
+        self._end_file()
+
+    def _end_file(self, error_type=None):
+        now = time.time()
+        with self._lock:
+            self.busy_time[self.worker] += now - self._file_start
+            if error_type is None:
+                self.files += 1
+                self.bytes += self._file_size
+                self._observe_latency(self._file_latency)
+            else:
+                self.errors[error_type] += 1
+
+        if self.file_name and now - self._last_write >= self.interval:
+            self.write_file(self.file_name)
+
+    def _observe_latency(self, latency):
+        self._latency_count += 1
+        if len(self._latencies) < RESERVOIR_SIZE:
+            self._latencies.append(latency)
+            self._sorted_latencies = None
+        else:
+            index = self._random.randrange(self._latency_count)
+            if index < RESERVOIR_SIZE:
+                self._latencies[index] = latency
+                self._sorted_latencies = None
+        self._latency_sum += latency
+        index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        if index < len(self._buckets):
+            self._buckets[index] += 1
+
+    # other sources of metrics
+
+    def cache_lookup(self, cache, hit):
+        """Count lookup in cache with name cache"""
+        with self._lock:
+            if hit:
+                self.cache_hits[cache] += 1
+            else:
+                self.cache_misses[cache] += 1
+
+    def add_busy_time(self, worker, seconds):
+        """Add busy time of other worker (e.g. reported by worker process of
+        pynasl.visitors.astdiff.diff_feeds or generate_call_trees)"""
+        with self._lock:
+            self.busy_time[worker] += seconds
+
+    # export
+
+    def render(self):
+        """Return string with all metrics in Prometheus text format"""
+        with self._lock:
+            return self._render()
+
+    def _render(self):
+        prefix = self.prefix
+        elapsed = max(time.time() - self._start, 1e-9)
+        lines = []
+
+        def metric(name, metric_type, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append('%s_%s%s%s %s' % (prefix, name, suffix, labels, _value(value)))
+
+        metric('files_processed_total', 'counter', 'Number of processed files',
+               [('', '', self.files)])
+        metric('bytes_processed_total', 'counter', 'Number of bytes in processed files',
+               [('', '', self.bytes)])
+        metric('files_per_second', 'gauge', 'Average number of processed files per second',
+               [('', '', self.files / elapsed)])
+        metric('bytes_per_second', 'gauge', 'Average number of processed bytes per second',
+               [('', '', self.bytes / elapsed)])
+
+        cumulative = 0
+        samples = []
+        for bound, count in zip(LATENCY_BUCKETS, self._buckets):
+            cumulative += count
+            samples.append(('_bucket', _labels(le=bound), cumulative))
+        samples.append(('_bucket', _labels(le='+Inf'), self._latency_count))
+        samples.append(('_sum', '', self._latency_sum))
+        samples.append(('_count', '', self._latency_count))
+        metric('parse_latency_seconds', 'histogram', 'Lexing and parsing time of file', samples)
+
+        if self._sorted_latencies is None:
+            self._sorted_latencies = sorted(self._latencies)
+        samples = [('', _labels(quantile=q), _quantile(self._sorted_latencies, q))
+                   for q in QUANTILES]
+        samples.append(('_sum', '', self._latency_sum))
+        samples.append(('_count', '', self._latency_count))
+        metric('parse_latency_quantile_seconds', 'summary',
+               'Quantiles of lexing and parsing time of file', samples)
+
+        metric('errors_total', 'counter', 'Number of skipped files by error type',
+               [('', _labels(type=error_type), count)
+                for error_type, count in sorted(self.errors.items())])
+
+        caches = sorted(set(self.cache_hits) | set(self.cache_misses))
+        metric('cache_hits_total', 'counter', 'Number of cache hits',
+               [('', _labels(cache=cache), self.cache_hits[cache]) for cache in caches])
+        metric('cache_misses_total', 'counter', 'Number of cache misses',
+               [('', _labels(cache=cache), self.cache_misses[cache]) for cache in caches])
+        metric('cache_hit_ratio', 'gauge', 'Ratio of cache hits to cache lookups',
+               [('', _labels(cache=cache),
+                 float(self.cache_hits[cache]) / (self.cache_hits[cache] + self.cache_misses[cache]))
+                for cache in caches])
+
+        metric('worker_utilization', 'gauge', 'Share of wall time worker spent processing files',
+               [('', _labels(worker=worker), busy / elapsed)
+                for worker, busy in sorted(self.busy_time.items())])
+
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, file_name):
+        """Atomically write metrics to file_name"""
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.rename(tmp_name, file_name)
+        self._last_write = time.time()
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve metrics on http://host:port/metrics in background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='metrics')
+        thread.daemon = True
+        thread.start()
+        logger.info("Serving metrics on http://%s:%s/metrics" % (host, port))
+
+    def shutdown(self):
+        """Stop serving metrics and write final metrics to file_name"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        if self.file_name:
+            self.write_file(self.file_name)
@@ -7,9 +7,38 @@
 """Module defines AST nodes and base visitors which can be used for walking AST"""
 
 import abc
+from hashlib import md5
 
 
-class Atom(object):
+class Node(object):
+    """Base class for all AST nodes.
+    
+    Nodes are compared structurally: nodes are equal if they have the same class
+    and equal fields. Hash of node is based on structural_hash, which is cached
+    in nodes, so passes that change hashed tree must drop cached hash of every
+    changed node and of all its ancestors, see drop_hash.
+    """
+    __slots__ = ['_hash']
+    
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Node):
+            return NotImplemented
+        # fields are compared, cached hashes could be outdated
+        return _equal(self, other)
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+    
+    def __hash__(self):
+        return hash(structural_hash(self))
+
+
+class Atom(Node):
     __slots__ = ['value']
     
     def __init__(self, value):
@@ -19,7 +48,7 @@ class Atom(object):
         return "Atom(%s)" % self.value
 
 
-class IpAddr(object):
+class IpAddr(Node):
     __slots__ = ['value']
 
     def __init__(self, ip):
@@ -29,7 +58,7 @@ class IpAddr(object):
         return "IpAddress(%s)" % self.value
 
 
-class VarName(object):
+class VarName(Node):
     __slots__ = ['value']
     
     def __init__(self, value):
@@ -39,7 +68,7 @@ class VarName(object):
         return "VarName(%s)" % self.value
 
 
-class LocalVar(object):
+class LocalVar(Node):
     __slots__ = ['value']
     
     def __init__(self, value):
@@ -49,7 +78,7 @@ class LocalVar(object):
         return "LocalVar(%s)" % self.value
     
 
-class GlobalVar(object):
+class GlobalVar(Node):
     __slots__ = ['value']
     
     def __init__(self, value):
@@ -59,7 +88,7 @@ class GlobalVar(object):
         return "GlobalVar(%s)" % self.value
     
 
-class Arg(object):
+class Arg(Node):
     __slots__ = ['value']
     
     def __init__(self, value):
@@ -69,7 +98,7 @@ class Arg(object):
         return "Arg(%s)" % self.value
 
 
-class ArgAttribute(object):
+class ArgAttribute(Node):
     __slots__ = ['att_name', 'value']
     
     def __init__(self, att_name, value):
@@ -80,7 +109,26 @@ class ArgAttribute(object):
         return "Arg('%s':%s)" % (self.att_name, self.value)
 
 
-class FuncCall(object):
+class PositionedNode(Node):
+    """Base class for nodes which remember offset and line of their first
+    token in script (set by parser, None for nodes created otherwise). Offset
+    and line aren't fields of node, they are ignored by visitors, hashing and
+    comparison.
+    """
+    __slots__ = ['_lexpos', '_lineno']
+
+
+def lexpos(node):
+    """Return offset of node in script or None if it is unknown"""
+    return getattr(node, '_lexpos', None)
+
+
+def lineno(node):
+    """Return line of node in script (starting from 1) or None if it is unknown"""
+    return getattr(node, '_lineno', None)
+
+
+class FuncCall(PositionedNode):
     __slots__ = ['name', 'args_list']
     
     def __init__(self, name, args_list):
@@ -91,7 +139,7 @@ class FuncCall(object):
         return "FuncCall('%s', %s)" % (self.name, self.args_list)
 
 
-class FuncDecl(object):
+class FuncDecl(Node):
     __slots__ = ['name', 'args', 'elems']
     
     def __init__(self, name, args, instr):
@@ -103,7 +151,7 @@ class FuncDecl(object):
         return "\nFuncDecl('%s', %s)\n%s" % (self.name, self.args, self.elems)
 
 
-class ArgList(object):
+class ArgList(Node):
     __slots__ = ['args']
     
     def __init__(self, arg):
@@ -117,7 +165,7 @@ class ArgList(object):
         self.args.insert(0, arg)
 
 
-class ArgDeclList(object):
+class ArgDeclList(Node):
     __slots__ = ['args']
     
     def __init__(self, arg):
@@ -131,7 +179,7 @@ class ArgDeclList(object):
         self.args.insert(0, arg)
 
 
-class InstrList(object):
+class InstrList(Node):
     __slots__ = ['elems']
     
     def __init__(self, instr=None):
@@ -147,7 +195,7 @@ class InstrList(object):
         self.elems.insert(0, instr)
 
 
-class IfBlock(object):
+class IfBlock(Node):
     __slots__ = ['condition', 'elems', 'else_instr']
     
     def __init__(self, condition, instr, else_instr=None):
@@ -162,7 +210,7 @@ class IfBlock(object):
             return "\nIf %s\n%s\n" % (self.condition, self.elems)
 
 
-class Affectation(object):
+class Affectation(Node):
     __slots__ = ['lvalue', 'operation', 'expr']
     
     def __init__(self, lvalue, operation, expr):
@@ -174,7 +222,7 @@ class Affectation(object):
         return "Affectation(%s %s %s)" % (self.lvalue, self.operation, self.expr)
 
 
-class Repetition(object):
+class Repetition(Node):
     __slots__ = ['func', 'expr']
     
     def __init__(self, func, expr):
@@ -185,7 +233,7 @@ class Repetition(object):
         return "Repetition(%s %s)" % (self.func, self.expr)
     
         
-class Include(object):
+class Include(Node):
     __slots__ = ['filename']
     
     def __init__(self, filename):
@@ -195,7 +243,7 @@ class Include(object):
         return "Include(%s)" % self.filename
 
 
-class Expression(object):
+class Expression(Node):
     __slots__ = ['lexpr', 'operation', 'rexpr']
     
     def __init__(self, lexpr, operation, rexpr):
@@ -207,7 +255,22 @@ class Expression(object):
         return "Expression(%s %s %s)" % (self.lexpr, self.operation, self.rexpr)
 
 
-class RExpression(object):
+class NaryExpression(Node):
+    """Chain of left-associative operations with the same operator,
+    e.g. a + b + c. It isn't created by parser, see pynasl.visitors.constfold.
+    """
+    __slots__ = ['operation', 'elems']
+    
+    def __init__(self, operation, elems):
+        self.operation = operation
+        self.elems = elems
+    
+    def __repr__(self):
+        separator = ' %s ' % self.operation
+        return "NaryExpression(%s)" % separator.join([str(elem) for elem in self.elems])
+
+
+class RExpression(Node):
     __slots__ = ['operation', 'rexpr']
     
     def __init__(self, operation, rexpr):
@@ -218,7 +281,7 @@ class RExpression(object):
         return "Expression(%s %s)" % (self.operation, self.rexpr)
 
 
-class PostIncr(object):
+class PostIncr(Node):
     __slots__ = ['operation', 'value']
     
     def __init__(self, value, operation):
@@ -229,7 +292,7 @@ class PostIncr(object):
         return "%s%s" % (self.value, self.operation)        
 
 
-class PreIncr(object):
+class PreIncr(Node):
     __slots__ = ['operation', 'value']
     
     def __init__(self, operation, value):
@@ -240,7 +303,7 @@ class PreIncr(object):
         return "%s%s" % (self.operation, self.value)        
 
 
-class ArrayElem(object):
+class ArrayElem(Node):
     __slots__ = ['name', 'index']
     
     def __init__(self, name, index):
@@ -251,7 +314,7 @@ class ArrayElem(object):
         return "%s[%s]" % (self.name, self.index)
 
 
-class ArrayDataList(object):
+class ArrayDataList(Node):
     __slots__ = ['elems']
     
     def __init__(self, elem=None):
@@ -267,7 +330,7 @@ class ArrayDataList(object):
         self.elems.insert(0, elem)
 
 
-class ConstArray(object):
+class ConstArray(Node):
     __slots__ = ['elems']
     
     def __init__(self, elems):
@@ -277,7 +340,7 @@ class ConstArray(object):
         return "ConstArray[%s]" % self.elems
 
 
-class ForLoop(object):
+class ForLoop(Node):
     __slots__ = ['init', 'condition', 'increment', 'elems']
     
     def __init__(self, init, condition, increment, instr):
@@ -291,7 +354,7 @@ class ForLoop(object):
                                          self.increment, self.elems)
         
 
-class ForeachLoop(object):
+class ForeachLoop(Node):
     __slots__ = ['element', 'expr', 'elems']
     
     def __init__(self, element, expr, instr):
@@ -303,7 +366,7 @@ class ForeachLoop(object):
         return "\nforeach %s in %s\n%s" % (self.element, self.expr, self.elems)
 
 
-class WhileLoop(object):
+class WhileLoop(Node):
     __slots__ = ['expr', 'elems']
     
     def __init__(self, expr, instr):
@@ -314,7 +377,7 @@ class WhileLoop(object):
         return "\nwhile %s\n%s" % (self.expr, self.elems)
 
         
-class RepeatLoop(object):
+class RepeatLoop(Node):
     __slots__ = ['expr', 'elems']
     
     def __init__(self, instr, expr):
@@ -325,17 +388,21 @@ class RepeatLoop(object):
         return "\nrepeat\n%s\nuntil %s" % (self.elems, self.expr)
 
 
-class BreakInstr(object):
+class BreakInstr(Node):
+    __slots__ = []
+    
     def __repr__(self):
         return "\nbreak\n"
 
 
-class ContinueInstr(object):
+class ContinueInstr(Node):
+    __slots__ = []
+    
     def __repr__(self):
         return "\ncontinue\n"
 
 
-class ReturnInstr(object):
+class ReturnInstr(Node):
     __slots__ = ['expr']
     
     def __init__(self, expr=None):
@@ -345,13 +412,142 @@ class ReturnInstr(object):
         return "return %s\n" % self.expr
 
         
-class Empty(object):
+class Empty(Node):
     __slots__ = []
     
     def __repr__(self):
         return "EMPTY"
 
 
+def iter_child_nodes(node):
+    """Yield all direct child nodes of node (elements of list fields included)"""
+    for field_name in node.__slots__:
+        field = getattr(node, field_name)
+        if isinstance(field, list):
+            for elem in field:
+                if isinstance(elem, Node):
+                    yield elem
+        elif isinstance(field, Node):
+            yield field
+
+
+def copy_tree(tree):
+    """Return copy of tree without recursion. Nodes and lists are copied,
+    strings are shared. Subtrees shared in tree (e.g. interned in
+    pynasl.hashcons.HashConsArena) aren't shared in copy, so it can be changed
+    """
+    order = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(iter_child_nodes(node))
+
+    # children are copied before parents
+    copies = {}
+    for node in reversed(order):
+        cls = node.__class__
+        copy = cls.__new__(cls)
+        for base in cls.__mro__:
+            for field_name in base.__dict__.get('__slots__', ()):
+                try:
+                    value = getattr(node, field_name)
+                except AttributeError:
+                    continue
+                if isinstance(value, list):
+                    value = [copies[id(elem)] if isinstance(elem, Node) else elem
+                             for elem in value]
+                elif isinstance(value, Node):
+                    value = copies[id(value)]
+                setattr(copy, field_name, value)
+        copies[id(node)] = copy
+    return copies[id(tree)]
+
+
+def _encode_field(value, parts):
+    if isinstance(value, Node):
+        parts.append('H' + value._hash)
+    elif isinstance(value, list):
+        parts.append('L%d' % len(value))
+        for elem in value:
+            _encode_field(elem, parts)
+    elif isinstance(value, basestring):
+        parts.append('S%d:%s' % (len(value), value))
+    elif value is None:
+        parts.append('N')
+    else:
+        parts.append('O%r' % (value,))
+
+
+def _node_digest(node):
+    parts = [node.__class__.__name__]
+    for field_name in node.__slots__:
+        _encode_field(getattr(node, field_name), parts)
+    return md5('\0'.join(parts)).digest()
+
+
+def _equal(first, second):
+    """Compare subtrees field by field without recursion"""
+    stack = [(first, second)]
+    while stack:
+        first, second = stack.pop()
+        if first is second:
+            continue
+        if first.__class__ is not second.__class__:
+            return False
+        for field_name in first.__slots__:
+            first_value = getattr(first, field_name)
+            second_value = getattr(second, field_name)
+            if isinstance(first_value, list):
+                if not isinstance(second_value, list) or len(first_value) != len(second_value):
+                    return False
+                pairs = zip(first_value, second_value)
+            else:
+                pairs = [(first_value, second_value)]
+            for first_elem, second_elem in pairs:
+                if isinstance(first_elem, Node):
+                    if not isinstance(second_elem, Node):
+                        return False
+                    stack.append((first_elem, second_elem))
+                elif isinstance(second_elem, Node) or first_elem != second_elem:
+                    return False
+    return True
+
+
+def drop_hash(node):
+    """Drop cached structural hash of node. It must be called for node whose
+    fields were changed and for all its ancestors
+    """
+    try:
+        del node._hash
+    except AttributeError:
+        pass
+
+
+def structural_hash(node):
+    """Return structural hash of subtree: 16 bytes string with md5 digest of
+    node class, its fields and structural hashes of child nodes.
+    
+    Hash is computed bottom-up without recursion and cached in every node of
+    subtree, so next calls for the node and its children are O(1).
+    """
+    try:
+        return node._hash
+    except AttributeError:
+        pass
+    
+    stack = [(node, False)]
+    while stack:
+        current, children_hashed = stack.pop()
+        if children_hashed:
+            current._hash = _node_digest(current)
+        elif not hasattr(current, '_hash'):
+            stack.append((current, True))
+            stack.extend((child, False) for child in iter_child_nodes(current))
+    
+    return node._hash
+
+
 class BaseNodeVisitor(object):
     """
     A node visitor base class that walks the abstract syntax tree and calls a
@@ -467,6 +663,10 @@ class NodeVisitor(BaseNodeVisitor):
     def visit_Expression(self, node):
         """"""
 
+    @abc.abstractmethod
+    def visit_NaryExpression(self, node):
+        """"""
+
     @abc.abstractmethod
     def visit_RExpression(self, node):
         """"""
@@ -83,7 +83,6 @@ t_L_SHIFT_EQ= r'<<='
 t_R_SHIFT_EQ= r'>>='
 t_R_USHIFT_EQ = r'>>>='
 t_INTEGER   = r'0[xX][A-Fa-f0-9]+|\d+'    
-t_STRING    = r'".*?"|"(\\.|[^"])*?"|\'(\\.|[^\'])*?\''
 
 t_ignore = ' \t'
 t_ignore_COMMENT = r'\#.*'
@@ -104,8 +103,20 @@ def t_ID(t):
     return t
 
 
+def _newlines(text):
+    """Number of line breaks in text, \\r\\n is one line break"""
+    return text.count('\n') + text.count('\r') - text.count('\r\n')
+
+
+def t_STRING(t):
+    r'".*?"|"(\\.|[^"])*?"|\'(\\.|[^\'])*?\''
+    # strings can span several lines
+    t.lexer.lineno += _newlines(t.value)
+    return t
+
+
 def t_NEWLINE(t):
-    r'[\n\r]'
+    r'\r\n|[\n\r]'
     t.lexer.lineno += 1
     #return t
 
@@ -156,7 +167,8 @@ def _test_lexer_for_plugins(plug_dir):
     pprint(files_wo_problem[:3])
 
 
-lex.lex(debug=0)
+# default lexer, use lexer.clone() to get independent one
+lexer = lex.lex(debug=0)
 
 
 if __name__ == "__main__":
@@ -202,6 +202,8 @@ def p_inc(p):
 def p_func_call(p):
     '''func_call : identifier LPAREN arg_list RPAREN'''
     p[0] = naslAST.FuncCall(p[1], p[3])
+    p[0]._lexpos = p.lexpos(1)
+    p[0]._lineno = p.lineno(1)
 
 def p_arg_list(p):
     '''arg_list : arg_list_real
@@ -252,6 +254,9 @@ def p_identifier(p):
     '''identifier : ID
                   | REP'''
     p[0] = p[1]
+    # position of name, there can be spaces and comments before '(' of call
+    p.set_lexpos(0, p.lexpos(1))
+    p.set_lineno(0, p.lineno(1))
 
 def p_array_elem(p):
     '''array_elem : identifier LBRACKET array_index RBRACKET'''
@@ -388,6 +393,9 @@ def p_empty(p):
 
 # Error rule for syntax errors
 def p_error(p):
+    if p is None:
+        # parsing can't be continued after the end of input
+        raise SyntaxError("unexpected end of input")
     if _debugging_script_mode:
         print "Syntax error at token", p.type, p.value
         yacc.errok()
@@ -395,16 +403,46 @@ def p_error(p):
         raise SyntaxError
 
 
-def naslparser(file_name, debugging_script=False):
+_parser = None
+
+def _get_parser():
+    """Return shared parser, so LALR tables are loaded only once per process"""
+    global _parser
+    if _parser is None:
+        _parser = yacc.yacc()
+    return _parser
+
+def naslparse_string(s, debugging_script=False, lexer=None, arena=None):
+    """Parse string with nasl script and return its AST
+    
+    @param s: string with nasl script
+    @param debugging_script: True, that means print syntax errors and continue parsing
+    @param lexer: lexer used instead of default nasllex.lexer
+    @param arena: pynasl.hashcons.HashConsArena, if it is given, subtrees equal
+        to already parsed ones are replaced with shared immutable nodes from arena
+    """
     global _debugging_script_mode
-    _debugging_script_mode = debugging_script    
-    parser = yacc.yacc()
+    _debugging_script_mode = debugging_script
+    if lexer is None:
+        lexer = nasllex.lexer
+        # line numbers of nodes start from 1 in every script
+        lexer.lineno = 1
+    tree = _get_parser().parse(s, lexer=lexer)
+    if arena is not None:
+        tree = arena.intern(tree)
+    return tree
+
+def naslparser(file_name, debugging_script=False, arena=None):
     s = open(file_name).read()
-    return parser.parse(s)
+    return naslparse_string(s, debugging_script, arena=arena)
 
 def _print_AST(file_name):
+    import sys
+    from pynasl.visitors.astdump import dump_text
+    
     result = naslparser(file_name, True)
-    print(result)
+    dump_text(result, sys.stdout)
+    sys.stdout.write('\n')
 
 def _test_parser_for_plugins(plug_dir):
     import os.path
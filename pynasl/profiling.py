@@ -0,0 +1,184 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Per-file profiling of batch processing of nasl scripts.
+
+Profiler is BatchHooks, so it works with every driver that accepts hooks:
+
+    profiler = Profiler()
+    create_statistic(plugins_dir, hooks=[profiler])
+    profiler.write_report(sys.stdout, top=20)
+"""
+
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pynasl.batch import BatchHooks
+
+
+class FileProfile(object):
+    """Profile of one processed file
+
+    @ivar name: file name, '<string>' for scripts parsed with parse_string
+    @ivar size: file size in bytes, None for scripts parsed with parse_string
+    @ivar tokens: number of tokens
+    @ivar nodes: number of AST nodes
+    @ivar wall_time: wall time of whole file processing
+    @ivar stages: dictionary stage name => time in seconds
+    @ivar peak_memory: peak allocation (bytes) while file was processed if memory
+        is traced with tracemalloc, otherwise growth of peak RSS of the process
+    @ivar skipped: reason of skipping file or None
+    """
+    __slots__ = ['name', 'size', 'tokens', 'nodes', 'wall_time', 'stages',
+                 'peak_memory', 'skipped']
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.tokens = 0
+        self.nodes = 0
+        self.wall_time = 0.0
+        self.stages = {}
+        self.peak_memory = None
+        self.skipped = None
+
+
+def _peak_rss():
+    """Peak resident set size of the process in bytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, Mac OS X bytes
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+class Profiler(BatchHooks):
+    """Collects FileProfile for every file processed by BatchParser. Every
+    call of BatchParser.parse_string or parse outside of walk gets its own
+    FileProfile too
+
+    @ivar files: list of FileProfile
+    @ivar stage_totals: dictionary stage name => total time in seconds
+    """
+
+    def __init__(self, trace_memory=False):
+        """
+        @param trace_memory: True, that means trace allocations with tracemalloc
+            (if it is available) for accurate per-file peak memory
+        """
+        self.files = []
+        self.stage_totals = defaultdict(float)
+        self._current = None
+        # True if current profile is created without file_started
+        self._implicit = False
+        self._start = None
+        self._base_memory = None
+        self._trace_memory = trace_memory and tracemalloc is not None and \
+            hasattr(tracemalloc, 'reset_peak')
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _memory(self):
+        if self._trace_memory:
+            return tracemalloc.get_traced_memory()[0]
+        return _peak_rss()
+
+    def _profile(self, name):
+        """Return profile of current file, create it if parsing wasn't
+        started by walk"""
+        if self._current is None:
+            self.file_started(name or '<string>', None, None)
+            self._implicit = True
+        return self._current
+
+    def file_started(self, name, full_path, size):
+        if self._implicit:
+            # stage outside of walk, e.g. batch.stage() without parsing
+            self._finish()
+        self._current = FileProfile(name, size)
+        self.files.append(self._current)
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        self._base_memory = self._memory()
+        self._start = time.time()
+
+    def file_parsed(self, name, tokens, nodes):
+        profile = self._profile(name)
+        profile.tokens = tokens
+        profile.nodes = nodes
+        if self._implicit:
+            # parse_string outside of walk, file_finished isn't called
+            self._finish()
+
+    def stage_finished(self, name, stage, elapsed):
+        profile = self._profile(name)
+        profile.stages[stage] = profile.stages.get(stage, 0.0) + elapsed
+        self.stage_totals[stage] += elapsed
+
+    def _finish(self):
+        profile = self._current
+        profile.wall_time = time.time() - self._start
+        if self._trace_memory:
+            profile.peak_memory = tracemalloc.get_traced_memory()[1] - self._base_memory
+        elif self._base_memory is not None:
+            profile.peak_memory = _peak_rss() - self._base_memory
+        self._current = None
+        self._implicit = False
+
+    def file_skipped(self, name, error):
+        self._profile(name).skipped = str(error)
+        self._finish()
+
+    def file_failed(self, name, error):
+        self._profile(name).skipped = repr(error)
+        self._finish()
+
+    def file_finished(self, name):
+        self._finish()
+
+    def slowest(self, top=10):
+        """Return top FileProfile sorted by wall time"""
+        return sorted(self.files, key=lambda profile: profile.wall_time, reverse=True)[:top]
+
+    def write_report(self, out, top=10):
+        """Write report with per-stage breakdown and top slowest files to out"""
+        total_time = sum(profile.wall_time for profile in self.files)
+        skipped = [profile for profile in self.files if profile.skipped]
+
+        out.write("Processed %s files (%s skipped) in %.3fs\n" %
+                  (len(self.files), len(skipped), total_time))
+        out.write("-" * 100 + '\n')
+        out.write("%-30s %12s %8s\n" % ('Stage', 'Time, s', '%'))
+        for stage, elapsed in sorted(self.stage_totals.items(), key=lambda item: -item[1]):
+            share = 100.0 * elapsed / total_time if total_time else 0.0
+            out.write("%-30s %12.3f %8.1f\n" % (stage, elapsed, share))
+        out.write("-" * 100 + '\n')
+
+        out.write("Top %s slowest files\n" % top)
+        out.write("%-40s %10s %10s %10s %12s %10s  %s\n" %
+                  ('File', 'Time, s', 'Bytes', 'Tokens', 'Nodes', 'Peak, KB', 'Stages'))
+        for profile in self.slowest(top):
+            peak = '%d' % (profile.peak_memory / 1024) if profile.peak_memory is not None else '-'
+            stages = ', '.join('%s=%.3f' % item for item in sorted(profile.stages.items()))
+            if profile.skipped:
+                stages += ' (skipped: %s)' % profile.skipped
+            out.write("%-40s %10.3f %10s %10s %12s %10s  %s\n" %
+                      (profile.name, profile.wall_time, profile.size,
+                       profile.tokens, profile.nodes, peak, stages))
+        out.write("-" * 100 + '\n')
@@ -0,0 +1,110 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Batch parser tests"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+from pynasl.batch import BatchParser, Budget
+from pynasl.exceptions import BudgetExceeded
+
+
+SCRIPTS = {
+    'good.nasl': 'x = 1; display(x);',
+    'bad.nasl': 'x = 1; y = (;',
+    'eof.nasl': 'x = ;',
+}
+
+# unterminated string, t_STRING backtracks exponentially in number of backslashes
+BACKTRACKING = 'x = "' + '\\' * 40 + ';'
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.plugins_dir = tempfile.mkdtemp()
+        for name, source in SCRIPTS.iteritems():
+            self.write(name, source)
+
+    def tearDown(self):
+        shutil.rmtree(self.plugins_dir)
+
+    def write(self, name, source):
+        with open(os.path.join(self.plugins_dir, name), 'w') as script:
+            script.write(source)
+
+    def walk(self, batch):
+        return sorted(name for name, full_path, tree in batch.walk(self.plugins_dir, ('.nasl',)))
+
+    def test_skip_errors(self):
+        # default debugging_script=True doesn't hide syntax errors
+        batch = BatchParser(skip_errors=True)
+        self.assertEqual(self.walk(batch), ['good.nasl'])
+        self.assertEqual(sorted(name for name, error in batch.failed), ['bad.nasl', 'eof.nasl'])
+        self.assertEqual(batch.total_files, 1)
+
+    def test_errors(self):
+        batch = BatchParser(debugging_script=False)
+        self.assertRaises(SyntaxError, self.walk, batch)
+        os.remove(os.path.join(self.plugins_dir, 'bad.nasl'))
+        # end of input is syntax error in debugging mode too
+        self.assertRaises(SyntaxError, self.walk, BatchParser())
+
+    def assertExceeded(self, limit, budget, source):
+        try:
+            BatchParser(budget, debugging_script=False).parse_string(source)
+        except BudgetExceeded, why:
+            self.assertEqual(why.limit, limit)
+        else:
+            self.fail("%s limit isn't exceeded" % limit)
+
+    def test_limits(self):
+        # 92 tokens, 38 nodes, depth 9
+        source = 'x = ((((1 + 2))));' * 5 + 'if (a) { if (b) { if (c) { x = 1; } } }'
+        BatchParser(Budget(max_tokens=92, max_nodes=38, max_depth=9),
+                    debugging_script=False).parse_string(source)
+        self.assertExceeded('tokens', Budget(max_tokens=91), source)
+        self.assertExceeded('nodes', Budget(max_nodes=37), source)
+        self.assertExceeded('depth', Budget(max_depth=8), source)
+
+    def test_time(self):
+        start = time.time()
+        self.assertExceeded('time', Budget(max_time=0.1), BACKTRACKING)
+        self.assertTrue(time.time() - start < 2)
+
+    def test_time_without_alarm(self):
+        # SIGALRM works only in main thread, otherwise deadline is checked by lexer
+        errors = []
+
+        def parse():
+            try:
+                BatchParser(Budget(max_time=0.01), debugging_script=False).parse_string(
+                    'x = 1;' * 10000)
+            except BudgetExceeded, why:
+                errors.append(why.limit)
+
+        thread = threading.Thread(target=parse)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, ['time'])
+
+    def test_skipped(self):
+        for name in ('bad.nasl', 'eof.nasl'):
+            os.remove(os.path.join(self.plugins_dir, name))
+        self.write('long.nasl', 'x = 1;' * 100)
+        self.write('slow.nasl', BACKTRACKING)
+        batch = BatchParser(Budget(max_time=0.5, max_tokens=100), debugging_script=False)
+        self.assertEqual(self.walk(batch), ['good.nasl'])
+        self.assertEqual(sorted(name for name, reason in batch.skipped), ['long.nasl', 'slow.nasl'])
+        self.assertEqual(batch.total_files, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
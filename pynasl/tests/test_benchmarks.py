@@ -0,0 +1,85 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Benchmark suite tests"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from pynasl.naslparse import naslparse_string
+from pynasl.benchmarks.generator import ScriptGenerator
+from pynasl.benchmarks.bench import run_benchmarks, compare, main, save_results, \
+    load_results, STAGES
+
+
+_CORPUS_DIGEST = ("import hashlib; from pynasl.benchmarks.generator import ScriptGenerator; "
+                  "print hashlib.md5(repr(ScriptGenerator(seed=3).corpus(3, 2))).hexdigest()")
+
+
+class Test(unittest.TestCase):
+
+    def test_generator(self):
+        corpus = ScriptGenerator(seed=3, statements=10).corpus(5, 2)
+        self.assertEqual([name for name, source in corpus],
+                         ['bench_func_0.inc', 'bench_func_1.inc'] +
+                         ['bench_%s.nasl' % i for i in range(5)])
+        self.assertEqual(corpus, ScriptGenerator(seed=3, statements=10).corpus(5, 2))
+        self.assertNotEqual(corpus, ScriptGenerator(seed=4, statements=10).corpus(5, 2))
+        for name, source in corpus:
+            self.assertTrue(naslparse_string(source) is not None)
+
+    def test_hash_seed(self):
+        # the same corpus in processes with different hash randomization
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        digests = set()
+        for hash_seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=hash_seed, PYTHONPATH=root)
+            process = subprocess.Popen([sys.executable, '-c', _CORPUS_DIGEST], env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = process.communicate()
+            self.assertEqual(process.returncode, 0, err)
+            digests.add(out.strip())
+        self.assertEqual(len(digests), 1)
+
+    def test_run_and_compare(self):
+        generator = ScriptGenerator(statements=5, nesting=1, description_lines=2)
+        results = run_benchmarks(generator, scripts=3, inc_files=1, repeat=1)
+        self.assertEqual(sorted(results['stages']), sorted(stage[0] for stage in STAGES))
+        self.assertEqual(results['corpus']['scripts'], 3)
+        self.assertEqual(compare(results, results), [])
+
+        slower = {'stages': dict((name, dict(stage, time=stage['time'] * 2 + 1))
+                                 for name, stage in results['stages'].iteritems())}
+        self.assertEqual(compare(results, slower), [])
+        regressions = compare(slower, results)
+        self.assertEqual(sorted(name for name, base, current in regressions),
+                         sorted(results['stages']))
+
+    def test_main(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output = os.path.join(tmp_dir, 'bench.json')
+            args = ['--scripts', '2', '--inc-files', '1', '--statements', '5', '--repeat', '1',
+                    '--stage', 'parse', '--stage', 'ast2py', '--output', output]
+            self.assertEqual(main(args), 0)
+            results = load_results(output)
+            self.assertEqual(sorted(results['stages']), ['ast2py', 'parse'])
+
+            baseline = os.path.join(tmp_dir, 'baseline.json')
+            for scale, code in ((1000.0, 0), (0.0, 1)):
+                for stage in results['stages'].itervalues():
+                    stage['time'] *= scale
+                save_results(results, baseline)
+                self.assertEqual(main(args[:-2] + ['--baseline', baseline]), code)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
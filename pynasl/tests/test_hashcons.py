@@ -0,0 +1,79 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Hash-consing of AST tests"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.naslAST import FuncCall, iter_child_nodes, lexpos
+from pynasl.hashcons import HashConsArena
+from pynasl.batch import check_tree, Budget
+
+
+FIRST = 'r = http_get(item:"/", port:port); display(r);'
+SECOND = 'x = 2; r = http_get(item:"/", port:port); display(x);'
+
+
+def _calls(tree):
+    """Return list of FuncCall nodes of tree in source order"""
+    result = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FuncCall):
+            result.append(node)
+        stack.extend(iter_child_nodes(node))
+    return sorted(result, key=lexpos)
+
+
+class Test(unittest.TestCase):
+
+    def test_shared_subtrees(self):
+        arena = HashConsArena()
+        first = naslparse_string(FIRST, arena=arena)
+        second = naslparse_string(SECOND, arena=arena)
+        first_get, first_display = _calls(first)
+        second_get, second_display = _calls(second)
+        self.assertTrue(second_get is first_get)
+        self.assertTrue(second.elems[1] is first.elems[0])
+        self.assertFalse(second_display is first_display)
+        self.assertTrue(second_display.name is first_display.name)
+        self.assertEqual(first_get, naslparse_string(FIRST).elems[0].expr)
+
+    def test_dedup_ratio(self):
+        arena = HashConsArena()
+        self.assertEqual(arena.dedup_ratio, 1.0)
+        tree = naslparse_string(FIRST, arena=arena)
+        nodes, depth = check_tree(tree, Budget())
+        self.assertEqual(arena.total_nodes, nodes)
+        stored = len(arena)
+
+        # the same script doesn't add new nodes
+        naslparse_string(FIRST, arena=arena)
+        self.assertEqual(len(arena), stored)
+        self.assertEqual(arena.dedup_ratio, 2.0 * nodes / stored)
+
+        # repeated statements are stored once
+        arena = HashConsArena()
+        tree = naslparse_string('x = 1; x = 1; x = 1;', arena=arena)
+        self.assertTrue(tree.elems[0] is tree.elems[1] is tree.elems[2])
+        nodes, depth = check_tree(tree, Budget())
+        self.assertEqual(arena.total_nodes, nodes)
+        # InstrList and one statement
+        self.assertEqual(len(arena), 1 + (nodes - 1) / 3)
+        self.assertEqual(arena.dedup_ratio, float(nodes) / len(arena))
+
+    def test_positions(self):
+        # shared call keeps position of its first occurrence
+        arena = HashConsArena()
+        naslparse_string(FIRST, arena=arena)
+        second_get = _calls(naslparse_string(SECOND, arena=arena))[0]
+        self.assertEqual(lexpos(second_get), FIRST.index('http_get'))
+        self.assertEqual(lexpos(_calls(naslparse_string(SECOND))[0]), SECOND.index('http_get'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Include dependency graph tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.includegraph import IncludeGraph
+
+
+SCRIPTS = {
+    'a.inc': 'include("b.inc"); function a_f() { return b_f(); }',
+    'b.inc': 'include("a.inc"); function b_f() { return 1; }',
+    'c.inc': 'function c_f() { return 1; }',
+    'first.nasl': 'include("a.inc"); a_f();',
+    'second.nasl': 'include("c.inc"); c_f();',
+}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.plugins_dir = tempfile.mkdtemp()
+        for name, source in SCRIPTS.iteritems():
+            self.write(name, source)
+
+    def tearDown(self):
+        shutil.rmtree(self.plugins_dir)
+
+    def write(self, name, source):
+        with open(os.path.join(self.plugins_dir, name), 'w') as script:
+            script.write(source)
+
+    def test_affected(self):
+        graph = IncludeGraph()
+        self.assertEqual(graph.update(self.plugins_dir), set(SCRIPTS))
+        self.assertEqual(graph.affected(['b.inc']), set(['first.nasl']))
+        self.assertEqual(graph.affected(['c.inc'], False), set(['c.inc', 'second.nasl']))
+        self.assertEqual(graph.unused(), [])
+
+    def test_incremental(self):
+        index_file = os.path.join(self.plugins_dir, 'includes.idx')
+        graph = IncludeGraph()
+        graph.update(self.plugins_dir)
+        graph.save(index_file)
+
+        self.write('second.nasl', 'include("b.inc"); b_f(); # changed')
+        os.remove(os.path.join(self.plugins_dir, 'first.nasl'))
+
+        graph = IncludeGraph.load(index_file)
+        self.assertEqual(graph.update(self.plugins_dir), set(['first.nasl', 'second.nasl']))
+        self.assertEqual(graph.affected(['a.inc']), set(['second.nasl']))
+        self.assertEqual(graph.unused(), ['c.inc'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Include cache tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.includes import IncludeCache
+
+
+INCLUDES = {
+    'a.inc': 'include("b.inc"); function a_f() { return b_f(); }',
+    'b.inc': 'include("a.inc"); include("missing.inc"); function b_f() { return 1; }',
+    'c.inc': 'function c_f() { return 1; }',
+}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.include_dir = tempfile.mkdtemp()
+        for name, source in INCLUDES.iteritems():
+            with open(os.path.join(self.include_dir, name), 'w') as inc_file:
+                inc_file.write(source)
+
+    def tearDown(self):
+        shutil.rmtree(self.include_dir)
+
+    def test_closure(self):
+        cache = IncludeCache([self.include_dir])
+        self.assertEqual([entry.name for entry in cache.closure(['a.inc'])], ['a.inc', 'b.inc'])
+        self.assertEqual(cache.misses, 3)
+
+        functions = cache.functions(['b.inc', 'c.inc'])
+        self.assertEqual(sorted(functions), ['a_f', 'b_f', 'c_f'])
+        self.assertEqual(functions['a_f'].name, 'a.inc')
+        # only c.inc is parsed again
+        self.assertEqual(cache.misses, 4)
+        self.assertEqual(cache.hits, 3)
+
+    def test_lru(self):
+        cache = IncludeCache([self.include_dir], max_size=2)
+        first = cache.get('a.inc')
+        cache.get('b.inc')
+        self.assertTrue(cache.get('a.inc') is first)
+        cache.get('c.inc')
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get('a.inc') is first)
+        self.assertEqual(cache.misses, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
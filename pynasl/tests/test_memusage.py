@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Memory accounting of AST tests"""
+
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from pynasl.naslparse import naslparse_string
+from pynasl.naslAST import structural_hash
+from pynasl.hashcons import HashConsArena
+from pynasl import memusage
+from pynasl.memusage import memory_report, trace_parse
+
+
+SOURCE = 'display("a"); display("a"); x = 1;'
+
+
+class Test(unittest.TestCase):
+
+    def test_classes_and_strings(self):
+        report = memory_report([naslparse_string(SOURCE)])
+        self.assertEqual(report.classes['FuncCall'][0], 2)
+        self.assertEqual(report.classes['Atom'][0], 3)
+        self.assertEqual(report.strings['FuncCall.name'].count, 2)
+        self.assertEqual(report.strings['FuncCall.name'].values, 1)
+        self.assertEqual(report.strings['Atom.value'].values, 2)
+        # the second Atom "a" could be shared
+        self.assertEqual(report.sharing_savings, report.classes['Atom'][1] / 3)
+
+        out = StringIO()
+        report.write(out)
+        self.assertTrue(out.getvalue().startswith('Total: %s bytes\n' % report.total_bytes))
+        self.assertTrue('FuncCall.name' in out.getvalue())
+
+    def test_base_slots(self):
+        # cached structural hashes are stored in slot of Node base class
+        tree = naslparse_string(SOURCE)
+        before = memory_report([tree])
+        structural_hash(tree)
+        after = memory_report([tree])
+        hashes = [table for name, table in after.strings.iteritems() if name.endswith('._hash')]
+        self.assertEqual(sum(table.count for table in hashes), sum(
+            instances for instances, size in after.classes.itervalues()))
+        self.assertEqual(after.total_bytes - before.total_bytes,
+                         sum(table.bytes for table in hashes))
+        self.assertEqual(after.sharing_savings, before.sharing_savings)
+
+    def test_shared_trees(self):
+        plain = memory_report([naslparse_string(SOURCE), naslparse_string(SOURCE)])
+        arena = HashConsArena()
+        shared = memory_report([naslparse_string(SOURCE, arena=arena),
+                                naslparse_string(SOURCE, arena=arena)])
+        self.assertTrue(plain.interning_savings > 0)
+        self.assertEqual(shared.interning_savings, 0)
+        # shared nodes are accounted once
+        self.assertEqual(sum(instances for instances, size in shared.classes.itervalues()),
+                         len(arena))
+        self.assertTrue(shared.total_bytes < plain.total_bytes)
+        self.assertEqual(shared.classes['Atom'][0], 2)
+        self.assertEqual(shared.sharing_savings, 0)
+
+    def test_freed_trees(self):
+        # trees are freed after accounting, their ids can be reused by next trees
+        report = memory_report(naslparse_string(SOURCE) for i in xrange(20))
+        self.assertEqual(report.classes['FuncCall'][0], 40)
+        self.assertEqual(report.classes['Atom'][0], 60)
+
+    def test_trace_parse_without_tracemalloc(self):
+        handle, path = tempfile.mkstemp('.nasl')
+        os.write(handle, SOURCE)
+        os.close(handle)
+        prev_tracemalloc = memusage.tracemalloc
+        memusage.tracemalloc = None
+        try:
+            trees, statistics = trace_parse([path])
+        finally:
+            memusage.tracemalloc = prev_tracemalloc
+            os.remove(path)
+        self.assertEqual(len(trees), 1)
+        self.assertEqual(statistics, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Prometheus metrics tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.batch import BatchParser
+from pynasl.metrics import Metrics, RESERVOIR_SIZE
+from pynasl.visitors.astdiff import diff_feeds
+
+
+def _samples(text):
+    """Return dictionary sample name with labels => value"""
+    result = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = float(value)
+    return result
+
+
+class Test(unittest.TestCase):
+
+    def test_batch(self):
+        plugins_dir = tempfile.mkdtemp()
+        try:
+            for name, source in [('a.nasl', 'x = 1;'), ('b.nasl', 'y = 2;'), ('c.nasl', 'x = ;')]:
+                with open(os.path.join(plugins_dir, name), 'w') as script:
+                    script.write(source)
+            metrics = Metrics()
+            batch = BatchParser(hooks=[metrics], skip_errors=True)
+            for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+                pass
+            text = metrics.render()
+        finally:
+            shutil.rmtree(plugins_dir)
+
+        samples = _samples(text)
+        self.assertEqual(samples['pynasl_files_processed_total'], 2)
+        self.assertEqual(samples['pynasl_bytes_processed_total'], 12)
+        self.assertEqual(samples['pynasl_errors_total{type="SyntaxError"}'], 1)
+        self.assertEqual(samples['pynasl_parse_latency_seconds_bucket{le="+Inf"}'], 2)
+        self.assertEqual(samples['pynasl_parse_latency_seconds_count'], 2)
+        self.assertTrue('# TYPE pynasl_parse_latency_quantile_seconds summary' in text)
+        self.assertEqual(samples['pynasl_parse_latency_quantile_seconds_count'], 2)
+        self.assertTrue(samples['pynasl_parse_latency_quantile_seconds{quantile="0.5"}'] >= 0)
+
+    def test_latencies(self):
+        metrics = Metrics()
+        for i in xrange(10000):
+            metrics._observe_latency(i % 100 / 1000.0)
+        self.assertEqual(len(metrics._latencies), RESERVOIR_SIZE)
+
+        samples = _samples(metrics.render())
+        self.assertEqual(samples['pynasl_parse_latency_seconds_count'], 10000)
+        self.assertEqual(samples['pynasl_parse_latency_seconds_bucket{le="0.001"}'], 200)
+        self.assertAlmostEqual(samples['pynasl_parse_latency_quantile_seconds{quantile="0.5"}'],
+                               0.05, delta=0.01)
+
+        # latencies are sorted again only after new observation
+        latencies = metrics._sorted_latencies
+        metrics.render()
+        self.assertTrue(metrics._sorted_latencies is latencies)
+        metrics.cache_lookup('xref', True)
+        metrics.render()
+        self.assertTrue(metrics._sorted_latencies is latencies)
+
+    def test_worker_busy_time(self):
+        old_dir = tempfile.mkdtemp()
+        new_dir = tempfile.mkdtemp()
+        try:
+            for i in xrange(10):
+                for directory, source in [(old_dir, 'x = 1;'), (new_dir, 'f(1);')]:
+                    with open(os.path.join(directory, '%s.nasl' % i), 'w') as script:
+                        script.write(source)
+            single = Metrics()
+            self.assertEqual(len(diff_feeds(old_dir, new_dir, metrics=single).modified), 10)
+            pool = Metrics()
+            diff_feeds(old_dir, new_dir, processes=2, metrics=pool)
+        finally:
+            shutil.rmtree(old_dir)
+            shutil.rmtree(new_dir)
+
+        self.assertEqual(single.busy_time.keys(), ['main'])
+        self.assertTrue(single.busy_time['main'] > 0)
+        # time of worker processes, not of the main one
+        self.assertTrue(pool.busy_time)
+        self.assertFalse('main' in pool.busy_time)
+        samples = _samples(pool.render())
+        for worker in pool.busy_time:
+            self.assertTrue(samples['pynasl_worker_utilization{worker="%s"}' % worker] > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Structural hashing and equality of AST nodes tests"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.naslAST import structural_hash, drop_hash, copy_tree, lexpos, Atom, VarName
+
+
+FUNC = """
+function helper(port) {
+  local_var banner;
+  banner = get_http_banner(port:port);
+  if (!banner) return NULL;
+  return "Server: " + banner;
+}
+"""
+
+
+class Test(unittest.TestCase):
+
+    def test_equal_trees(self):
+        first = naslparse_string(FUNC)
+        second = naslparse_string("# copied\n" + FUNC.replace('  ', '\t'))
+        
+        self.assertFalse(first is second)
+        self.assertEqual(structural_hash(first), structural_hash(second))
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertEqual(len(set([first, second])), 1)
+
+    def test_different_trees(self):
+        first = naslparse_string(FUNC)
+        second = naslparse_string(FUNC.replace('"Server: "', '"Server:"'))
+        
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.elems[0].args, second.elems[0].args)
+        self.assertNotEqual(first.elems[0].elems, second.elems[0].elems)
+
+    def test_class_matters(self):
+        self.assertNotEqual(Atom('a'), VarName('a'))
+        self.assertEqual(VarName('a'), VarName('a'))
+        self.assertNotEqual(VarName('a'), 'a')
+
+    def test_hash_is_cached(self):
+        tree = naslparse_string(FUNC)
+        digest = structural_hash(tree)
+        
+        self.assertEqual(tree._hash, digest)
+        self.assertEqual(tree.elems[0].elems._hash, structural_hash(tree.elems[0].elems))
+
+    def test_changed_tree(self):
+        # equality compares fields, so it doesn't depend on outdated hash
+        tree = naslparse_string('x = 1;')
+        structural_hash(tree)
+        tree.elems[0].expr.value = '2'
+        self.assertEqual(tree, naslparse_string('x = 2;'))
+        self.assertNotEqual(tree, naslparse_string('x = 1;'))
+
+        drop_hash(tree.elems[0].expr)
+        drop_hash(tree.elems[0])
+        drop_hash(tree)
+        self.assertEqual(structural_hash(tree), structural_hash(naslparse_string('x = 2;')))
+
+    def test_copy_tree(self):
+        tree = naslparse_string(FUNC)
+        copy = copy_tree(tree)
+        self.assertEqual(copy, tree)
+        self.assertFalse(copy.elems[0] is tree.elems[0])
+        self.assertFalse(copy.elems[0].elems.elems is tree.elems[0].elems.elems)
+        call = tree.elems[0].elems.elems[1].expr
+        self.assertEqual(lexpos(copy.elems[0].elems.elems[1].expr), lexpos(call))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Per-file profiling tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from pynasl.batch import BatchParser, Budget
+from pynasl.profiling import Profiler
+
+
+SCRIPTS = {
+    'a.nasl': 'x = 1;',
+    'b.nasl': 'x = 1; y = x + 2; display(y);',
+    'long.nasl': 'x = 1;' * 100,
+}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.plugins_dir = tempfile.mkdtemp()
+        for name, source in SCRIPTS.iteritems():
+            with open(os.path.join(self.plugins_dir, name), 'w') as script:
+                script.write(source)
+
+    def tearDown(self):
+        shutil.rmtree(self.plugins_dir)
+
+    def test_profiles(self):
+        profiler = Profiler()
+        batch = BatchParser(Budget(max_tokens=50), hooks=[profiler])
+        for name, full_path, tree in batch.walk(self.plugins_dir, ('.nasl',)):
+            with batch.stage('Visitor'):
+                pass
+
+        profiles = dict((profile.name, profile) for profile in profiler.files)
+        self.assertEqual(sorted(profiles), ['a.nasl', 'b.nasl', 'long.nasl'])
+        profile = profiles['b.nasl']
+        self.assertEqual((profile.size, profile.tokens, profile.nodes),
+                         (len(SCRIPTS['b.nasl']), 15, 13))
+        self.assertEqual(sorted(profile.stages), ['Visitor', 'lex', 'parse'])
+        self.assertTrue(profile.wall_time >= sum(profile.stages.values()) - 1e-6)
+        self.assertEqual(profile.skipped, None)
+        self.assertTrue(profile.peak_memory is None or profile.peak_memory >= 0)
+
+        self.assertEqual(profiles['long.nasl'].skipped, 'tokens limit exceeded (51)')
+        self.assertFalse('Visitor' in profiles['long.nasl'].stages)
+        self.assertAlmostEqual(profiler.stage_totals['Visitor'],
+                               sum(profile.stages.get('Visitor', 0.0)
+                                   for profile in profiler.files))
+
+        slowest = profiler.slowest(2)
+        self.assertEqual(len(slowest), 2)
+        self.assertTrue(slowest[0].wall_time >= slowest[1].wall_time)
+
+    def test_report(self):
+        profiler = Profiler()
+        batch = BatchParser(Budget(max_tokens=50), hooks=[profiler])
+        for result in batch.walk(self.plugins_dir, ('.nasl',)):
+            pass
+
+        out = StringIO()
+        profiler.write_report(out, top=3)
+        report = out.getvalue()
+        self.assertTrue(report.startswith('Processed 3 files (1 skipped) in '))
+        self.assertTrue('Top 3 slowest files' in report)
+        for name in SCRIPTS:
+            self.assertTrue(name in report)
+        self.assertTrue('(skipped: tokens limit exceeded (51))' in report)
+
+    def test_parse_string(self):
+        profiler = Profiler()
+        batch = BatchParser(hooks=[profiler])
+        batch.parse_string('x = 1;')
+        batch.parse_string('x = 1; y = x + 2; display(y);')
+        self.assertEqual([(profile.name, profile.size, profile.tokens, profile.nodes)
+                          for profile in profiler.files],
+                         [('<string>', None, 4, 4), ('<string>', None, 15, 13)])
+        self.assertEqual(sorted(profiler.files[0].stages), ['lex', 'parse'])
+
+        for result in batch.walk(self.plugins_dir, ('.nasl',)):
+            pass
+        self.assertEqual(len(profiler.files), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Cross-reference index tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.naslAST import FuncCall, iter_child_nodes, lexpos, lineno
+from pynasl.hashcons import HashConsArena
+from pynasl.xref import XrefIndex, CallSitesCollector
+
+
+SCRIPTS = {
+    'first.nasl': 'port = 80;\n'
+                  'r = http_send_recv(port:80, data:"GET " + "/");\n'
+                  'function check(p) {\n'
+                  '  return http_send_recv(port:p, data:req);\n'
+                  '}\n'
+                  'check(8080);\n',
+    'second.nasl': 'http_send_recv(port:443, data:"x");\n',
+}
+
+
+def _calls(tree):
+    """Return list of FuncCall nodes of tree sorted by position"""
+    result = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FuncCall):
+            result.append(node)
+        stack.extend(iter_child_nodes(node))
+    return sorted(result, key=lexpos)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.plugins_dir = tempfile.mkdtemp()
+        for name, source in SCRIPTS.iteritems():
+            self.write(name, source)
+        self.xref = XrefIndex(os.path.join(self.plugins_dir, 'xref.db'))
+        self.xref.update(self.plugins_dir)
+
+    def tearDown(self):
+        self.xref.close()
+        shutil.rmtree(self.plugins_dir)
+
+    def write(self, name, source):
+        with open(os.path.join(self.plugins_dir, name), 'w') as script:
+            script.write(source)
+
+    def test_calls_of(self):
+        calls = [(call.file_name, call.line, call.caller, call.args)
+                 for call in self.xref.calls_of('http_send_recv')]
+        self.assertEqual(calls, [
+            ('first.nasl', 2, None, [('port', '80'), ('data', '"GET /"')]),
+            ('first.nasl', 4, 'check', [('port', None), ('data', None)]),
+            ('second.nasl', 1, None, [('port', '443'), ('data', '"x"')]),
+        ])
+
+    def test_queries(self):
+        self.assertEqual([call.file_name for call in
+                          self.xref.calls_with_arg('http_send_recv', 'port', '443')],
+                         ['second.nasl'])
+        self.assertEqual(len(self.xref.calls_with_arg('http_send_recv', 'port')), 3)
+        self.assertEqual([call.callee for call in self.xref.calls_from(None, 'first.nasl')],
+                         ['http_send_recv', 'check'])
+        self.assertEqual([call.line for call in self.xref.calls_from('check')], [4])
+
+    def test_update(self):
+        self.assertEqual(self.xref.update(self.plugins_dir), 0)
+        self.write('second.nasl', 'display("changed");\n')
+        self.assertEqual(self.xref.update(self.plugins_dir), 1)
+        self.assertEqual(len(self.xref.calls_of('http_send_recv')), 2)
+        self.assertEqual(len(self.xref.calls_in('second.nasl')), 1)
+
+    def test_call_position(self):
+        # spaces, newlines and comments between name and '('
+        source = 'foo (1);\nx = bar\n(2);\nbaz # comment\n(3);\nqux(4);\n'
+        calls = _calls(naslparse_string(source))
+        self.assertEqual([(node.name, lexpos(node), lineno(node)) for node in calls],
+                         [(name, source.index(name), line)
+                          for name, line in (('foo', 1), ('bar', 2), ('baz', 4), ('qux', 6))])
+
+    def test_call_lines(self):
+        # multi-line strings and \r\n line breaks
+        source = 'desc = "a\r\nb\nc";\r\nfoo(1);\r\n\r\nbar(desc);\n'
+        collector = CallSitesCollector()
+        collector.visit(naslparse_string(source))
+        self.assertEqual([(callee, line) for line, callee, caller, args in collector.calls],
+                         [('foo', 4), ('bar', 6)])
+
+    def test_tree_isnt_changed(self):
+        arena = HashConsArena()
+        tree = naslparse_string('f(data:"a" + "b");', arena=arena)
+        text = repr(tree)
+        self.xref.add_file('third.nasl', tree)
+        self.assertEqual(repr(tree), text)
+        self.assertEqual([call.args for call in self.xref.calls_in('third.nasl')],
+                         [[('data', '"ab"')]])
+
+if __name__ == "__main__":
+    unittest.main()
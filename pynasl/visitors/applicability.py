@@ -0,0 +1,246 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Index of plugins applicable to host by required ports and KB keys.
+
+Plugin is applicable to host if
+  - any port of script_require_ports() is open (or any key is in KB),
+  - any port of script_require_udp_ports() is open,
+  - all keys of script_require_keys() are in KB,
+  - no key of script_exclude_keys() is in KB.
+Requirements of all plugins are kept as bitmaps (Python integers, bit i is
+plugin i) per port, per key and per set of required keys, so selection of
+plugins for host takes a few big integer operations:
+
+    index = ApplicabilityIndex.from_feed(plugins_dir)
+    index.save('applicability.idx')
+    plugins = index.applicable([22, 80], ['Services/www', 'ssh/login/uname'])
+
+Requirements which aren't literals (e.g. variables) can't be checked, so
+they never make plugin inapplicable.
+"""
+
+import os
+import cPickle
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor, ArgList, Arg
+from pynasl.visitors.callgraph.reachability import iter_bits
+
+
+logger = logging.getLogger("applicability")
+logger.setLevel(logging.INFO)
+
+
+# script_* functions => name of requirement
+REQUIREMENTS = {'script_require_ports': 'ports',
+                'script_require_udp_ports': 'udp_ports',
+                'script_require_keys': 'keys',
+                'script_exclude_keys': 'exclude_keys'}
+
+# value of not literal requirement
+UNKNOWN = None
+
+
+def _literal(node):
+    """Return value of string (without quotes) or integer literal, UNKNOWN for
+    other nodes
+    """
+    from pynasl.visitors.constfold import int_value, string_quote
+
+    if string_quote(node):
+        return node.value[1:-1]
+    value = int_value(node)
+    if value is not None:
+        return value
+    return UNKNOWN
+
+
+class _RequirementsCollector(BaseNodeVisitor):
+
+    def __init__(self):
+        self.requirements = {}
+
+    def visit_FuncCall(self, node):
+        name = REQUIREMENTS.get(node.name)
+        if name is not None and isinstance(node.args_list, ArgList):
+            values = self.requirements.setdefault(name, [])
+            for arg in node.args_list.args:
+                if isinstance(arg, Arg):
+                    values.append(_literal(arg.value))
+        self.generic_visit(node)
+
+
+def _add_ports(table, values, mask):
+    """Add plugin mask to bitmaps of ports values. Return False if plugin
+    doesn't require ports or requirement is unknown
+    """
+    if not values or UNKNOWN in values:
+        return False
+    for value in values:
+        table[value] = table.get(value, 0) | mask
+    return True
+
+
+class ApplicabilityIndex(object):
+    """Bitmaps of plugins by requirements
+
+    @ivar plugins: sorted list of plugin names, index in list is bit of plugin
+    @ivar requirements: dictionary plugin name => dictionary name of
+        requirement ('ports', 'udp_ports', 'keys', 'exclude_keys') => tuple of
+        ports (int) and keys (str), UNKNOWN for not literal values
+    """
+
+    # version of saved index, indexes of other versions are rebuilt
+    VERSION = 1
+
+    def __init__(self, requirements):
+        self.requirements = requirements
+        self.plugins = sorted(requirements)
+
+        # bitmap of plugins without requirement of ports (or with unknown port)
+        self._any_tcp = self._any_udp = 0
+        # port or key => bitmap of plugins that require it in script_require_ports
+        self._tcp = {}
+        self._udp = {}
+        # bitmap of plugins without required keys
+        self._no_keys = 0
+        # key => {frozenset of required keys with minimal key => bitmap of plugins},
+        # so only sets with at least one key of host are checked
+        self._key_sets = {}
+        # key => bitmap of plugins that exclude it
+        self._excluded = {}
+
+        for bit, name in enumerate(self.plugins):
+            mask = 1 << bit
+            plugin = requirements[name]
+            if not _add_ports(self._tcp, plugin.get('ports'), mask):
+                self._any_tcp |= mask
+            if not _add_ports(self._udp, plugin.get('udp_ports'), mask):
+                self._any_udp |= mask
+
+            keys = frozenset(key for key in plugin.get('keys', ()) if key is not UNKNOWN)
+            if keys:
+                key_sets = self._key_sets.setdefault(min(keys), {})
+                key_sets[keys] = key_sets.get(keys, 0) | mask
+            else:
+                self._no_keys |= mask
+
+            for key in plugin.get('exclude_keys', ()):
+                if key is not UNKNOWN:
+                    self._excluded[key] = self._excluded.get(key, 0) | mask
+
+    def __len__(self):
+        return len(self.plugins)
+
+    @classmethod
+    def from_feed(cls, plugins_dir, budget=None, hooks=None):
+        """Build index from *.nasl files in plugins_dir. Plugins that can't be
+        parsed are indexed without requirements, i.e. they are always applicable
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        """
+        from pynasl.batch import BatchParser
+        from pynasl.visitors.constfold import fold_constants
+
+        requirements = {}
+        batch = BatchParser(budget, debugging_script=False, hooks=hooks, skip_errors=True)
+        for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+            collector = _RequirementsCollector()
+            with batch.stage('Requirements'):
+                # "Services/" + "www" is literal too
+                collector.visit(fold_constants(tree))
+            requirements[name] = dict((requirement, tuple(values)) for requirement, values
+                                      in collector.requirements.iteritems())
+
+        for name, error in batch.skipped + batch.failed:
+            requirements[name] = {}
+
+        logger.info("%s plugins indexed" % len(requirements))
+        return cls(requirements)
+
+    def applicable_bits(self, ports=(), keys=(), udp_ports=()):
+        """Return bitmap of plugins applicable to host
+
+        @param ports: open TCP ports of host
+        @param keys: KB keys of host
+        @param udp_ports: open UDP ports of host
+        """
+        keys = frozenset(keys)
+
+        tcp = self._any_tcp
+        for value in ports:
+            tcp |= self._tcp.get(value, 0)
+        for key in keys:
+            tcp |= self._tcp.get(key, 0)
+
+        result = tcp
+        if result:
+            udp = self._any_udp
+            for value in udp_ports:
+                udp |= self._udp.get(value, 0)
+            result &= udp
+
+        if result:
+            required = self._no_keys
+            for key in keys:
+                for key_set, plugins in self._key_sets.get(key, {}).iteritems():
+                    if key_set <= keys:
+                        required |= plugins
+            result &= required
+
+        for key in keys:
+            excluded = self._excluded.get(key)
+            if excluded:
+                result &= ~excluded
+        return result
+
+    def names(self, bitset):
+        """Return list of names of plugins of bitmap"""
+        return [self.plugins[bit] for bit in iter_bits(bitset)]
+
+    def applicable(self, ports=(), keys=(), udp_ports=()):
+        """Return list of names of plugins applicable to host, see applicable_bits"""
+        return self.names(self.applicable_bits(ports, keys, udp_ports))
+
+    def save(self, file_name):
+        data = {'version': self.VERSION,
+                'requirements': self.requirements}
+        with open(file_name, 'wb') as index_file:
+            cPickle.dump(data, index_file, cPickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_name):
+        """Load index saved with save(). None is returned if file doesn't exist
+        or was saved by other version
+        """
+        if not os.path.exists(file_name):
+            return None
+
+        with open(file_name, 'rb') as index_file:
+            data = cPickle.load(index_file)
+        if data.get('version') != cls.VERSION:
+            logger.info("Index %s has other version and must be rebuilt" % file_name)
+            return None
+        return cls(data['requirements'])
+
+
+def _log_applicable(plugins_dir, ports, keys):
+    index = ApplicabilityIndex.from_feed(plugins_dir)
+    plugins = index.applicable(ports, keys)
+    logger.info("%s of %s plugins are applicable" % (len(plugins), len(index)))
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    args = sys.argv[1:]
+    _log_applicable(os.environ['KAFTI_NASLSCRIPTS_PATH'],
+                    [int(arg) for arg in args if arg.isdigit()],
+                    [arg for arg in args if not arg.isdigit()])
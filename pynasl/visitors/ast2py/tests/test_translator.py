@@ -0,0 +1,41 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Translator tests of single statements"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.constfold import fold_constants
+from pynasl.visitors.ast2py.translator import Translator
+
+
+DESCRIPTION = 'if (description) { script_id(1); exit(0); } '
+
+
+def _translate(source):
+    """Return stripped lines of main() for statements of source"""
+    tree = fold_constants(naslparse_string(DESCRIPTION + source))
+    lines = Translator().visit(tree).splitlines()
+    start = lines.index('def main():') + 1
+    end = lines.index("if __name__ == '__main__':")
+    return [line.strip() for line in lines[start:end] if line.strip()]
+
+
+class Test(unittest.TestCase):
+
+    def test_logical_chains(self):
+        self.assertEqual(_translate('if (a && b) x = 1;'), ['if a and b:', 'x = 1'])
+        self.assertEqual(_translate('if (a && b && c) x = 1;'), ['if a and b and c:', 'x = 1'])
+        self.assertEqual(_translate('if (a || b) x = 1;'), ['if a or b:', 'x = 1'])
+        self.assertEqual(_translate('if (a || b || c) x = 1;'), ['if a or b or c:', 'x = 1'])
+
+    def test_folded_concatenation(self):
+        self.assertEqual(_translate('x = "A" + "B";'), ['x = "AB"'])
+        self.assertEqual(_translate('x = "A" + 1 + y;'), ['x = "A" + str(1) + str(y)'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,6 +18,14 @@ import re
 from pynasl.naslAST import NodeVisitor, VarName, InstrList
 
 
+# nasl operators which are written differently in python, the same table is
+# used for binary expressions and flattened chains (NaryExpression)
+NASL_TO_PY_OPERATORS = {'||': 'or',
+                        '&&': 'and',
+                        '>!<': 'not in',
+                        '><': 'in'}
+
+
 class Translator(NodeVisitor):
     STATE_GET_METADATA = 0
     STATE_MAIN_CODE = 1
@@ -76,10 +84,10 @@ class Translator(NodeVisitor):
 
     def visit_ArgAttribute(self, node):
         nasl_to_py = {'socket': 'soc'}
-        node.att_name = nasl_to_py.get(node.att_name, node.att_name)
+        att_name = nasl_to_py.get(node.att_name, node.att_name)
         
         str_value = self.visit(node.value)
-        return (node.att_name, str_value)
+        return (att_name, str_value)
 
     def visit_FuncCall(self, node):
         if self._state == self.STATE_GET_METADATA and node.name == 'exit':
@@ -105,9 +113,9 @@ class Translator(NodeVisitor):
         nasl_to_py = {'string': 'nasl_string',
                       'ord': 'nasl_ord',
                       'int': 'nasl_int'}
-        node.name = nasl_to_py.get(node.name, node.name)
+        name = nasl_to_py.get(node.name, node.name)
         
-        return "%s(%s)" % (node.name, str_args)
+        return "%s(%s)" % (name, str_args)
 
     def visit_FuncDecl(self, node):
         str_args = self.visit(node.args)
@@ -218,10 +226,6 @@ class Translator(NodeVisitor):
         str_lexpr = self.visit(node.lexpr)
         str_rexpr = self.visit(node.rexpr)
         
-        nasl_to_py = {'||': 'or',
-                     '>!<': 'not in',
-                     '><': 'in'}
-        
         if node.operation  == '+':
             # nasl can concatenate str and int, python can't
             # TODO: concatenate str var and int var
@@ -234,11 +238,26 @@ class Translator(NodeVisitor):
             return "%s %s %s" % (str_lexpr, node.operation, str_rexpr)
         elif node.operation in ('-', '==', '!='):
             return "%s %s %s" % (str_lexpr, node.operation, str_rexpr)
-        elif node.operation in nasl_to_py:
-            return "%s %s %s" % (str_lexpr, nasl_to_py[node.operation], str_rexpr)
+        elif node.operation in NASL_TO_PY_OPERATORS:
+            return "%s %s %s" % (str_lexpr, NASL_TO_PY_OPERATORS[node.operation], str_rexpr)
         else:
             return "Expression(%s %s %s)" % (str_lexpr, node.operation, str_rexpr)
 
+    def visit_NaryExpression(self, node):
+        str_elems = [self.visit(elem) for elem in node.elems]
+
+        if node.operation == '+':
+            # nasl can concatenate str and int, python can't
+            is_str = [elem[:1] == "'" or '"' in elem for elem in str_elems]
+            if any(is_str):
+                str_elems = [elem if elem_is_str else 'str(%s)' % elem
+                             for elem, elem_is_str in zip(str_elems, is_str)]
+            return ' + '.join(str_elems)
+        elif node.operation in NASL_TO_PY_OPERATORS:
+            return (' %s ' % NASL_TO_PY_OPERATORS[node.operation]).join(str_elems)
+        else:
+            return "Expression(%s)" % (' %s ' % node.operation).join(str_elems)
+
     def visit_RExpression(self, node):
         str_rexpr = self.visit(node.rexpr)
         if node.operation == '!':
@@ -307,11 +326,22 @@ class Translator(NodeVisitor):
         return ''
 
 
-def ast2py_str(path):
-    from pynasl.naslparse import naslparser
+def ast2py_str(path, hooks=None):
+    """Translate nasl script to python and return string with python module
     
-    ast_string = Translator()
-    return ast_string.visit(naslparser(path, True)) 
+    @param path: string with path to nasl script
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    """
+    from pynasl.batch import BatchParser
+    from pynasl.visitors.constfold import fold_constants
+
+    batch = BatchParser(hooks=hooks)
+    for name, full_path, tree in batch.process([path]):
+        with batch.stage('ConstantFolding'):
+            tree = fold_constants(tree)
+        with batch.stage('Translator'):
+            module_str = Translator().visit(tree)
+    return module_str
     
 
 def _print_and_save_ast(script_name):
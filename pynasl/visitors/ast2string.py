@@ -83,6 +83,10 @@ class AST2String(NodeVisitor):
         str_rexpr = self.visit(node.rexpr)
         return "Expression(%s %s %s)" % (str_lexpr, node.operation, str_rexpr)
 
+    def visit_NaryExpression(self, node):
+        separator = ' %s ' % node.operation
+        return "NaryExpression(%s)" % separator.join([self.visit(elem) for elem in node.elems])
+
     def visit_RExpression(self, node):
         str_rexpr = self.visit(node.rexpr)
         return "Expression(%s %s)" % (node.operation, str_rexpr)
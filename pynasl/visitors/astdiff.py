@@ -0,0 +1,258 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""AST level diff of nasl scripts and feeds.
+
+Changes in comments and formatting don't change AST, so scripts which differ
+only in them are reported as unchanged.
+"""
+
+import os
+import time
+import logging
+from collections import defaultdict
+
+from pynasl.naslAST import BaseNodeVisitor, FuncDecl, structural_hash
+
+
+logger = logging.getLogger("astdiff")
+logger.setLevel(logging.INFO)
+
+
+# caller name used for calls outside of functions
+MAIN = '<main>'
+
+
+class _CallsCollector(BaseNodeVisitor):
+    """Counts calls of functions in every function of script"""
+
+    def __init__(self):
+        self.calls = defaultdict(lambda: defaultdict(int))
+        self.caller_func = MAIN
+
+    def visit_FuncCall(self, node):
+        self.calls[self.caller_func][node.name] += 1
+        self.generic_visit(node)
+
+    def visit_FuncDecl(self, node):
+        prev_caller_func = self.caller_func
+        self.caller_func = node.name
+        self.generic_visit(node)
+        self.caller_func = prev_caller_func
+
+
+def _top_level(tree):
+    """Return (dictionary name => FuncDecl, dictionary hash => count of other statements)"""
+    functions = {}
+    statements = defaultdict(int)
+    if tree is not None:
+        for elem in tree.elems:
+            if isinstance(elem, FuncDecl):
+                functions[elem.name] = elem
+            elif elem is not None:
+                statements[structural_hash(elem)] += 1
+    return functions, statements
+
+
+def _calls(tree):
+    collector = _CallsCollector()
+    if tree is not None:
+        collector.visit(tree)
+    return collector.calls
+
+
+class ScriptDiff(object):
+    """Semantic changes between two versions of script
+
+    @ivar added_functions: list of names of added functions
+    @ivar removed_functions: list of names of removed functions
+    @ivar modified_functions: list of names of functions with changed arguments or body
+    @ivar added_statements: number of added top level statements (except functions)
+    @ivar removed_statements: number of removed top level statements (except functions)
+    @ivar added_calls: list of (caller, callee, count) for new calls
+        (caller is MAIN for calls outside of functions)
+    @ivar removed_calls: list of (caller, callee, count) for removed calls
+    """
+
+    def __init__(self):
+        self.added_functions = []
+        self.removed_functions = []
+        self.modified_functions = []
+        self.added_statements = 0
+        self.removed_statements = 0
+        self.added_calls = []
+        self.removed_calls = []
+
+    @property
+    def changed(self):
+        return bool(self.added_functions or self.removed_functions or
+                    self.modified_functions or self.added_statements or
+                    self.removed_statements)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def diff_trees(old, new):
+    """Return ScriptDiff between old and new AST of script"""
+    result = ScriptDiff()
+    if old is not None and new is not None and structural_hash(old) == structural_hash(new):
+        return result
+
+    old_functions, old_statements = _top_level(old)
+    new_functions, new_statements = _top_level(new)
+
+    result.added_functions = sorted(set(new_functions) - set(old_functions))
+    result.removed_functions = sorted(set(old_functions) - set(new_functions))
+    result.modified_functions = sorted(name for name in set(old_functions) & set(new_functions)
+                                       if old_functions[name] != new_functions[name])
+
+    for digest in set(old_statements) | set(new_statements):
+        delta = new_statements.get(digest, 0) - old_statements.get(digest, 0)
+        if delta > 0:
+            result.added_statements += delta
+        else:
+            result.removed_statements -= delta
+
+    old_calls = _calls(old)
+    new_calls = _calls(new)
+    for caller in sorted(set(old_calls) | set(new_calls)):
+        old_callees = old_calls.get(caller, {})
+        new_callees = new_calls.get(caller, {})
+        for callee in sorted(set(old_callees) | set(new_callees)):
+            delta = new_callees.get(callee, 0) - old_callees.get(callee, 0)
+            if delta > 0:
+                result.added_calls.append((caller, callee, delta))
+            elif delta < 0:
+                result.removed_calls.append((caller, callee, -delta))
+
+    return result
+
+
+def diff_scripts(old_path, new_path, budget=None):
+    """Return ScriptDiff between two versions of script"""
+    from pynasl.batch import BatchParser
+
+    batch = BatchParser(budget)
+    return diff_trees(batch.parse(old_path), batch.parse(new_path))
+
+
+class FeedDiff(object):
+    """Changes between two versions of feed
+
+    @ivar added_files: list of relative paths of new scripts
+    @ivar removed_files: list of relative paths of removed scripts
+    @ivar modified: dictionary relative path => ScriptDiff for semantically changed scripts
+    @ivar unchanged: number of scripts without semantic changes
+    @ivar failed: dictionary relative path => error for scripts that can't be parsed
+    """
+
+    def __init__(self):
+        self.added_files = []
+        self.removed_files = []
+        self.modified = {}
+        self.unchanged = 0
+        self.failed = {}
+
+
+def _scripts(top):
+    result = set()
+    for root, dirs, files in os.walk(top):
+        for name in files:
+            if name.endswith(('.nasl', '.inc')):
+                result.add(os.path.relpath(os.path.join(root, name), top))
+    return result
+
+
+def _same_content(first_path, second_path):
+    if os.path.getsize(first_path) != os.path.getsize(second_path):
+        return False
+    with open(first_path, 'rb') as first:
+        with open(second_path, 'rb') as second:
+            return first.read() == second.read()
+
+
+def _diff_pair(args):
+    """Worker function: return (relative path, ScriptDiff or None if content is
+    same, error, name of worker process, busy time)
+    """
+    from multiprocessing import current_process
+    from pynasl.exceptions import LexicalError, BudgetExceeded
+
+    start = time.time()
+    rel_path, old_path, new_path, budget = args
+    diff = error = None
+    if not _same_content(old_path, new_path):
+        try:
+            diff = diff_scripts(old_path, new_path, budget)
+        except (LexicalError, SyntaxError, BudgetExceeded), why:
+            error = repr(why)
+    return rel_path, diff, error, current_process().name, time.time() - start
+
+
+def diff_feeds(old_dir, new_dir, processes=1, budget=None, metrics=None):
+    """Compare two versions of feed
+
+    @param old_dir: string with path to old version of nasl scripts
+    @param new_dir: string with path to new version of nasl scripts
+    @param processes: number of worker processes. None means number of CPUs
+    @param budget: pynasl.batch.Budget with per-file limits
+    @param metrics: pynasl.metrics.Metrics, busy time of every worker process
+        is added to it. If processes is 1, scripts are compared in the main
+        process and its time is added to metrics.worker
+    @return FeedDiff
+    """
+    old_scripts = _scripts(old_dir)
+    new_scripts = _scripts(new_dir)
+
+    result = FeedDiff()
+    result.added_files = sorted(new_scripts - old_scripts)
+    result.removed_files = sorted(old_scripts - new_scripts)
+
+    tasks = [(rel_path, os.path.join(old_dir, rel_path), os.path.join(new_dir, rel_path), budget)
+             for rel_path in sorted(old_scripts & new_scripts)]
+
+    if processes == 1:
+        diffs = map(_diff_pair, tasks)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        diffs = pool.imap_unordered(_diff_pair, tasks, chunksize=64)
+
+    try:
+        for index, (rel_path, diff, error, worker, elapsed) in enumerate(diffs):
+            if metrics is not None:
+                metrics.add_busy_time(worker if pool is not None else metrics.worker, elapsed)
+            if error is not None:
+                logger.error("Failed %s: %s" % (rel_path, error))
+                result.failed[rel_path] = error
+            elif diff is not None and diff.changed:
+                result.modified[rel_path] = diff
+            else:
+                result.unchanged += 1
+
+            if (index + 1) % 1000 == 0:
+                logger.info("Processed %s files" % (index + 1))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    logger.info("%s added, %s removed, %s modified, %s unchanged scripts" %
+                (len(result.added_files), len(result.removed_files),
+                 len(result.modified), result.unchanged))
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    feed_diff = diff_feeds(sys.argv[1], sys.argv[2], processes=None)
+    for rel_path in sorted(feed_diff.modified):
+        logger.info("%s: %s" % (rel_path, feed_diff.modified[rel_path].to_dict()))
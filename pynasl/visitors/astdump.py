@@ -0,0 +1,190 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Streaming AST dumpers.
+
+Unlike repr() of nodes, dumpers write AST to file-like object in a single pass
+without building strings for subtrees, so even huge scripts can be dumped.
+"""
+
+import sys
+import json
+
+from pynasl.naslAST import Node
+
+
+# number of pieces collected before writing them to output
+_BUFFER_SIZE = 4096
+
+
+def _value_pieces(value):
+    """Pieces of '%s' % value"""
+    if isinstance(value, Node):
+        return [value]
+    elif isinstance(value, list):
+        pieces = ['[']
+        for index, elem in enumerate(value):
+            if index:
+                pieces.append(', ')
+            pieces.append(elem if isinstance(elem, Node) else repr(elem))
+        pieces.append(']')
+        return pieces
+    else:
+        return ['%s' % (value,)]
+
+
+def _template(template, *fields):
+    """Pieces of node for template with '%s' for every field"""
+    parts = template.split('%s')
+
+    def pieces(node):
+        result = [parts[0]]
+        for field, part in zip(fields, parts[1:]):
+            result.extend(_value_pieces(getattr(node, field)))
+            result.append(part)
+        return result
+
+    return pieces
+
+
+def _joined(prefix, separator, suffix):
+    """Pieces of node with list of elems joined by separator"""
+    def pieces(node):
+        result = [prefix]
+        for index, elem in enumerate(node.elems):
+            if index:
+                result.append(separator)
+            result.extend(_value_pieces(elem))
+        result.append(suffix)
+        return result
+
+    return pieces
+
+
+_if_else = _template("\nIf %s\n%s\nElse\n%s\n", 'condition', 'elems', 'else_instr')
+_if = _template("\nIf %s\n%s\n", 'condition', 'elems')
+
+
+def _nary(node):
+    return _joined("NaryExpression(", ' %s ' % node.operation, ')')(node)
+
+
+# node class name => function returning pieces (strings and child nodes) of
+# the same text that repr() of node gives
+_TEXT_FORMATS = {
+    'Atom': _template("Atom(%s)", 'value'),
+    'IpAddr': _template("IpAddress(%s)", 'value'),
+    'VarName': _template("VarName(%s)", 'value'),
+    'LocalVar': _template("LocalVar(%s)", 'value'),
+    'GlobalVar': _template("GlobalVar(%s)", 'value'),
+    'Arg': _template("Arg(%s)", 'value'),
+    'ArgAttribute': _template("Arg('%s':%s)", 'att_name', 'value'),
+    'FuncCall': _template("FuncCall('%s', %s)", 'name', 'args_list'),
+    'FuncDecl': _template("\nFuncDecl('%s', %s)\n%s", 'name', 'args', 'elems'),
+    'ArgList': _template("ArgList%s", 'args'),
+    'ArgDeclList': _template("ArgDeclList%s", 'args'),
+    'InstrList': _joined("Instructions\n", '\n', ''),
+    'IfBlock': lambda node: _if_else(node) if node.else_instr else _if(node),
+    'Affectation': _template("Affectation(%s %s %s)", 'lvalue', 'operation', 'expr'),
+    'Repetition': _template("Repetition(%s %s)", 'func', 'expr'),
+    'Include': _template("Include(%s)", 'filename'),
+    'Expression': _template("Expression(%s %s %s)", 'lexpr', 'operation', 'rexpr'),
+    'NaryExpression': _nary,
+    'RExpression': _template("Expression(%s %s)", 'operation', 'rexpr'),
+    'PostIncr': _template("%s%s", 'value', 'operation'),
+    'PreIncr': _template("%s%s", 'operation', 'value'),
+    'ArrayElem': _template("%s[%s]", 'name', 'index'),
+    'ArrayDataList': _joined("ArrayDataList(", ', ', ')'),
+    'ConstArray': _template("ConstArray[%s]", 'elems'),
+    'ForLoop': _template("\nfor (%s; %s; %s)\n%s", 'init', 'condition', 'increment', 'elems'),
+    'ForeachLoop': _template("\nforeach %s in %s\n%s", 'element', 'expr', 'elems'),
+    'WhileLoop': _template("\nwhile %s\n%s", 'expr', 'elems'),
+    'RepeatLoop': _template("\nrepeat\n%s\nuntil %s", 'elems', 'expr'),
+    'BreakInstr': _template("\nbreak\n"),
+    'ContinueInstr': _template("\ncontinue\n"),
+    'ReturnInstr': _template("return %s\n", 'expr'),
+    'Empty': _template("EMPTY"),
+}
+
+
+def dump_text(tree, out):
+    """Write tree to out in the same text format as repr(tree)"""
+    buf = []
+    stack = [tree]
+    while stack:
+        piece = stack.pop()
+        if isinstance(piece, Node):
+            pieces = _TEXT_FORMATS[piece.__class__.__name__](piece)
+            pieces.reverse()
+            stack.extend(pieces)
+        else:
+            buf.append(piece)
+            if len(buf) >= _BUFFER_SIZE:
+                out.write(''.join(buf))
+                del buf[:]
+    out.write(''.join(buf))
+
+
+def _json_value(value):
+    """Byte strings of script are decoded as latin-1, because scripts aren't
+    always UTF-8. Every byte is one character, so value.encode('latin-1')
+    gives original bytes back
+    """
+    if isinstance(value, str):
+        return value.decode('latin-1')
+    return value
+
+
+def dump_jsonl(tree, out):
+    """Write tree to out in JSON Lines format, one line per node in pre-order.
+
+    Every line is object with keys 'id', 'parent' (id of parent node or None),
+    'field' (field of parent that contains node), 'type' (node class name) and
+    values of node fields which aren't nodes. Strings are decoded as latin-1.
+    """
+    next_id = 0
+    stack = [(tree, None, None)]
+    while stack:
+        node, parent, field = stack.pop()
+        node_id = next_id
+        next_id += 1
+
+        record = {'id': node_id, 'parent': parent, 'field': field,
+                  'type': node.__class__.__name__}
+        children = []
+        for field_name in node.__slots__:
+            value = getattr(node, field_name)
+            if isinstance(value, Node):
+                children.append((value, node_id, field_name))
+            elif isinstance(value, list):
+                items = [_json_value(elem) for elem in value if not isinstance(elem, Node)]
+                if items:
+                    record[field_name] = items
+                children.extend((elem, node_id, field_name)
+                                for elem in value if isinstance(elem, Node))
+            else:
+                record[field_name] = _json_value(value)
+
+        out.write(json.dumps(record, sort_keys=True))
+        out.write('\n')
+
+        children.reverse()
+        stack.extend(children)
+
+
+def _dump_file(file_name, jsonl=False):
+    from pynasl.naslparse import naslparser
+
+    tree = naslparser(file_name, True)
+    if jsonl:
+        dump_jsonl(tree, sys.stdout)
+    else:
+        dump_text(tree, sys.stdout)
+        sys.stdout.write('\n')
+
+
+if __name__ == "__main__":
+    _dump_file(sys.argv[1], '--jsonl' in sys.argv[2:])
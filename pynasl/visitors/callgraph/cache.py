@@ -0,0 +1,162 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Persistent cache of call graph of all nasl scripts.
+
+Cache keeps contribution of every *.nasl and *.inc file to call graph
+(declared functions and edges) and is updated incrementally: only files with
+changed modification time or size are parsed again, edges of removed files
+are dropped:
+
+    cache = CallGraphCache.load('full_call_graph.cache')
+    cache.update(plugins_dir)
+    cache.save('full_call_graph.cache')
+    graph = cache.graph()
+"""
+
+import os
+import cPickle
+import logging
+
+from pynasl.visitors.callgraph.callgraph import CallGraph
+from pynasl.visitors.callgraph.compact import CompactCallGraph
+
+
+logger = logging.getLogger("CallGraphCache")
+logger.setLevel(logging.INFO)
+
+
+class FileContribution(object):
+    """Part of call graph from one file
+
+    @ivar names: tuple of names of nodes, index in tuple is local id of node
+    @ivar declared: tuple of local ids of functions declared in file
+    @ivar edges: tuple of (source, target) local ids
+    """
+    __slots__ = ['names', 'declared', 'edges']
+
+    def __init__(self, names, declared, edges):
+        self.names = names
+        self.declared = declared
+        self.edges = edges
+
+    def __getstate__(self):
+        return (self.names, self.declared, self.edges)
+
+    def __setstate__(self, state):
+        self.names, self.declared, self.edges = state
+
+    @classmethod
+    def from_tree(cls, file_name, tree):
+        call_graph = CallGraph()
+        call_graph.set_caller_func(file_name)
+        call_graph.set_file_name(file_name)
+        if tree is not None:
+            call_graph.visit(tree)
+
+        graph = call_graph.g
+        # interned names are pickled once for the whole cache
+        names = tuple(intern(name) for name in graph.names)
+        declared = tuple(node_id for node_id, name in enumerate(graph.file_names)
+                         if name is not None)
+        ids = dict((name, node_id) for node_id, name in enumerate(names))
+        edges = tuple((ids[source], ids[target]) for source, target in graph.edges())
+        return cls(names, declared, edges)
+
+
+class CallGraphCache(object):
+    """Call graph of scripts kept as contributions of files
+
+    @ivar files: dictionary file name => (modification time, size) of cached file
+    @ivar contributions: dictionary file name => FileContribution
+    """
+
+    # version of saved cache, caches of other versions are rebuilt
+    VERSION = 1
+
+    def __init__(self):
+        self.files = {}
+        self.contributions = {}
+        self._graph = None
+
+    def __len__(self):
+        return len(self.files)
+
+    def set_file(self, name, tree, stat=None):
+        """Replace contribution of file name with calls from tree (None for file
+        without calls)
+        """
+        self.contributions[name] = FileContribution.from_tree(name, tree)
+        self.files[name] = stat
+        self._graph = None
+
+    def remove(self, name):
+        """Remove file from cache"""
+        del self.contributions[name]
+        del self.files[name]
+        self._graph = None
+
+    def update(self, plugins_dir, budget=None, hooks=None):
+        """Synchronize cache with *.nasl and *.inc files in plugins_dir
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        @return set of names of added, changed and removed files
+        """
+        from pynasl.batch import update_index
+
+        def add(name, full_path, tree, stat):
+            self.set_file(name, tree, stat)
+
+        changed = update_index(plugins_dir, dict(self.files), self.remove, add,
+                               'CallGraph', budget, hooks)
+
+        logger.info("%s files cached, %s changed" % (len(self.files), len(changed)))
+        return changed
+
+    def graph(self):
+        """Return CompactCallGraph of all cached files. Graph is shared until
+        the next change of cache, so it must not be changed
+        """
+        if self._graph is not None:
+            return self._graph
+
+        graph = CompactCallGraph()
+        for file_name in sorted(self.contributions):
+            contribution = self.contributions[file_name]
+            node_ids = [graph.node_id(name) for name in contribution.names]
+            for local_id in contribution.declared:
+                graph.add_node(contribution.names[local_id], file_name)
+            for source, target in contribution.edges:
+                graph.add_edge_ids(node_ids[source], node_ids[target])
+        self._graph = graph
+        return graph
+
+    def save(self, file_name):
+        data = {'version': self.VERSION,
+                'files': self.files,
+                'contributions': self.contributions}
+        with open(file_name, 'wb') as cache_file:
+            cPickle.dump(data, cache_file, cPickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_name):
+        """Load cache saved with save(). Empty cache is returned if file doesn't
+        exist or was saved by other version, so it is rebuilt by update()
+        """
+        cache = cls()
+        if not os.path.exists(file_name):
+            return cache
+
+        with open(file_name, 'rb') as cache_file:
+            data = cPickle.load(cache_file)
+        if data.get('version') != cls.VERSION:
+            logger.info("Cache %s has other version and will be rebuilt" % file_name)
+            return cache
+
+        cache.files = data['files']
+        cache.contributions = data['contributions']
+        return cache
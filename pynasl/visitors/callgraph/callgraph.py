@@ -10,9 +10,8 @@ import os
 import logging
 from collections import defaultdict
 
-import networkx as nx
-
 from pynasl.naslAST import BaseNodeVisitor
+from pynasl.visitors.callgraph.compact import CompactCallGraph
 
 
 logger = logging.getLogger("CallGraph")
@@ -21,7 +20,7 @@ logger.setLevel(logging.INFO)
 
 class CallGraph(BaseNodeVisitor):
     def __init__(self):
-        self.g = nx.DiGraph()
+        self.g = CompactCallGraph()
         self.caller_func = None
         self.file_name = None
     
@@ -42,8 +41,7 @@ class CallGraph(BaseNodeVisitor):
         prev_caller_func = self.caller_func
         self.caller_func = node.name
         
-        self.g.add_node(node.name)
-        self.g.node[node.name]['file_name'] = self.file_name
+        self.g.add_node(node.name, self.file_name)
         
         self.generic_visit(node)
         self.caller_func = prev_caller_func
@@ -59,58 +57,50 @@ class CallGraph(BaseNodeVisitor):
         self.file_name = name
 
 
-def generate_graph(dir, script_name=None):
+def generate_graph(dir, script_name=None, budget=None, hooks=None):
+    """Generate call graph for nasl scripts in dir
     
-    from pynasl.naslparse import naslparser
+    @param dir: string with path to nasl scripts
+    @param script_name: string with name of the only *.nasl script which is processed
+        with *.inc files. Default value - None, that means process all scripts
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    @return generated CompactCallGraph
+    """
+    from pynasl.batch import BatchParser
     
     logger.info("Generating graph started")
     
+    def accept(name):
+        return name.endswith('.inc') or \
+            (name.endswith('.nasl') and (script_name is None or script_name == name))
+    
     call_tree = CallGraph()
-    total_files = 0
-    for root,dirs,files in os.walk(dir):
-        for name in files:
-            if name.endswith('.inc') or (name.endswith('.nasl') and (script_name is None or script_name == name)):
-                fullname = os.path.join(root, name)
-                call_tree.set_caller_func(name)
-                call_tree.set_file_name(name)
-                
-                call_tree.visit(naslparser(fullname, True))
-                
-                total_files += 1
-                if total_files % 1000 == 0:
-                    logger.info("Processed %s files" % total_files)
+    batch = BatchParser(budget, hooks=hooks)
+    for name, fullname, tree in batch.walk(dir, accept):
+        call_tree.set_caller_func(name)
+        call_tree.set_file_name(name)
+        
+        with batch.stage('CallGraph'):
+            call_tree.visit(tree)
     
     logger.info("Generated graph with %s nodes and %s edges. Processed %s files" % 
-                (call_tree.g.number_of_nodes(), call_tree.g.number_of_edges(), total_files))
+                (call_tree.g.number_of_nodes(), call_tree.g.number_of_edges(), batch.total_files))
     
     return call_tree.g
 
 
 def _save_graph(graph, file_name='graph'):
-    nx.write_gexf(graph, file_name + '.gexf')
-
-
-def _open_graph(file_name):
-    file_name += '.gexf'
-    try:
-        graph = nx.read_gexf(file_name)
-        logger.info("Use saved graph in %s" % file_name)
-    except IOError, why: 
-        logger.error("Can't open saved graph. Error: %s" % why)
-        graph = None
+    import networkx as nx
     
-    return graph
+    nx.write_gexf(graph.to_networkx(), file_name + '.gexf')
 
 
 def _print_function(tree):
     internal_function = []
     func_call = defaultdict(list)
-    for node in tree.nodes_iter(data=True):
-        function = node[0]
-        atr = node[1]
-        
-        if atr:
-            f_n = atr['file_name']
+    for function, f_n in zip(tree.names, tree.file_names):
+        if f_n is not None:
             func_call[f_n].append(function)
         else:
             internal_function.append(function)
@@ -146,8 +136,7 @@ def _cut_description_function(tree):
                             'script_tag',
                             'script_version']
     
-    tree.remove_nodes_from(description_function)
-    return tree
+    return tree.subgraph(name for name in tree if name not in description_function)
 
 
 def _generate_call_graph(script_name, plugins_dir, dependencies=False):
@@ -156,27 +145,26 @@ def _generate_call_graph(script_name, plugins_dir, dependencies=False):
     @param script_name: string with script name for generating call graph    
     @param plugins_dir: string with path to nasl scripts
     @param dependencies: True, that means generate graph with dependencies file in 'script_dependencies', 
-         save result in 'script_name_depend'.gexf, and save full call graph if it not exist.
+         save result in 'script_name_depend'.gexf. Full call graph is kept in cache
+         'full_call_graph.cache', only files changed since the last run are parsed.
          Default value - False, that means not generate graph with dependencies file in 'script_dependencies'
     @return generated graph
     """
+    from pynasl.visitors.callgraph.cache import CallGraphCache
     
-    import networkx.algorithms.traversal.breadth_first_search as nx_breadth_first_search
-
     save_graph_name = script_name
-    full_graph_name = 'full_call_graph'
+    full_graph_cache = 'full_call_graph.cache'
     
     if dependencies:
-        graph = _open_graph(full_graph_name)
-        if graph is None:   
-            graph = generate_graph(plugins_dir)
-            _save_graph(graph, full_graph_name)
+        cache = CallGraphCache.load(full_graph_cache)
+        if cache.update(plugins_dir):
+            cache.save(full_graph_cache)
+        graph = cache.graph()
         save_graph_name += '_depend' 
     else:
         graph = generate_graph(plugins_dir, script_name)
     
-    tree = nx_breadth_first_search.bfs_tree(graph, script_name)
-    tree = graph.subgraph(tree.nodes())
+    tree = graph.subgraph(graph.bfs([script_name]))
     
     tree = _cut_description_function(tree)
     
@@ -0,0 +1,215 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Compact directed graph with integer node ids.
+
+Nodes (function and script names) are interned to ids 0..n-1, edges are kept
+in compressed sparse row (CSR) form for forward and reverse direction in
+array.array buffers: successors of node i are
+indices[indptr[i]:indptr[i + 1]]. Graph of the whole feed takes a few
+megabytes, traversals don't touch Python objects except node ids:
+
+    graph = CompactCallGraph()
+    graph.add_edge('http_get', 'http_open_socket')
+    graph.bfs(['http_get'])
+    graph.subgraph(graph.bfs(['http_get'])).to_networkx()
+
+Edges can be added at any time, CSR arrays are rebuilt on the next query.
+"""
+
+from array import array
+from collections import deque
+
+
+def _csr(size, pairs):
+    """Return (indptr, indices) for list of (row, column) sorted by row"""
+    indptr = array('l', [0]) * (size + 1)
+    for row, column in pairs:
+        indptr[row + 1] += 1
+    for i in xrange(size):
+        indptr[i + 1] += indptr[i]
+    return indptr, array('l', (column for row, column in pairs))
+
+
+class CompactCallGraph(object):
+    """Directed graph with interned node names and CSR adjacency arrays
+
+    @ivar names: list of node names, index in list is id of node
+    @ivar file_names: list with name of file where node is declared (or None)
+        for every node id
+    """
+
+    def __init__(self):
+        self.names = []
+        self.file_names = []
+        self._ids = {}
+        # edges added after the last build of CSR arrays
+        self._sources = array('l')
+        self._targets = array('l')
+        self._forward = None
+        self._reverse = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def node_id(self, name):
+        """Return interned id of node, node is added if it doesn't exist"""
+        node_id = self._ids.get(name)
+        if node_id is None:
+            node_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+            self.file_names.append(None)
+            self._forward = self._reverse = None
+        return node_id
+
+    def add_node(self, name, file_name=None):
+        node_id = self.node_id(name)
+        if file_name is not None:
+            self.file_names[node_id] = file_name
+        return node_id
+
+    def add_edge(self, source, target):
+        self._sources.append(self.node_id(source))
+        self._targets.append(self.node_id(target))
+        self._forward = self._reverse = None
+
+    def add_edge_ids(self, source, target):
+        """Add edge between nodes with already interned ids"""
+        self._sources.append(source)
+        self._targets.append(target)
+        self._forward = self._reverse = None
+
+    def add_edges_from(self, edges):
+        for source, target in edges:
+            self.add_edge(source, target)
+
+    def _build(self):
+        if self._forward is not None:
+            return
+        pairs = sorted(set(zip(self._sources, self._targets)))
+        # duplicates are dropped, so buffers keep only unique edges
+        self._sources = array('l', (source for source, target in pairs))
+        self._targets = array('l', (target for source, target in pairs))
+        self._forward = _csr(len(self.names), pairs)
+        self._reverse = _csr(len(self.names),
+                             sorted((target, source) for source, target in pairs))
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        self._build()
+        return len(self._sources)
+
+    def edges(self):
+        """Return list of (source, target) names"""
+        self._build()
+        names = self.names
+        return [(names[source], names[target])
+                for source, target in zip(self._sources, self._targets)]
+
+    def adjacency(self, reverse=False):
+        """Return (indptr, indices) arrays of CSR adjacency, ids of successors
+        (predecessors if reverse is True) of node i are indices[indptr[i]:indptr[i + 1]]
+        """
+        self._build()
+        return self._reverse if reverse else self._forward
+
+    def _adjacent(self, node_id, reverse=False):
+        indptr, indices = self._reverse if reverse else self._forward
+        return indices[indptr[node_id]:indptr[node_id + 1]]
+
+    def successors(self, name):
+        self._build()
+        return [self.names[i] for i in self._adjacent(self._ids[name])]
+
+    def predecessors(self, name):
+        self._build()
+        return [self.names[i] for i in self._adjacent(self._ids[name], True)]
+
+    def bfs_ids(self, sources, reverse=False):
+        """Return list of ids of nodes reachable from ids sources in BFS order,
+        sources included
+
+        @param reverse: True, that means edges are followed backwards (callers)
+        """
+        self._build()
+        indptr, indices = self._reverse if reverse else self._forward
+        seen = bytearray(len(self.names))
+        order = []
+        pending = deque()
+        for source in sources:
+            if not seen[source]:
+                seen[source] = 1
+                order.append(source)
+                pending.append(source)
+        while pending:
+            node_id = pending.popleft()
+            for adjacent in indices[indptr[node_id]:indptr[node_id + 1]]:
+                if not seen[adjacent]:
+                    seen[adjacent] = 1
+                    order.append(adjacent)
+                    pending.append(adjacent)
+        return order
+
+    def bfs(self, sources, reverse=False):
+        """Return list of names of nodes reachable from names sources in BFS
+        order, sources included. KeyError is raised for unknown source
+        """
+        names = self.names
+        return [names[i] for i in self.bfs_ids([self._ids[name] for name in sources], reverse)]
+
+    def reachable(self, source, target):
+        """Return True if there is path from source to target"""
+        return self._ids[target] in set(self.bfs_ids([self._ids[source]]))
+
+    def subgraph(self, names):
+        """Return new graph induced by nodes names. Nodes are added in order of
+        names, so subgraph of bfs() keeps BFS order of ids
+        """
+        self._build()
+        graph = CompactCallGraph()
+        node_ids = []
+        for name in names:
+            node_id = self._ids[name]
+            graph.add_node(name, self.file_names[node_id])
+            node_ids.append(node_id)
+
+        new_ids = dict((node_id, graph._ids[self.names[node_id]]) for node_id in node_ids)
+        indptr, indices = self._forward
+        for node_id in node_ids:
+            source = new_ids[node_id]
+            for target in indices[indptr[node_id]:indptr[node_id + 1]]:
+                if target in new_ids:
+                    graph.add_edge_ids(source, new_ids[target])
+        return graph
+
+    def to_networkx(self):
+        """Return networkx.DiGraph with the same nodes, edges and file_name attributes"""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        for name, file_name in zip(self.names, self.file_names):
+            if file_name is None:
+                graph.add_node(name)
+            else:
+                graph.add_node(name, file_name=file_name)
+        graph.add_edges_from(self.edges())
+        return graph
+
+    @classmethod
+    def from_networkx(cls, nx_graph):
+        graph = cls()
+        for name, data in nx_graph.nodes_iter(data=True):
+            graph.add_node(name, data.get('file_name'))
+        graph.add_edges_from(nx_graph.edges_iter())
+        return graph
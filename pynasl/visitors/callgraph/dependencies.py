@@ -0,0 +1,184 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Dependencies between plugins from script_dependencies() and schedule of scan.
+
+Plugins of one level of schedule depend only on plugins of previous levels,
+so all of them can be run in parallel when previous levels are finished.
+Plugins of dependency cycle are put to the same level. In every level
+plugins with the longest (by estimated cost) chain of dependents are first,
+so a scanner with limited number of slots starts critical chains early:
+
+    graph = DependencyGraph.from_feed(plugins_dir)
+    graph.cycles()
+    graph.missing()
+    for level in graph.schedule(costs):
+        ...
+"""
+
+import os
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor, ArgList, Arg
+from pynasl.visitors.constfold import string_quote
+from pynasl.visitors.callgraph.compact import CompactCallGraph
+from pynasl.visitors.callgraph.reachability import strongly_connected_components
+
+
+logger = logging.getLogger("Dependencies")
+logger.setLevel(logging.INFO)
+
+
+class _DependenciesCollector(BaseNodeVisitor):
+
+    def __init__(self):
+        self.dependencies = []
+
+    def visit_FuncCall(self, node):
+        if node.name == 'script_dependencies' and isinstance(node.args_list, ArgList):
+            for arg in node.args_list.args:
+                if isinstance(arg, Arg) and string_quote(arg.value):
+                    name = arg.value.value[1:-1]
+                    if name not in self.dependencies:
+                        self.dependencies.append(name)
+        self.generic_visit(node)
+
+
+class DependencyGraph(object):
+    """Graph of dependencies between plugins
+
+    @ivar dependencies: dictionary plugin name => tuple of names of its direct dependencies
+    """
+
+    def __init__(self, dependencies=None):
+        self.dependencies = dict(dependencies or {})
+        self._graph = None
+
+    def __len__(self):
+        return len(self.dependencies)
+
+    def set_dependencies(self, name, dependencies):
+        self.dependencies[name] = tuple(dependencies)
+        self._graph = None
+
+    @classmethod
+    def from_feed(cls, plugins_dir, budget=None, hooks=None):
+        """Build graph from *.nasl files in plugins_dir. Plugins that can't be
+        parsed are added without dependencies
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        """
+        from pynasl.batch import BatchParser
+
+        graph = cls()
+        batch = BatchParser(budget, debugging_script=False, hooks=hooks, skip_errors=True)
+        for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+            collector = _DependenciesCollector()
+            with batch.stage('Dependencies'):
+                collector.visit(tree)
+            graph.set_dependencies(name, collector.dependencies)
+
+        for name, error in batch.skipped + batch.failed:
+            graph.set_dependencies(name, ())
+
+        logger.info("%s plugins with %s dependencies" %
+                    (len(graph), sum(len(deps) for deps in graph.dependencies.itervalues())))
+        return graph
+
+    def missing(self):
+        """Return dictionary name of dependency which isn't plugin of graph => set
+        of plugins which depend on it
+        """
+        result = {}
+        for name, dependencies in self.dependencies.iteritems():
+            for dependency in dependencies:
+                if dependency not in self.dependencies:
+                    result.setdefault(dependency, set()).add(name)
+        return result
+
+    def _condensed(self):
+        """Return (graph, component, components) for graph of existing
+        dependencies, see strongly_connected_components
+        """
+        if self._graph is None:
+            graph = CompactCallGraph()
+            for name in sorted(self.dependencies):
+                graph.node_id(name)
+            for name, dependencies in self.dependencies.iteritems():
+                for dependency in dependencies:
+                    if dependency in self.dependencies:
+                        graph.add_edge(name, dependency)
+            indptr, indices = graph.adjacency()
+            component, components = strongly_connected_components(len(graph), indptr, indices)
+            self._graph = graph, component, components
+        return self._graph
+
+    def cycles(self):
+        """Return sorted list of sorted lists of plugins which depend on each
+        other (directly or transitively)
+        """
+        graph, component, components = self._condensed()
+        result = []
+        for members in components:
+            names = sorted(graph.names[node] for node in members)
+            if len(names) > 1 or names[0] in self.dependencies[names[0]]:
+                result.append(names)
+        return sorted(result)
+
+    def schedule(self, costs=None, default_cost=1):
+        """Return list of levels, every level is list of plugins which depend
+        only on plugins of previous levels (or on each other, if they are in cycle)
+
+        @param costs: dictionary plugin name => estimated cost (e.g. time) of
+            plugin. Plugins of level are sorted by decreasing cost of the most
+            expensive chain of plugins which depend on them, then by name
+        @param default_cost: cost of plugins which aren't in costs
+        """
+        costs = costs or {}
+        graph, component, components = self._condensed()
+        indptr, indices = graph.adjacency()
+        reverse_indptr, reverse_indices = graph.adjacency(reverse=True)
+
+        def adjacent_components(current, indptr, indices):
+            return set(component[adjacent] for node in components[current]
+                       for adjacent in indices[indptr[node]:indptr[node + 1]]
+                       if component[adjacent] != current)
+
+        # dependencies have smaller numbers of components
+        levels = []
+        for current in xrange(len(components)):
+            dependencies = adjacent_components(current, indptr, indices)
+            levels.append(max([levels[dependency] + 1 for dependency in dependencies] or [0]))
+
+        chains = [0] * len(components)
+        for current in xrange(len(components) - 1, -1, -1):
+            dependents = adjacent_components(current, reverse_indptr, reverse_indices)
+            chains[current] = sum(costs.get(graph.names[node], default_cost)
+                                  for node in components[current]) + \
+                max([chains[dependent] for dependent in dependents] or [0])
+
+        result = [[] for i in xrange(max(levels) + 1 if levels else 0)]
+        for current, members in enumerate(components):
+            result[levels[current]].extend((-chains[current], graph.names[node])
+                                           for node in members)
+        return [[name for chain, name in sorted(level)] for level in result]
+
+
+def _log_schedule(plugins_dir):
+    graph = DependencyGraph.from_feed(plugins_dir)
+    for cycle in graph.cycles():
+        logger.warning("Dependency cycle: %s" % ', '.join(cycle))
+    for name, dependents in sorted(graph.missing().iteritems()):
+        logger.warning("Missing dependency %s of %s plugins" % (name, len(dependents)))
+    for index, level in enumerate(graph.schedule()):
+        logger.info("Level %s: %s plugins" % (index, len(level)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_schedule(os.environ['KAFTI_NASLSCRIPTS_PATH'])
@@ -0,0 +1,217 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Precomputed reachability in call graph.
+
+Strongly connected components (recursive functions, cyclic
+script_dependencies) are condensed by iterative Tarjan algorithm, then for
+every component sets of reachable and reaching components are stored as
+bitsets in Python integers, bit c is component c. Component itself isn't
+stored in its bitsets and every bitset is kept as (offset, bitset >> offset)
+with offset of its lowest bit, so it takes only as many bits as the range
+of numbers of reachable (reaching) components: leaves (built-in functions)
+have no descendant bits, roots (plugins) have no ancestor bits and plugin
+which calls a few functions doesn't carry a bit for every component
+numbered before them:
+
+    index = ReachabilityIndex(cache.graph())
+    index.reaches('gb_apache_detect.nasl', 'http_recv_body')
+    index.impact(['http_recv_body'])
+"""
+
+import logging
+from array import array
+
+
+logger = logging.getLogger("Reachability")
+logger.setLevel(logging.INFO)
+
+
+def strongly_connected_components(size, indptr, indices):
+    """Return (component, components): array with component of every node and
+    list of lists of nodes of components. Components are in reverse
+    topological order: edges go from component i only to components j <= i
+
+    @param size: number of nodes
+    @param indptr, indices: CSR adjacency of graph
+    """
+    index = array('l', [-1]) * size
+    low = array('l', [0]) * size
+    on_stack = bytearray(size)
+    component = array('l', [-1]) * size
+    components = []
+    stack = []
+    counter = 0
+
+    for root in xrange(size):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        # (node, position of next successor)
+        work = [(root, indptr[root])]
+        while work:
+            node, position = work[-1]
+            end = indptr[node + 1]
+            while position < end:
+                successor = indices[position]
+                position += 1
+                if index[successor] == -1:
+                    work[-1] = (node, position)
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = 1
+                    work.append((successor, indptr[successor]))
+                    break
+                elif on_stack[successor] and index[successor] < low[node]:
+                    low[node] = index[successor]
+            else:
+                work.pop()
+                if low[node] == index[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component[member] = len(components)
+                        members.append(member)
+                        if member == node:
+                            break
+                    components.append(members)
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+    return component, components
+
+
+def iter_bits(bitset):
+    """Generate numbers of set bits of integer, the lowest first"""
+    while bitset:
+        lowest = bitset & -bitset
+        yield lowest.bit_length() - 1
+        bitset ^= lowest
+
+
+def _shifted(bitset):
+    """Return (offset, bitset >> offset), offset is number of the lowest set bit"""
+    if not bitset:
+        return 0, 0
+    offset = (bitset & -bitset).bit_length() - 1
+    return offset, bitset >> offset
+
+
+class ReachabilityIndex(object):
+    """Reachability of nodes of CompactCallGraph
+
+    Index is built for current state of graph, it isn't updated by later changes.
+
+    @ivar graph: indexed CompactCallGraph
+    @ivar component: array with number of strongly connected component of every node id
+    @ivar components: list of lists of node ids of components
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        indptr, indices = graph.adjacency()
+        self.component, self.components = strongly_connected_components(
+            len(graph), indptr, indices)
+        component = self.component
+        count = len(self.components)
+
+        successors = []
+        predecessors = [[] for current in xrange(count)]
+        for members in self.components:
+            current = component[members[0]]
+            successors.append(set(component[successor] for node in members
+                                  for successor in indices[indptr[node]:indptr[node + 1]]
+                                  if component[successor] != current))
+            for successor in successors[current]:
+                predecessors[successor].append(current)
+
+        # (offset, bitset >> offset) of every component, successors have
+        # smaller numbers and predecessors have greater numbers, so their
+        # bitsets are ready
+        self._descendants = self._closure(xrange(count), successors)
+        self._ancestors = self._closure(xrange(count - 1, -1, -1), predecessors)
+
+        logger.info("%s nodes in %s components" % (len(graph), count))
+
+    @staticmethod
+    def _closure(order, adjacent):
+        closure = [None] * len(adjacent)
+        for current in order:
+            bitset = 0
+            for other in adjacent[current]:
+                offset, shifted = closure[other]
+                bitset |= 1 << other | shifted << offset
+            closure[current] = _shifted(bitset)
+        return closure
+
+    @staticmethod
+    def _bits(closure, current):
+        offset, shifted = closure[current]
+        return (offset + bit for bit in iter_bits(shifted))
+
+    def _component(self, name):
+        if name not in self.graph:
+            return None
+        return self.component[self.graph.node_id(name)]
+
+    def reaches(self, source, target):
+        """Return True if there is path from source to target (or they are the same node)"""
+        source_component = self._component(source)
+        target_component = self._component(target)
+        if source_component is None or target_component is None:
+            return source == target
+        if source_component == target_component:
+            return True
+        offset, shifted = self._descendants[source_component]
+        return target_component >= offset and bool(shifted >> (target_component - offset) & 1)
+
+    def _names(self, components, exclude):
+        names = self.graph.names
+        return set(names[node] for current in components
+                   for node in self.components[current]) - exclude
+
+    def callees(self, name):
+        """Return set of names of nodes reachable from name, name itself excluded"""
+        current = self._component(name)
+        if current is None:
+            return set()
+        # other members of component (mutual recursion) are reachable too
+        components = [current]
+        components.extend(self._bits(self._descendants, current))
+        return self._names(components, set([name]))
+
+    def callers(self, name):
+        """Return set of names of nodes from which name is reachable, name itself excluded"""
+        current = self._component(name)
+        if current is None:
+            return set()
+        return self._callers([current], set([name]))
+
+    def _callers(self, components, exclude):
+        result = set(components)
+        for current in components:
+            result.update(self._bits(self._ancestors, current))
+        return self._names(result, exclude)
+
+    def impact(self, names, plugins_only=True):
+        """Return set of nodes affected by change of names, i.e. names and
+        nodes from which any of names is reachable
+
+        @param plugins_only: True, that means only *.nasl scripts are returned
+        """
+        components = [self._component(name) for name in names]
+        result = self._callers([current for current in components if current is not None],
+                               set())
+        result.update(names)
+        if plugins_only:
+            result = set(name for name in result if name.endswith('.nasl'))
+        return result
@@ -0,0 +1,179 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Call trees of many nasl scripts in one pass.
+
+*.inc files are parsed once and give shared call graph, every requested
+script adds only its own contribution. Tree of script contains nodes
+reachable from script through its own calls and calls of *.inc functions,
+so functions declared in other scripts never get into it, as if the script
+was the only *.nasl file in directory. Trees are extracted by worker
+processes:
+
+    trees = generate_call_trees(['a.nasl', 'b.nasl'], plugins_dir,
+                                processes=None, output_dir='trees')
+"""
+
+import os
+import time
+import logging
+
+from pynasl.visitors.callgraph.callgraph import _cut_description_function, _save_graph
+from pynasl.visitors.callgraph.compact import CompactCallGraph
+from pynasl.visitors.callgraph.cache import CallGraphCache, FileContribution
+
+
+logger = logging.getLogger("CallTrees")
+logger.setLevel(logging.INFO)
+
+
+# graph of *.inc files in worker process, set by _init_worker
+_base_graph = None
+
+
+def _init_worker(base_graph):
+    global _base_graph
+    _base_graph = base_graph
+
+
+def script_tree(base_graph, script_name, contribution):
+    """Return CompactCallGraph with nodes reachable from script_name in BFS order
+
+    @param base_graph: CompactCallGraph of *.inc files
+    @param contribution: FileContribution of script. Functions declared in
+        script take precedence over functions of base_graph with the same name
+    """
+    names = contribution.names
+    local = {}
+    for source, target in contribution.edges:
+        local.setdefault(names[source], []).append(names[target])
+    declared = dict((names[node_id], script_name) for node_id in contribution.declared)
+
+    def successors(name):
+        result = local.get(name, [])
+        if name in base_graph:
+            result = result + base_graph.successors(name)
+        return result
+
+    order = [script_name]
+    seen = set(order)
+    index = 0
+    while index < len(order):
+        for successor in successors(order[index]):
+            if successor not in seen:
+                seen.add(successor)
+                order.append(successor)
+        index += 1
+
+    tree = CompactCallGraph()
+    for name in order:
+        file_name = declared.get(name)
+        if file_name is None and name in base_graph:
+            file_name = base_graph.file_names[base_graph.node_id(name)]
+        tree.add_node(name, file_name)
+    for name in order:
+        for successor in successors(name):
+            tree.add_edge(name, successor)
+    return tree
+
+
+def _tree_task(args):
+    """Worker function: return (script name, call tree without description
+    functions, name of worker process, busy time)
+    """
+    from multiprocessing import current_process
+
+    start = time.time()
+    script_name, contribution, output_dir = args
+    tree = _cut_description_function(script_tree(_base_graph, script_name, contribution))
+    if output_dir is not None:
+        _save_graph(tree, os.path.join(output_dir, script_name))
+    return script_name, tree, current_process().name, time.time() - start
+
+
+def generate_call_trees(script_names, plugins_dir, processes=1, budget=None, hooks=None,
+                        output_dir=None, metrics=None):
+    """Generate call trees for scripts, *.inc files are parsed once. Scripts
+    are parsed in the same mode as in generate_graph (syntax errors are
+    printed and parsing is continued), so every tree is equal to tree of
+    script in its call graph
+
+    @param script_names: list of names of *.nasl scripts
+    @param plugins_dir: string with path to nasl scripts
+    @param processes: number of worker processes for extraction of trees.
+        None means number of CPUs
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    @param output_dir: string with path to directory, tree of every script is
+        saved to 'script_name'.gexf in it. Default value - None, that means
+        trees aren't saved
+    @param metrics: pynasl.metrics.Metrics, busy time of every worker process
+        is added to it. If processes is 1, trees are extracted in the main
+        process and its time is added to metrics.worker
+    @return dictionary script name => CompactCallGraph of call tree. Scripts
+        which aren't found or are over budget are missed
+    """
+    from pynasl.batch import BatchParser
+
+    requested = set(script_names)
+
+    def accept(name):
+        return name.endswith('.inc') or name in requested
+
+    base = CallGraphCache()
+    contributions = {}
+    batch = BatchParser(budget, hooks=hooks)
+    for name, full_path, tree in batch.walk(plugins_dir, accept):
+        with batch.stage('CallGraph'):
+            if name in requested:
+                contributions[name] = FileContribution.from_tree(name, tree)
+            else:
+                base.set_file(name, tree)
+
+    for name in script_names:
+        if name not in contributions:
+            logger.error("Script %s isn't found or is skipped" % name)
+
+    base_graph = base.graph()
+    logger.info("Graph of %s *.inc files has %s nodes and %s edges" %
+                (len(base), base_graph.number_of_nodes(), base_graph.number_of_edges()))
+
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    tasks = [(name, contributions[name], output_dir)
+             for name in sorted(contributions)]
+    if processes == 1:
+        _init_worker(base_graph)
+        trees = map(_tree_task, tasks)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes, _init_worker, (base_graph,))
+        trees = pool.imap_unordered(_tree_task, tasks)
+
+    result = {}
+    try:
+        for script_name, tree, worker, elapsed in trees:
+            result[script_name] = tree
+            if metrics is not None:
+                metrics.add_busy_time(worker if pool is not None else metrics.worker, elapsed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    logger.info("Generated %s call trees" % len(result))
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    generate_call_trees(sys.argv[1:], os.environ['KAFTI_NASLSCRIPTS_PATH'],
+                        processes=None, output_dir='trees')
@@ -0,0 +1,195 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Constant folding and flattening of expression chains.
+
+Long "..." + "..." + var chains are parsed into deep left-leaning Expression
+trees. The pass folds constant sub-expressions (concatenation of strings with
+the same quotes and integer arithmetic) and replaces chains of the same
+associative operator with single NaryExpression node:
+
+    Expression(Expression(Expression("a" + "b") + x) + "c")
+        => NaryExpression("ab" + x + "c")
+
+The pass changes tree in place and drops cached structural hashes of changed
+nodes and their ancestors. It must never be applied to trees interned in
+pynasl.hashcons.HashConsArena, their nodes are shared.
+"""
+
+import os
+import re
+
+from pynasl.naslAST import Atom, Expression, NaryExpression, iter_child_nodes, drop_hash
+
+
+# operators whose left-leaning chains are replaced with NaryExpression
+FLATTEN_OPERATIONS = ('+', '||', '&&')
+
+_INTEGER_RE = re.compile(r'0[xX][A-Fa-f0-9]+$|0$|[1-9]\d*$')
+
+# nasl integers are 32-bit C integers
+_MIN_INT = -2 ** 31
+_MAX_INT = 2 ** 31 - 1
+
+
+def int_value(node):
+    """Return value of integer literal or None"""
+    if isinstance(node, Atom) and _INTEGER_RE.match(node.value):
+        return int(node.value, 0)
+    return None
+
+
+def string_quote(node):
+    """Return quote of string literal or None. Strings with trailing
+    backslash aren't folded, because it can change meaning of closing quote.
+    """
+    if isinstance(node, Atom) and node.value[:1] in ('"', "'") and \
+            not node.value[1:-1].endswith('\\'):
+        return node.value[0]
+    return None
+
+
+def _c_div(lvalue, rvalue):
+    quotient = abs(lvalue) // abs(rvalue)
+    if (lvalue < 0) != (rvalue < 0):
+        quotient = -quotient
+    return quotient
+
+
+def _fold_arithmetic(operation, lvalue, rvalue):
+    """Return Atom with result of integer operation or None if it can't be folded"""
+    if operation == '+':
+        result = lvalue + rvalue
+    elif operation == '-':
+        result = lvalue - rvalue
+    elif operation == '*':
+        result = lvalue * rvalue
+    elif operation in ('/', '%') and rvalue != 0:
+        result = _c_div(lvalue, rvalue)
+        if operation == '%':
+            result = lvalue - result * rvalue
+    else:
+        return None
+
+    # negative numbers aren't literals in nasl
+    if result < 0 or result > _MAX_INT or result < _MIN_INT:
+        return None
+    return Atom(str(result))
+
+
+def _fold_concatenation(elems):
+    """Fold constants of left-associative '+' chain.
+
+    Adjacent strings with the same quotes are always concatenated. Integers
+    are added only at the beginning of chain, "a" + 1 + 2 is "a12".
+    """
+    result = []
+    for elem in elems:
+        if result:
+            prev = result[-1]
+            if len(result) == 1:
+                lvalue = int_value(prev)
+                rvalue = int_value(elem)
+                if lvalue is not None and rvalue is not None:
+                    folded = _fold_arithmetic('+', lvalue, rvalue)
+                    if folded is not None:
+                        result[-1] = folded
+                        continue
+
+            quote = string_quote(prev)
+            if quote is not None and quote == string_quote(elem):
+                result[-1] = Atom(prev.value[:-1] + elem.value[1:])
+                continue
+
+        result.append(elem)
+    return result
+
+
+def _fold(node):
+    """Return folded node. Children of node must be folded already."""
+    if not isinstance(node, Expression):
+        return node
+
+    operation = node.operation
+    if operation in FLATTEN_OPERATIONS:
+        lexpr = node.lexpr
+        if isinstance(lexpr, NaryExpression) and lexpr.operation == operation:
+            elems = lexpr.elems + [node.rexpr]
+        elif isinstance(lexpr, Expression) and lexpr.operation == operation:
+            elems = [lexpr.lexpr, lexpr.rexpr, node.rexpr]
+        else:
+            elems = [lexpr, node.rexpr]
+
+        if operation == '+':
+            elems = _fold_concatenation(elems)
+
+        if len(elems) == 1:
+            return elems[0]
+        elif len(elems) == 2:
+            if elems[0] is node.lexpr and elems[1] is node.rexpr:
+                return node
+            return Expression(elems[0], operation, elems[1])
+        return NaryExpression(operation, elems)
+
+    lvalue = int_value(node.lexpr)
+    rvalue = int_value(node.rexpr)
+    if lvalue is not None and rvalue is not None:
+        folded = _fold_arithmetic(operation, lvalue, rvalue)
+        if folded is not None:
+            return folded
+    return node
+
+
+def fold_constants(tree):
+    """Fold constants and flatten expression chains in tree
+
+    Tree is walked without recursion, so deep chains don't hit recursion limit.
+
+    @return folded tree (tree itself unless whole tree is a foldable expression)
+    """
+    if tree is None:
+        return None
+
+    # ids of nodes whose subtree was changed, their hashes are dropped
+    changed = set()
+    stack = [(tree, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in iter_child_nodes(node))
+            continue
+
+        node_changed = False
+        for field_name in node.__slots__:
+            value = getattr(node, field_name)
+            if isinstance(value, list):
+                folded = [_fold(elem) for elem in value]
+                for old, new in zip(value, folded):
+                    if new is not old or id(old) in changed:
+                        node_changed = True
+                value[:] = folded
+            else:
+                folded = _fold(value)
+                if folded is not value or id(value) in changed:
+                    node_changed = True
+                setattr(node, field_name, folded)
+
+        if node_changed:
+            changed.add(id(node))
+            drop_hash(node)
+
+    return _fold(tree)
+
+
+def _print_folded(file_name):
+    from pynasl.naslparse import naslparser
+
+    print(fold_constants(naslparser(file_name, True)))
+
+
+if __name__ == "__main__":
+    _print_folded(os.path.join(os.environ['KAFTI_NASLSCRIPTS_PATH'], "http_version.nasl"))
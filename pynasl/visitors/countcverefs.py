@@ -30,32 +30,32 @@ class GetCVERef(BaseNodeVisitor):
                 self.cve_id = node.args_list.args[0].value.value
 
 
-def _print_counts(dir):
-    from pynasl.naslparse import naslparser
+def _print_counts(dir, hooks=None):
+    from pynasl.batch import BatchParser
     
     logger.info("Counting started")
     
     files_with_cve = 0
-    files_total = 0
     files_with_wrong_cve = 0
-    for root,dirs,files in os.walk(dir):
-        files_total += len(files)
-        for name in files:
-            if name.endswith('.nasl'):
-                get_ref = GetCVERef()
-                fullname = os.path.join(root, name)
-                get_ref.visit(naslparser(fullname, True))
-                # CAN - candidate
-                if get_ref.cve_id and get_ref.cve_id.startswith(('"CVE', '"CAN')):
-                    files_with_cve += 1
-                elif get_ref.cve_id is not None:
-                    logger.error("Strange CVE '%s' in file %s" % (get_ref.cve_id, name))
-                    files_with_wrong_cve += 1
+    
+    batch = BatchParser(hooks=hooks)
+    for name, fullname, tree in batch.walk(dir, ('.nasl',)):
+        get_ref = GetCVERef()
+        with batch.stage('GetCVERef'):
+            get_ref.visit(tree)
+        # CAN - candidate
+        if get_ref.cve_id and get_ref.cve_id.startswith(('"CVE', '"CAN')):
+            files_with_cve += 1
+        elif get_ref.cve_id is not None:
+            logger.error("Strange CVE '%s' in file %s" % (get_ref.cve_id, name))
+            files_with_wrong_cve += 1
     
     logger.info("Counting ended")
     logger.info("Files with wrong CVE:%s" % files_with_wrong_cve)
     logger.info("Files with CVE:%s" % files_with_cve)
-    logger.info("Total files:%s" % files_total)
+    logger.info("Processed *.nasl files:%s, skipped:%s" % (batch.total_files, len(batch.skipped)))
+    # all files in dir, as it was counted before BatchParser
+    logger.info("Total files:%s" % sum(len(files) for root, dirs, files in os.walk(dir)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Visitor for finding identical functions and description blocks in nasl scripts"""
+
+import os
+import logging
+from collections import defaultdict
+
+from pynasl.naslAST import BaseNodeVisitor, VarName, structural_hash
+
+
+logger = logging.getLogger("duplicates")
+logger.setLevel(logging.INFO)
+
+
+class DuplicatesFinder(BaseNodeVisitor):
+    """Groups function declarations and description blocks by structural hash
+
+    @ivar functions: dictionary hash of function arguments and body => list of
+        (file name, function name)
+    @ivar descriptions: dictionary hash of 'if (description)' block => list of file names
+    """
+
+    def __init__(self):
+        self.functions = defaultdict(list)
+        self.descriptions = defaultdict(list)
+        self.file_name = None
+
+    def set_file_name(self, name):
+        self.file_name = name
+
+    def visit_FuncDecl(self, node):
+        # function name isn't hashed, so renamed copies are found too
+        key = structural_hash(node.args) + structural_hash(node.elems)
+        self.functions[key].append((self.file_name, node.name))
+
+    def visit_IfBlock(self, node):
+        if isinstance(node.condition, VarName) and node.condition.value == 'description':
+            self.descriptions[structural_hash(node)].append(self.file_name)
+        else:
+            self.generic_visit(node)
+
+    def duplicated_functions(self):
+        """Return list of groups of identical functions, the largest groups first"""
+        return sorted([group for group in self.functions.itervalues() if len(group) > 1],
+                      key=len, reverse=True)
+
+    def duplicated_descriptions(self):
+        """Return list of groups of files with identical description, the largest groups first"""
+        return sorted([group for group in self.descriptions.itervalues() if len(group) > 1],
+                      key=len, reverse=True)
+
+
+def find_duplicates(plugins_dir, budget=None, hooks=None):
+    """Find identical functions and description blocks in nasl scripts
+
+    @param plugins_dir: string with path to nasl scripts
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    @return DuplicatesFinder with collected hashes
+    """
+    from pynasl.batch import BatchParser
+
+    finder = DuplicatesFinder()
+    batch = BatchParser(budget, hooks=hooks)
+    for name, full_path, tree in batch.walk(plugins_dir, ('.nasl', '.inc')):
+        finder.set_file_name(name)
+        with batch.stage('DuplicatesFinder'):
+            finder.visit(tree)
+
+    return finder
+
+
+def _log_duplicates(plugins_dir):
+    finder = find_duplicates(plugins_dir)
+
+    functions = finder.duplicated_functions()
+    logger.info("%s groups of identical functions" % len(functions))
+    for group in functions[:20]:
+        logger.info("%s" % group)
+
+    descriptions = finder.duplicated_descriptions()
+    logger.info("%s groups of identical description blocks" % len(descriptions))
+    for group in descriptions[:20]:
+        logger.info("%s" % group)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_duplicates(os.environ['KAFTI_NASLSCRIPTS_PATH'])
@@ -0,0 +1,206 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Near-duplicate detection of nasl scripts with AST fingerprints.
+
+Every script is described by set of shingles (structural hashes of its
+statements and of pairs of consecutive statements). Sets are compressed to
+MinHash signatures and indexed with locality sensitive hashing (LSH), so
+near-duplicates are found without comparing every pair of scripts.
+"""
+
+import os
+import struct
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor, IfBlock, VarName, structural_hash
+
+
+logger = logging.getLogger("fingerprint")
+logger.setLevel(logging.INFO)
+
+
+_MASK64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+
+
+def _hash64(node):
+    return struct.unpack('<Q', structural_hash(node)[:8])[0]
+
+
+class Fingerprinter(BaseNodeVisitor):
+    """Collects shingles of script
+
+    @ivar shingles: set of 64-bit integers
+    """
+
+    def __init__(self, skip_description=True):
+        """
+        @param skip_description: True, that means 'if (description)' block isn't
+            fingerprinted, because metadata differs even in cloned scripts
+        """
+        self.shingles = set()
+        self.skip_description = skip_description
+
+    def _is_skipped(self, node):
+        return self.skip_description and isinstance(node, IfBlock) and \
+            isinstance(node.condition, VarName) and node.condition.value == 'description'
+
+    def visit_InstrList(self, node):
+        prev = None
+        for elem in node.elems:
+            if elem is None or self._is_skipped(elem):
+                continue
+            current = _hash64(elem)
+            self.shingles.add(current)
+            if prev is not None:
+                self.shingles.add(((prev * _MIX) ^ current) & _MASK64)
+            prev = current
+        self.generic_visit(node)
+
+    def visit_IfBlock(self, node):
+        if not self._is_skipped(node):
+            self.generic_visit(node)
+
+
+def minhash(shingles, num_perm=64):
+    """Return MinHash signature of set of 64-bit shingles.
+
+    One permutation hashing with densification is used: hash space is divided
+    into num_perm bins and minimum of every bin is taken, empty bins borrow value
+    of the next non-empty bin. It is O(len(shingles)) instead of
+    O(len(shingles) * num_perm) of classic MinHash.
+
+    @return tuple with num_perm integers or None for empty set
+    """
+    if not shingles:
+        return None
+
+    signature = [None] * num_perm
+    for shingle in shingles:
+        # spread values, shingles of small trees may be close to each other
+        value = (shingle * _MIX) & _MASK64
+        index = value % num_perm
+        value //= num_perm
+        if signature[index] is None or value < signature[index]:
+            signature[index] = value
+
+    # densification by rotation
+    offset = (_MASK64 // num_perm) + 1
+    for index in range(num_perm):
+        if signature[index] is None:
+            distance = 1
+            while signature[(index + distance) % num_perm] is None:
+                distance += 1
+            signature[index] = (signature[(index + distance) % num_perm] + distance * offset)
+
+    return tuple(signature)
+
+
+def similarity(first, second):
+    """Estimate Jaccard similarity of sets with MinHash signatures"""
+    equal = sum(1 for a, b in zip(first, second) if a == b)
+    return float(equal) / len(first)
+
+
+class LSHIndex(object):
+    """Locality sensitive hashing index of MinHash signatures.
+
+    Signature is divided into bands, scripts with equal band are candidates
+    for near-duplicates.
+    """
+
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.keys = []
+        self.signatures = []
+        self.buckets = {}
+
+    def add(self, key, signature):
+        index = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(signature)
+        for band in range(self.bands):
+            band_key = (band,) + signature[band * self.rows:(band + 1) * self.rows]
+            self.buckets.setdefault(band_key, []).append(index)
+
+    def clusters(self, threshold=0.8):
+        """Return list of clusters (lists of keys) of near-duplicates, the largest first.
+
+        Every candidate is compared only with the first member of bucket, so work
+        is linear in number of bucket entries even for huge buckets.
+        """
+        parent = range(len(self.keys))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for bucket in self.buckets.itervalues():
+            if len(bucket) < 2:
+                continue
+            first = bucket[0]
+            for other in bucket[1:]:
+                if find(first) != find(other) and \
+                        similarity(self.signatures[first], self.signatures[other]) >= threshold:
+                    parent[find(other)] = find(first)
+
+        groups = {}
+        for index in range(len(self.keys)):
+            groups.setdefault(find(index), []).append(self.keys[index])
+
+        return sorted([group for group in groups.itervalues() if len(group) > 1],
+                      key=len, reverse=True)
+
+
+def find_near_duplicates(plugins_dir, threshold=0.8, num_perm=64, bands=16,
+                         budget=None, hooks=None):
+    """Find clusters of near-duplicate *.nasl scripts
+
+    @param plugins_dir: string with path to nasl scripts
+    @param threshold: minimal estimated Jaccard similarity of scripts in cluster
+    @param num_perm: length of MinHash signature
+    @param bands: number of LSH bands, more bands find less similar candidates
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    @return list of clusters (lists of file names), the largest first
+    """
+    from pynasl.batch import BatchParser
+
+    index = LSHIndex(num_perm, bands)
+    batch = BatchParser(budget, hooks=hooks)
+    for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+        fingerprinter = Fingerprinter()
+        with batch.stage('Fingerprinter'):
+            fingerprinter.visit(tree)
+            signature = minhash(fingerprinter.shingles, num_perm)
+        if signature is not None:
+            index.add(name, signature)
+
+    return index.clusters(threshold)
+
+
+def _write_near_duplicates(plugins_dir, file_name='near_duplicates.csv'):
+    from pynasl.visitors.statistic.statistic import write_func_dict_to_csv
+
+    clusters = find_near_duplicates(plugins_dir)
+    write_func_dict_to_csv(dict((group[0], group) for group in clusters), file_name)
+
+    logger.info("%s clusters of near-duplicates with %s scripts" %
+                (len(clusters), sum(len(group) for group in clusters)))
+    logger.info("Detailed statistic is in %s" % file_name)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _write_near_duplicates(os.environ['KAFTI_NASLSCRIPTS_PATH'])
@@ -0,0 +1,395 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Index of knowledge base keys produced and consumed by nasl scripts.
+
+Keys are produced by set_kb_item(name: ...) and replace_kb_item(name: ...)
+and consumed by get_kb_item(), get_kb_list(), script_require_keys() and
+script_mandatory_keys(). Names of keys are often built at run time, e.g.
+"www/" + port + "/Apache", so they are evaluated to glob patterns by constant
+propagation: literals are folded, variables are replaced with values
+assigned to them and unknown parts become '*':
+
+    port = get_http_port(default:80);
+    set_kb_item(name:"www/" + port + "/Apache", value:TRUE);  =>  www/*/Apache
+
+Patterns of producers and consumers match if some key matches both of them:
+
+    index = KBKeyIndex.from_feed(plugins_dir)
+    index.producers_of('www/80/Apache')
+    index.unsatisfiable()
+    index.dependency_graph().schedule()
+"""
+
+import os
+import bisect
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor, ArgList, Arg, ArgAttribute, \
+    Expression, NaryExpression, FuncCall, VarName, copy_tree
+from pynasl.visitors.constfold import fold_constants, int_value, string_quote
+
+
+logger = logging.getLogger("kbkeys")
+logger.setLevel(logging.INFO)
+
+
+# function => name of argument with key, None for the first positional argument
+PRODUCERS = {'set_kb_item': 'name',
+             'replace_kb_item': 'name'}
+CONSUMERS = {'get_kb_item': None,
+             'get_kb_list': None}
+# functions whose all positional arguments are required keys
+REQUIREMENTS = ('script_require_keys', 'script_mandatory_keys')
+
+ANY = '*'
+
+# maximal number of alternative patterns of one expression, more
+# alternatives are replaced with ANY
+_MAX_PATTERNS = 16
+
+
+def _concatenate(parts):
+    """Return set of patterns for concatenation of sets of patterns parts"""
+    result = set([''])
+    for part in parts:
+        result = set(prefix + suffix for prefix in result for suffix in part)
+        if len(result) > _MAX_PATTERNS:
+            return set([ANY])
+    return set(_normalize(pattern) for pattern in result)
+
+
+def _normalize(pattern):
+    while ANY + ANY in pattern:
+        pattern = pattern.replace(ANY + ANY, ANY)
+    return pattern
+
+
+class PatternEvaluator(object):
+    """Evaluates expressions to sets of glob patterns"""
+
+    def __init__(self, resolution):
+        """
+        @param resolution: pynasl.visitors.resolver.Resolution of tree
+        """
+        self.resolution = resolution
+        # symbols which are evaluated now, recursive assignments like
+        # x = x + "a" are unknown
+        self._evaluating = set()
+
+    def patterns(self, node):
+        """Return set of patterns of values of expression node"""
+        if string_quote(node):
+            return set([node.value[1:-1]])
+        value = int_value(node)
+        if value is not None:
+            return set([str(value)])
+
+        if isinstance(node, NaryExpression) and node.operation == '+':
+            return _concatenate([self.patterns(elem) for elem in node.elems])
+        if isinstance(node, Expression) and node.operation == '+':
+            return _concatenate([self.patterns(node.lexpr), self.patterns(node.rexpr)])
+        if isinstance(node, FuncCall) and node.name == 'string' and \
+                isinstance(node.args_list, ArgList):
+            return _concatenate([self.patterns(arg.value) for arg in node.args_list.args
+                                 if isinstance(arg, Arg)])
+        if isinstance(node, VarName):
+            return self._variable_patterns(node)
+        return set([ANY])
+
+    def _variable_patterns(self, node):
+        symbol = self.resolution.lookup(node)
+        if symbol is None or not symbol.values or symbol in self._evaluating:
+            return set([ANY])
+
+        self._evaluating.add(symbol)
+        try:
+            result = set()
+            for value in symbol.values:
+                result.update(self.patterns(value))
+        finally:
+            self._evaluating.discard(symbol)
+        if len(result) > _MAX_PATTERNS:
+            return set([ANY])
+        return result
+
+
+def _key_args(node, arg_name):
+    """Return list of nodes with keys of call: value of named argument
+    arg_name or the first positional argument if arg_name is None
+    """
+    if not isinstance(node.args_list, ArgList):
+        return []
+    for arg in node.args_list.args:
+        if arg_name is None and not isinstance(arg, ArgAttribute):
+            return [arg.value]
+        if isinstance(arg, ArgAttribute) and arg.att_name == arg_name:
+            return [arg.value]
+    return []
+
+
+class KeysCollector(BaseNodeVisitor):
+    """Collects patterns of keys of script
+
+    @ivar produced: set of patterns of produced keys. Key which can't be
+        evaluated at all is kept as ANY, because it can be any key
+    @ivar consumed: set of patterns of keys read by get_kb_item() and get_kb_list()
+    @ivar required: set of patterns of keys of script_require_keys() and
+        script_mandatory_keys()
+    @ivar unknown: number of keys which can't be evaluated at all (ANY)
+    """
+
+    def __init__(self, resolution):
+        self.evaluator = PatternEvaluator(resolution)
+        self.produced = set()
+        self.consumed = set()
+        self.required = set()
+        self.unknown = 0
+
+    def _add(self, patterns, nodes, keep_any=False):
+        for node in nodes:
+            for pattern in self.evaluator.patterns(node):
+                if pattern == ANY:
+                    self.unknown += 1
+                    if not keep_any:
+                        continue
+                patterns.add(pattern)
+
+    def visit_FuncCall(self, node):
+        if node.name in PRODUCERS:
+            # unknown producer can produce any key, so dropping it would make
+            # required keys look unsatisfiable
+            self._add(self.produced, _key_args(node, PRODUCERS[node.name]), keep_any=True)
+        elif node.name in CONSUMERS:
+            self._add(self.consumed, _key_args(node, CONSUMERS[node.name]))
+        elif node.name in REQUIREMENTS and isinstance(node.args_list, ArgList):
+            self._add(self.required, [arg.value for arg in node.args_list.args
+                                      if not isinstance(arg, ArgAttribute)])
+        self.generic_visit(node)
+
+
+def patterns_intersect(first, second):
+    """Return True if some string matches both glob patterns, only '*' is special"""
+    pending = [(0, 0)]
+    seen = set()
+    while pending:
+        state = pending.pop()
+        if state in seen:
+            continue
+        seen.add(state)
+        i, j = state
+        if i == len(first) and j == len(second):
+            return True
+        first_any = i < len(first) and first[i] == ANY
+        second_any = j < len(second) and second[j] == ANY
+        if first_any:
+            pending.append((i + 1, j))
+            if j < len(second):
+                pending.append((i, j + 1))
+        if second_any:
+            pending.append((i, j + 1))
+            if i < len(first):
+                pending.append((i + 1, j))
+        if not first_any and not second_any and i < len(first) and j < len(second) and \
+                first[i] == second[j]:
+            pending.append((i + 1, j + 1))
+    return False
+
+
+def _prefix(pattern):
+    index = pattern.find(ANY)
+    return pattern if index == -1 else pattern[:index]
+
+
+def _starting_with(items, prefix):
+    """Return items of sorted list which start with prefix"""
+    start = end = bisect.bisect_left(items, prefix)
+    while end < len(items) and items[end].startswith(prefix):
+        end += 1
+    return items[start:end]
+
+
+class _PatternIndex(object):
+    """Patterns sorted by literal prefix (part before the first '*'). Two
+    patterns can intersect only if prefix of one starts with prefix of other,
+    so only such patterns are checked by patterns_intersect
+    """
+
+    def __init__(self, patterns):
+        self.literals = sorted(pattern for pattern in patterns if ANY not in pattern)
+        self._literals = set(self.literals)
+        # prefix => list of patterns with '*'
+        self.wildcards = {}
+        for pattern in patterns:
+            if ANY in pattern:
+                self.wildcards.setdefault(_prefix(pattern), []).append(pattern)
+        self.prefixes = sorted(self.wildcards)
+
+    def matching(self, pattern):
+        """Return list of patterns which intersect pattern"""
+        prefix = _prefix(pattern)
+        if ANY not in pattern:
+            result = [pattern] if pattern in self._literals else []
+        else:
+            result = [other for other in _starting_with(self.literals, prefix)
+                      if patterns_intersect(pattern, other)]
+
+        candidates = set()
+        for length in xrange(len(prefix) + 1):
+            candidates.update(self.wildcards.get(prefix[:length], ()))
+        for other_prefix in _starting_with(self.prefixes, prefix):
+            candidates.update(self.wildcards[other_prefix])
+        result.extend(other for other in candidates if patterns_intersect(pattern, other))
+        return result
+
+
+class KBKeyIndex(object):
+    """Producers and consumers of knowledge base keys
+
+    @ivar produced: dictionary pattern => set of names of files which produce it
+    @ivar consumed: dictionary pattern => set of names of files which read it
+    @ivar required: dictionary plugin name => set of patterns of its required keys
+    @ivar unknown: dictionary file name => number of keys which can't be evaluated
+    """
+
+    def __init__(self):
+        self.produced = {}
+        self.consumed = {}
+        self.required = {}
+        self.unknown = {}
+        # table name => _PatternIndex, built on demand
+        self._indexes = {}
+
+    def remove_file(self, name):
+        """Remove keys of file from index"""
+        self._indexes = {}
+        for table in (self.produced, self.consumed):
+            for pattern in [pattern for pattern, names in table.iteritems() if name in names]:
+                names = table[pattern]
+                names.discard(name)
+                if not names:
+                    del table[pattern]
+        self.required.pop(name, None)
+        self.unknown.pop(name, None)
+
+    def add_file(self, name, tree, includes=None):
+        """Replace keys of file with keys of tree. Tree isn't changed,
+        constants are folded in its copy
+
+        @param includes: pynasl.includes.IncludeCache, global variables of
+            include files are resolved with it
+        """
+        from pynasl.visitors.resolver import resolve
+
+        self.remove_file(name)
+        tree = fold_constants(copy_tree(tree))
+        collector = KeysCollector(resolve(tree, includes))
+        collector.visit(tree)
+
+        for patterns, table in ((collector.produced, self.produced),
+                                (collector.consumed, self.consumed),
+                                (collector.required, self.consumed)):
+            for pattern in patterns:
+                table.setdefault(pattern, set()).add(name)
+        if collector.required:
+            self.required[name] = collector.required
+        if collector.unknown:
+            self.unknown[name] = collector.unknown
+
+    @classmethod
+    def from_feed(cls, plugins_dir, budget=None, hooks=None, includes=None):
+        """Build index from *.nasl and *.inc files in plugins_dir
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        @param includes: pynasl.includes.IncludeCache for global variables of
+            include files. Default value - None, that means cache of include
+            files in plugins_dir
+        """
+        from pynasl.batch import BatchParser
+        from pynasl.includes import IncludeCache
+
+        if includes is None:
+            includes = IncludeCache([plugins_dir], budget=budget)
+
+        index = cls()
+        batch = BatchParser(budget, debugging_script=False, hooks=hooks, skip_errors=True)
+        for name, full_path, tree in batch.walk(plugins_dir, ('.nasl', '.inc')):
+            with batch.stage('KBKeys'):
+                index.add_file(name, tree, includes)
+
+        logger.info("%s produced and %s consumed patterns of keys" %
+                    (len(index.produced), len(index.consumed)))
+        return index
+
+    def _matching(self, table_name, pattern):
+        """Return set of files of patterns of table which intersect pattern"""
+        table = getattr(self, table_name)
+        index = self._indexes.get(table_name)
+        if index is None:
+            index = self._indexes[table_name] = _PatternIndex(table)
+        result = set()
+        for other in index.matching(pattern):
+            result.update(table[other])
+        return result
+
+    def producers_of(self, pattern):
+        """Return set of files which can produce key matching pattern"""
+        return self._matching('produced', pattern)
+
+    def consumers_of(self, pattern):
+        """Return set of files which can read key matching pattern"""
+        return self._matching('consumed', pattern)
+
+    def unsatisfiable(self, external=()):
+        """Return dictionary plugin name => sorted list of its required keys
+        which are never produced. Such plugins are never run
+
+        @param external: patterns of keys which are set by scanner itself or
+            by binary plugins, e.g. 'Host/*' or 'Services/*'
+        """
+        result = {}
+        for name, patterns in self.required.iteritems():
+            missing = sorted(pattern for pattern in patterns
+                             if not self.producers_of(pattern) and
+                             not any(patterns_intersect(pattern, other) for other in external))
+            if missing:
+                result[name] = missing
+        return result
+
+    def dependency_graph(self):
+        """Return pynasl.visitors.callgraph.dependencies.DependencyGraph in
+        which every plugin depends on plugins which produce keys it reads or
+        requires. Keys produced in *.inc files don't give dependencies
+        """
+        from pynasl.visitors.callgraph.dependencies import DependencyGraph
+
+        dependencies = dict((name, set()) for files in self.produced.itervalues()
+                            for name in files if name.endswith('.nasl'))
+        for pattern, consumers in self.consumed.iteritems():
+            producers = set(name for name in self.producers_of(pattern)
+                            if name.endswith('.nasl'))
+            if not producers:
+                continue
+            for consumer in consumers:
+                if consumer.endswith('.nasl'):
+                    dependencies.setdefault(consumer, set()).update(producers - set([consumer]))
+        return DependencyGraph(dict((name, sorted(producers))
+                                    for name, producers in dependencies.iteritems()))
+
+
+def _log_keys(plugins_dir):
+    index = KBKeyIndex.from_feed(plugins_dir)
+    for name, patterns in sorted(index.unsatisfiable().iteritems()):
+        logger.info("%s requires keys which are never produced: %s" % (name, ', '.join(patterns)))
+    for level, plugins in enumerate(index.dependency_graph().schedule()):
+        logger.info("Level %s: %s plugins" % (level, len(plugins)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_keys(os.environ['KAFTI_NASLSCRIPTS_PATH'])
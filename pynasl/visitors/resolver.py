@@ -0,0 +1,337 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Symbol table and scope resolution of nasl scripts.
+
+Every variable reference (VarName, ArrayElem) and function call (FuncCall) is
+bound to Symbol of its declaration. Bindings are stored in side table keyed by
+id of node, so analyses look them up in O(1) without walking tree again:
+
+    resolution = resolve(tree)
+    symbol = resolution.lookup(node)
+
+Rules follow nasl interpreter. Functions are global and can be called before
+declaration. In function a name is local if it is an argument, is declared with
+local_var or is assigned in function and isn't global. Global names are names
+declared with global_var and names assigned outside of functions. Unknown
+names (predefined constants like TRUE or description) are implicit globals.
+
+Side tables are keyed by node identity, so tree must not be changed after
+resolution (apply pynasl.visitors.constfold before) and trees interned in
+pynasl.hashcons.HashConsArena can't be resolved.
+"""
+
+import os
+import logging
+from collections import OrderedDict
+
+from pynasl.naslAST import BaseNodeVisitor, ArgDeclList, VarName, ArrayElem, GlobalVar
+from pynasl.includes import IncludeCache, IncludeEntry, include_closure
+
+
+logger = logging.getLogger("resolver")
+logger.setLevel(logging.INFO)
+
+
+# kinds of symbols
+ARG = 'arg'
+LOCAL = 'local'
+GLOBAL = 'global'
+FUNCTION = 'function'
+
+
+class Symbol(object):
+    """Declaration of variable or function
+
+    @ivar name: name of variable or function
+    @ivar kind: ARG, LOCAL, GLOBAL or FUNCTION
+    @ivar decl: declaring node (FuncDecl for functions and arguments, LocalVar,
+        GlobalVar or the first assignment for implicit variables), None for
+        unknown globals
+    @ivar file_name: name of file with declaration, None for resolved script
+    @ivar implicit: True for variables without declaration
+    @ivar values: list of expressions assigned to variable with '='
+    """
+    __slots__ = ['name', 'kind', 'decl', 'file_name', 'implicit', 'values']
+
+    def __init__(self, name, kind, decl=None, file_name=None, implicit=False):
+        self.name = name
+        self.kind = kind
+        self.decl = decl
+        self.file_name = file_name
+        self.implicit = implicit
+        self.values = []
+
+    def __repr__(self):
+        return "Symbol(%s %s)" % (self.kind, self.name)
+
+
+def _decl_names(args):
+    """Names in LocalVar, GlobalVar or FuncDecl arguments"""
+    if isinstance(args, ArgDeclList):
+        return args.args
+    return []
+
+
+def _lvalue_name(node):
+    if isinstance(node, VarName):
+        return node.value
+    elif isinstance(node, ArrayElem):
+        return node.name
+    return None
+
+
+class DeclarationsCollector(BaseNodeVisitor):
+    """Collects functions, globals, includes and names assigned in functions.
+    It doesn't bind references, so it is used for include files too (see
+    pynasl.includes.IncludeEntry)
+
+    @ivar functions: dictionary name => the first FuncDecl
+    @ivar globals: dictionary name => declaring node of global variable
+    @ivar includes: list of names of included files in order of include()
+    @ivar values: dictionary name => expressions assigned to global variable
+        with '=' outside of functions
+    """
+
+    def __init__(self):
+        self.functions = {}
+        self.globals = {}
+        self.includes = []
+        self.values = {}
+        # function name => {name => declaring node}
+        self.declared = {}
+        # function name => {name => the first assigning node}
+        self.assigned = {}
+        self.func_name = None
+
+    def _assign(self, name, node):
+        if name is None:
+            return
+        if self.func_name is None:
+            self.globals.setdefault(name, node)
+        else:
+            self.assigned[self.func_name].setdefault(name, node)
+
+    def visit_FuncDecl(self, node):
+        self.functions.setdefault(node.name, node)
+        self.declared[node.name] = dict((name, node) for name in _decl_names(node.args))
+        self.assigned[node.name] = {}
+
+        prev_func_name = self.func_name
+        self.func_name = node.name
+        self.generic_visit(node)
+        self.func_name = prev_func_name
+
+    def visit_LocalVar(self, node):
+        if self.func_name is not None:
+            for name in _decl_names(node.value):
+                self.declared[self.func_name].setdefault(name, node)
+
+    def visit_GlobalVar(self, node):
+        for name in _decl_names(node.value):
+            self.globals.setdefault(name, node)
+
+    def visit_Include(self, node):
+        self.includes.append(node.filename[1:-1])
+
+    def visit_Affectation(self, node):
+        self._assign(_lvalue_name(node.lvalue), node)
+        if self.func_name is None and node.operation == '=' and isinstance(node.lvalue, VarName):
+            self.values.setdefault(node.lvalue.value, []).append(node.expr)
+        self.generic_visit(node)
+
+    def visit_PreIncr(self, node):
+        self._assign(_lvalue_name(node.value), node)
+        self.generic_visit(node)
+
+    visit_PostIncr = visit_PreIncr
+
+    def visit_ForeachLoop(self, node):
+        self._assign(node.element.value, node)
+        self.generic_visit(node)
+
+
+class Resolution(object):
+    """Result of resolution of script
+
+    @ivar tree: resolved AST
+    @ivar functions: dictionary name => Symbol of functions of script and its includes
+    @ivar globals: dictionary name => Symbol of global variables
+    @ivar locals: dictionary function name => dictionary name => Symbol of its
+        arguments and local variables
+    @ivar includes: list of names of included files (transitively) in order of loading
+    @ivar unresolved_calls: set of names of called functions without declaration
+        (builtin functions or functions from include files that weren't loaded)
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.functions = {}
+        self.globals = {}
+        self.locals = {}
+        self.includes = []
+        self.unresolved_calls = set()
+        self._refs = {}
+
+    def lookup(self, node):
+        """Return Symbol for VarName, ArrayElem or FuncCall node or None"""
+        return self._refs.get(id(node))
+
+    def __len__(self):
+        return len(self._refs)
+
+
+class _Binder(BaseNodeVisitor):
+    """Binds references to symbols"""
+
+    def __init__(self, resolution, assigned):
+        self.resolution = resolution
+        self.assigned = assigned
+        self.func_name = None
+
+    def _variable(self, name):
+        resolution = self.resolution
+        if self.func_name is not None:
+            scope = resolution.locals[self.func_name]
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+            # implicit globals created by earlier references (decl is None)
+            # don't make assigned name global, so result doesn't depend on
+            # order of statements
+            symbol = resolution.globals.get(name)
+            if symbol is not None and symbol.decl is not None:
+                return symbol
+            first = self.assigned[self.func_name].get(name)
+            if first is not None:
+                symbol = scope[name] = Symbol(name, LOCAL, first, implicit=True)
+                return symbol
+        symbol = resolution.globals.get(name)
+        if symbol is None:
+            symbol = resolution.globals[name] = Symbol(name, GLOBAL, implicit=True)
+        return symbol
+
+    def visit_VarName(self, node):
+        self.resolution._refs[id(node)] = self._variable(node.value)
+
+    def visit_ArrayElem(self, node):
+        self.resolution._refs[id(node)] = self._variable(node.name)
+        self.generic_visit(node)
+
+    def visit_Affectation(self, node):
+        self.generic_visit(node)
+        if node.operation == '=' and isinstance(node.lvalue, VarName):
+            self.resolution._refs[id(node.lvalue)].values.append(node.expr)
+
+    def visit_FuncCall(self, node):
+        symbol = self.resolution.functions.get(node.name)
+        if symbol is None:
+            self.resolution.unresolved_calls.add(node.name)
+        else:
+            self.resolution._refs[id(node)] = symbol
+        self.generic_visit(node)
+
+    def visit_FuncDecl(self, node):
+        prev_func_name = self.func_name
+        self.func_name = node.name
+        self.generic_visit(node)
+        self.func_name = prev_func_name
+
+
+def _global_symbol(name, decl, file_name=None):
+    return Symbol(name, GLOBAL, decl, file_name, implicit=not isinstance(decl, GlobalVar))
+
+
+def _load_includes(resolution, names, includes):
+    """Add functions and globals from include files, included files are
+    loaded transitively, every file only once.
+    """
+    if isinstance(includes, IncludeCache):
+        entries = includes.closure(names)
+    else:
+        def get_entry(name):
+            tree = includes(name)
+            if tree is None:
+                logger.debug("Include file %s isn't found" % name)
+                return None
+            return IncludeEntry(name, None, tree)
+
+        entries = include_closure(names, get_entry)
+
+    for entry in entries:
+        resolution.includes.append(entry.name)
+        for func_name, decl in entry.functions.iteritems():
+            resolution.functions.setdefault(func_name, Symbol(func_name, FUNCTION, decl, entry.name))
+        for var_name, decl in entry.globals.iteritems():
+            symbol = resolution.globals.setdefault(var_name, _global_symbol(var_name, decl, entry.name))
+            symbol.values.extend(entry.values.get(var_name, ()))
+
+
+def _resolve(tree, includes):
+    resolution = Resolution(tree)
+    collector = DeclarationsCollector()
+    collector.visit(tree)
+
+    for name, decl in collector.functions.iteritems():
+        resolution.functions[name] = Symbol(name, FUNCTION, decl)
+    for name, decl in collector.globals.iteritems():
+        resolution.globals[name] = _global_symbol(name, decl)
+    for func_name, declared in collector.declared.iteritems():
+        scope = resolution.locals[func_name] = {}
+        for name, decl in declared.iteritems():
+            kind = ARG if decl is collector.functions.get(func_name) else LOCAL
+            scope[name] = Symbol(name, kind, decl)
+
+    if includes is not None:
+        _load_includes(resolution, collector.includes, includes)
+
+    _Binder(resolution, collector.assigned).visit(tree)
+    return resolution
+
+
+_CACHE_SIZE = 32
+# (id of tree, id of includes) => (tree, includes, Resolution), trees are
+# referenced by cache, so their ids aren't reused while they are cached
+_cache = OrderedDict()
+
+
+def resolve(tree, includes=None):
+    """Resolve all references in tree. Results for the last resolved trees are
+    cached, so analyses of the same tree share one resolution.
+
+    @param tree: AST of script
+    @param includes: pynasl.includes.IncludeCache or function which takes name
+        of include file and returns its AST or None. Default value - None, that
+        means includes aren't loaded
+    @return Resolution
+    """
+    key = (id(tree), id(includes))
+    cached = _cache.pop(key, None)
+    if cached is None:
+        cached = (tree, includes, _resolve(tree, includes))
+    _cache[key] = cached
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return cached[2]
+
+
+def _log_resolution(file_name):
+    from pynasl.naslparse import naslparser
+
+    includes = IncludeCache([os.path.dirname(file_name)])
+    resolution = resolve(naslparser(file_name, True), includes)
+    logger.info("%s references resolved" % len(resolution))
+    logger.info("Includes: %s" % resolution.includes)
+    logger.info("Globals: %s" % sorted(resolution.globals))
+    for func_name, scope in sorted(resolution.locals.iteritems()):
+        logger.info("Locals of %s: %s" % (func_name, sorted(scope)))
+    logger.info("Unresolved calls: %s" % sorted(resolution.unresolved_calls))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_resolution(os.path.join(os.environ['KAFTI_NASLSCRIPTS_PATH'], "http_version.nasl"))
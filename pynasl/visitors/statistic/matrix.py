@@ -0,0 +1,226 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Sparse matrix files x functions with numbers of calls.
+
+Matrix is kept in compressed sparse row (CSR) format in three NumPy arrays:
+entries of row i (file) are indices[indptr[i]:indptr[i + 1]] (functions)
+and data[indptr[i]:indptr[i + 1]] (numbers of calls). It is saved to
+directory as *.npy files, which are loaded memory-mapped, so even matrix of
+the whole feed is opened instantly:
+
+    matrix = UsageMatrix.from_statistic(stat)
+    matrix.save('matrix')
+    matrix = UsageMatrix.load('matrix')
+    matrix.similar_files('http_version.nasl', 5)
+"""
+
+import os
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger("matrix")
+logger.setLevel(logging.INFO)
+
+
+_ARRAYS = ('indptr', 'indices', 'data')
+
+
+def _write_names(file_name, names):
+    with open(file_name, 'w') as names_file:
+        for name in names:
+            names_file.write(name + '\n')
+
+
+def _read_names(file_name):
+    with open(file_name) as names_file:
+        return [line.rstrip('\n') for line in names_file]
+
+
+def _top(values, limit, names):
+    """Return list of (name, value) for limit greatest non-zero values, ties
+    are ordered by index
+    """
+    order = np.lexsort((np.arange(len(values)), -values))
+    return [(names[i], values[i].item()) for i in order[:limit] if values[i]]
+
+
+class UsageMatrix(object):
+    """Sparse matrix files x functions in CSR format
+
+    @ivar files: list of file names, index in list is row of file
+    @ivar functions: list of function names, index in list is column of function
+    @ivar indptr: array of int64, entries of row i are in range indptr[i]:indptr[i + 1]
+    @ivar indices: array of int32 with columns of entries, sorted in every row
+    @ivar data: array of int32 with numbers of calls
+    """
+
+    def __init__(self, files, functions, indptr, indices, data):
+        self.files = files
+        self.functions = functions
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self._file_rows = None
+        self._function_columns = None
+
+    @property
+    def shape(self):
+        return (len(self.files), len(self.functions))
+
+    @property
+    def nnz(self):
+        """Number of stored entries"""
+        return len(self.data)
+
+    @classmethod
+    def from_statistic(cls, stat, table='FuncCall_dict'):
+        """Build matrix from table of NaslStatistic
+
+        @param table: name of table with Counters of file ids, e.g.
+            'FuncCall_dict' or 'FuncDecl_nasl_dict'
+        """
+        counts = getattr(stat, table)
+        analysed = stat.analysed_files()
+        files = [name for file_id, name in analysed]
+        functions = sorted(counts)
+
+        # file id of statistic => row
+        rows = np.full(len(stat.file_names), -1, dtype=np.int64)
+        rows[[file_id for file_id, name in analysed]] = np.arange(len(analysed))
+
+        size = sum(len(file_counts) for file_counts in counts.itervalues())
+        entry_rows = np.empty(size, dtype=np.int64)
+        indices = np.empty(size, dtype=np.int32)
+        data = np.empty(size, dtype=np.int32)
+        start = 0
+        for column, name in enumerate(functions):
+            file_counts = counts[name]
+            end = start + len(file_counts)
+            entry_rows[start:end] = np.fromiter(file_counts.iterkeys(), np.int64, len(file_counts))
+            data[start:end] = np.fromiter(file_counts.itervalues(), np.int32, len(file_counts))
+            indices[start:end] = column
+            start = end
+
+        entry_rows = rows[entry_rows]
+        order = np.lexsort((indices, entry_rows))
+        indptr = np.zeros(len(files) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_rows, minlength=len(files)), out=indptr[1:])
+        return cls(files, functions, indptr, indices[order], data[order])
+
+    def save(self, directory):
+        """Save matrix to directory, it is created if it doesn't exist"""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+        _write_names(os.path.join(directory, 'files.txt'), self.files)
+        _write_names(os.path.join(directory, 'functions.txt'), self.functions)
+        logger.info("Matrix %sx%s with %s entries is saved to %s"
+                    % (self.shape + (self.nnz, directory)))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load matrix saved with save()
+
+        @param mmap: True, that means arrays are memory-mapped read only
+        """
+        mmap_mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in _ARRAYS]
+        return cls(_read_names(os.path.join(directory, 'files.txt')),
+                   _read_names(os.path.join(directory, 'functions.txt')), *arrays)
+
+    def file_row(self, file_name):
+        if self._file_rows is None:
+            self._file_rows = dict((name, row) for row, name in enumerate(self.files))
+        return self._file_rows[file_name]
+
+    def function_column(self, function):
+        if self._function_columns is None:
+            self._function_columns = dict((name, column)
+                                          for column, name in enumerate(self.functions))
+        return self._function_columns[function]
+
+    def _entry_rows(self):
+        """Return array with row of every entry"""
+        return np.repeat(np.arange(len(self.files)), np.diff(self.indptr))
+
+    def row(self, file_name):
+        """Return dictionary function => number of calls in file"""
+        row = self.file_row(file_name)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return dict((self.functions[column], count.item()) for column, count in
+                    zip(self.indices[start:end], self.data[start:end]))
+
+    def function_frequencies(self):
+        """Return array with total number of calls of every function"""
+        return np.bincount(self.indices, weights=self.data,
+                           minlength=len(self.functions)).astype(np.int64)
+
+    def document_frequencies(self):
+        """Return array with number of files which call every function"""
+        return np.bincount(self.indices, minlength=len(self.functions))
+
+    def file_totals(self):
+        """Return array with total number of calls in every file"""
+        sums = np.zeros(len(self.data) + 1, dtype=np.int64)
+        np.cumsum(self.data, out=sums[1:])
+        return sums[self.indptr[1:]] - sums[self.indptr[:-1]]
+
+    def most_called(self, limit=10):
+        """Return list of (function, number of calls) for limit most called functions"""
+        return _top(self.function_frequencies(), limit, self.functions)
+
+    def cooccurrence(self, function, limit=10):
+        """Return list of (function, number of files) for limit functions which
+        are called in the same files as function most often
+        """
+        column = self.function_column(function)
+        entry_rows = self._entry_rows()
+        files = np.zeros(len(self.files), dtype=bool)
+        files[entry_rows[self.indices == column]] = True
+        counts = np.bincount(self.indices[files[entry_rows]], minlength=len(self.functions))
+        counts[column] = 0
+        return _top(counts, limit, self.functions)
+
+    def similar_files(self, file_name, limit=10):
+        """Return list of (file name, cosine similarity) for limit files with
+        most similar vectors of function calls
+        """
+        row = self.file_row(file_name)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        vector = np.zeros(len(self.functions))
+        vector[self.indices[start:end]] = self.data[start:end]
+
+        entry_rows = self._entry_rows()
+        data = self.data.astype(np.float64)
+        dots = np.bincount(entry_rows, weights=data * vector[self.indices],
+                           minlength=len(self.files))
+        norms = np.sqrt(np.bincount(entry_rows, weights=data * data,
+                                    minlength=len(self.files)))
+        norms *= norms[row]
+        similarity = np.zeros(len(self.files))
+        np.divide(dots, norms, out=similarity, where=norms > 0)
+        similarity[row] = 0
+        return _top(similarity, limit, self.files)
+
+
+def _log_matrix(directory):
+    matrix = UsageMatrix.load(directory)
+    logger.info("Matrix %sx%s with %s entries" % (matrix.shape + (matrix.nnz,)))
+    for name, count in matrix.most_called(20):
+        logger.info("%s: %s" % (name, count))
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_matrix(sys.argv[1])
@@ -14,7 +14,8 @@ import shutil
 import logging
 from collections import defaultdict
 
-from pynasl.naslAST import BaseNodeVisitor
+from pynasl.naslAST import BaseNodeVisitor, Atom, VarName
+from pynasl.visitors.resolver import resolve
 from pynasl.visitors.statistic.statistic import write_func_dict_to_csv
 
 
@@ -23,34 +24,37 @@ logger.setLevel(logging.INFO)
 
 
 class FamilyGetter(BaseNodeVisitor):
-    def __init__(self):
-        self.variables = {}
+    def __init__(self, resolution=None):
+        """
+        @param resolution: pynasl.visitors.resolver.Resolution of visited tree,
+            it is used for script_family(var). Default value - None, that means
+            only string literals are recognized
+        """
+        self.resolution = resolution
         self.family_name = None
         
     def visit_FuncCall(self, node):
         self.generic_visit(node)
         if node.name == "script_family":
-            self.family_name = node.args_list.args[0].value.value
-            if self.family_name in self.variables:
-                self.family_name  = self.variables[self.family_name]
-            
-    def visit_Affectation(self, node):
-        self.generic_visit(node)
-        str_lvalue = node.lvalue.value
-        str_expr = node.expr.value
-        if node.operation == "=":
-            self.variables[str_lvalue] = str_expr
+            value = node.args_list.args[0].value
+            if isinstance(value, VarName) and self.resolution is not None:
+                symbol = self.resolution.lookup(value)
+                if symbol is not None and len(symbol.values) == 1:
+                    value = symbol.values[0]
+            if isinstance(value, Atom):
+                self.family_name = value.value
 
 
-def _log_family(plugins_dir, categorize_path=None):
+def _log_family(plugins_dir, categorize_path=None, hooks=None):
     """logger script_family
     
     @param plugins_dir: string with path to directory with nasl scripts.
     @param categorize_path: string with path to directory
         to which nasl scripts will be categorized.
         Default value - None, that means not categorize nasl scripts.
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
     """
-    from pynasl.naslparse import naslparser
+    from pynasl.batch import BatchParser
     
     scripts_family = defaultdict(list)
     strange_family = []
@@ -62,34 +66,28 @@ def _log_family(plugins_dir, categorize_path=None):
             shutil.rmtree(categorize_path)
         
     logger.info('Files processing started')
-    total_files = 0
-    for root, dirs, files in os.walk(plugins_dir):
-        for name in files:
-            if not name.endswith('.nasl'):
-                continue
-            
-            family = FamilyGetter()
-            full_path = os.path.join(root, name)
-            family.visit(naslparser(full_path, True))
+    batch = BatchParser(hooks=hooks)
+    for name, full_path, tree in batch.walk(plugins_dir, ('.nasl',)):
+        with batch.stage('Resolver'):
+            resolution = resolve(tree)
+        family = FamilyGetter(resolution)
+        with batch.stage('FamilyGetter'):
+            family.visit(tree)
+        
+        if not family.family_name:
+            strange_family.append(name)
+        else:
+            family_name = family.family_name[1:-1].replace(':','')
+            scripts_family[family_name].append(name)
             
-            if not family.family_name:
-                strange_family.append(name)
-            else:
-                family_name = family.family_name[1:-1].replace(':','')
-                scripts_family[family_name].append(name)
-                
-                if categorize_path:
-                    dst = os.path.join(categorize_path, family_name)
-                    try:
-                        if not os.path.exists(dst):
-                            os.makedirs(dst)
-                        shutil.copy(full_path, dst)
-                    except OSError, why:
-                        logger.error(str(why))
-
-            total_files += 1
-            if total_files % 1000 == 0:
-                logger.info("Processed %s files" % total_files)
+            if categorize_path:
+                dst = os.path.join(categorize_path, family_name)
+                try:
+                    if not os.path.exists(dst):
+                        os.makedirs(dst)
+                    shutil.copy(full_path, dst)
+                except OSError, why:
+                    logger.error(str(why))
     logger.info('Files processing finished')
                             
     write_func_dict_to_csv(scripts_family, "scripts_family.csv")
@@ -0,0 +1,198 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""SQLite storage of nasl functions statistic.
+
+Statistic collected by NaslStatistic is written to normalized tables, so it
+can be queried with SQL:
+
+    db = StatisticDB('statistic.db')
+    db.write(stat)
+    db.top_callers('http_get')
+    db.unused_declarations('inc')
+"""
+
+import os
+import sqlite3
+import logging
+
+
+logger = logging.getLogger("statdb")
+logger.setLevel(logging.INFO)
+
+
+_TABLES = """
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS functions;
+DROP TABLE IF EXISTS calls;
+DROP TABLE IF EXISTS declarations;
+DROP TABLE IF EXISTS includes;
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE TABLE functions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE calls (
+    function_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE declarations (
+    function_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE includes (
+    included TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
+# indexes are created after bulk insert, it is faster than updating them
+_INDEXES = """
+CREATE UNIQUE INDEX files_name ON files (name);
+CREATE INDEX files_base_name ON files (base_name);
+CREATE INDEX files_kind ON files (kind);
+CREATE UNIQUE INDEX functions_name ON functions (name);
+CREATE UNIQUE INDEX calls_function ON calls (function_id, file_id);
+CREATE INDEX calls_file ON calls (file_id);
+CREATE UNIQUE INDEX declarations_function ON declarations (function_id, file_id);
+CREATE INDEX declarations_file ON declarations (file_id);
+CREATE INDEX includes_included ON includes (included);
+CREATE INDEX includes_file ON includes (file_id);
+"""
+
+
+def _statements(script):
+    return [statement for statement in script.split(';') if statement.strip()]
+
+
+def _file_kind(file_name):
+    return 'inc' if file_name.endswith('.inc') else 'nasl'
+
+
+class StatisticDB(object):
+    """SQLite database with statistic"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.text_factory = str
+        # transactions are controlled explicitly, otherwise sqlite3 module
+        # commits pending transaction before every DROP and CREATE
+        self._conn.isolation_level = None
+
+    def close(self):
+        self._conn.close()
+
+    def write(self, stat):
+        """Replace content of database with NaslStatistic stat. Tables are
+        created, rows are inserted and indexes are built after that in one
+        transaction, so database keeps previous content if writing fails
+        """
+        conn = self._conn
+        function_ids = {}
+        for table in (stat.FuncCall_dict, stat.FuncDecl_dict):
+            for name in table:
+                function_ids.setdefault(name, len(function_ids))
+
+        conn.execute("BEGIN")
+        try:
+            for statement in _statements(_TABLES):
+                conn.execute(statement)
+            conn.executemany("INSERT INTO files (id, name, base_name, kind) VALUES (?, ?, ?, ?)",
+                             ((file_id, name, os.path.basename(name), _file_kind(name))
+                              for file_id, name in stat.analysed_files()))
+            conn.executemany("INSERT INTO functions (id, name) VALUES (?, ?)",
+                             ((func_id, name) for name, func_id in function_ids.iteritems()))
+            for table_name, table in (('calls', stat.FuncCall_dict),
+                                      ('declarations', stat.FuncDecl_dict)):
+                conn.executemany("INSERT INTO %s (function_id, file_id, count) "
+                                 "VALUES (?, ?, ?)" % table_name,
+                                 ((function_ids[name], file_id, count)
+                                  for name, files in table.iteritems()
+                                  for file_id, count in files.iteritems()))
+            for table in (stat.Include_nasl_dict, stat.Include_inc_dict):
+                conn.executemany("INSERT INTO includes (included, file_id, count) "
+                                 "VALUES (?, ?, ?)",
+                                 ((name, file_id, count)
+                                  for name, files in table.iteritems()
+                                  for file_id, count in files.iteritems()))
+            for statement in _statements(_INDEXES):
+                conn.execute(statement)
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+        logger.info("Statistic is written to %s" % self.db_path)
+
+    def query(self, sql, params=()):
+        """Return list of rows of any SQL query"""
+        return self._conn.execute(sql, params).fetchall()
+
+    def top_callers(self, function, limit=10):
+        """Return list of (file name, number of calls) of files that call
+        function most often
+        """
+        return self.query("SELECT files.name, calls.count FROM calls "
+                          "JOIN functions ON functions.id = calls.function_id "
+                          "JOIN files ON files.id = calls.file_id "
+                          "WHERE functions.name = ? "
+                          "ORDER BY calls.count DESC, files.name LIMIT ?", (function, limit))
+
+    def most_called(self, limit=10, kind=None):
+        """Return list of (function name, number of calls, number of files)
+
+        @param kind: 'nasl' or 'inc', that means only calls in files of this kind
+            are counted. Default value - None, that means all files
+        """
+        where = ''
+        params = ()
+        if kind is not None:
+            where = "WHERE calls.file_id IN (SELECT id FROM files WHERE kind = ?) "
+            params = (kind,)
+        return self.query("SELECT functions.name, SUM(calls.count), COUNT(*) FROM calls "
+                          "JOIN functions ON functions.id = calls.function_id " + where +
+                          "GROUP BY calls.function_id "
+                          "ORDER BY SUM(calls.count) DESC, functions.name LIMIT ?",
+                          params + (limit,))
+
+    def unused_declarations(self, kind=None):
+        """Return sorted list of (function name, file name) of functions declared
+        in files of kind ('nasl' or 'inc', None for all files) and never called
+        """
+        where = ''
+        params = ()
+        if kind is not None:
+            where = "AND files.kind = ? "
+            params = (kind,)
+        return self.query("SELECT functions.name, files.name FROM declarations "
+                          "JOIN functions ON functions.id = declarations.function_id "
+                          "JOIN files ON files.id = declarations.file_id "
+                          "WHERE NOT EXISTS (SELECT 1 FROM calls "
+                          "WHERE calls.function_id = declarations.function_id) " + where +
+                          "ORDER BY functions.name, files.name", params)
+
+    def unused_includes(self):
+        """Return sorted list of names of *.inc files which aren't included anywhere"""
+        return [row[0] for row in
+                self.query("SELECT name FROM files WHERE kind = 'inc' AND NOT EXISTS "
+                           "(SELECT 1 FROM includes WHERE included = files.base_name) "
+                           "ORDER BY name")]
+
+    def includers(self, include_name):
+        """Return sorted list of names of files which include include_name"""
+        return [row[0] for row in
+                self.query("SELECT files.name FROM includes "
+                           "JOIN files ON files.id = includes.file_id "
+                           "WHERE included = ? ORDER BY files.name", (include_name,))]
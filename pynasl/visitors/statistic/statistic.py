@@ -9,7 +9,7 @@
 import os
 import logging
 import csv
-from collections import defaultdict
+from collections import Counter
 
 from pynasl.naslAST import BaseNodeVisitor
 
@@ -28,6 +28,15 @@ _detailed_stat_file = {}
 class NaslStatistic(BaseNodeVisitor):
     """Visitor for collecting nasl functions statistics
     
+    Every table is dictionary name => Counter with number of occurrences of name
+    in every file, files are identified by interned ids (see file_names).
+    Files are named by paths relative to plugins directory, so scripts with the
+    same name in different subdirectories are different files.
+    Contribution of every file is kept, so file can be removed or analysed
+    again without recalculation of the whole statistic, and statistics of
+    different parts of scripts (e.g. collected by different workers) can be
+    merged.
+    
     @ivar FuncCall_nasl_dict: function's calls in *.nasl files
     @ivar FuncCall_inc_dict: function's calls in *.inc files
     @ivar FuncDecl_nasl_dict: function's declarations in *.nasl files
@@ -36,6 +45,7 @@ class NaslStatistic(BaseNodeVisitor):
     @ivar Include_inc_dict: include functions in *.inc files
     @ivar FuncCall_dict: function's calls in all files
     @ivar FuncDecl_dict: function's declarations in all files
+    @ivar file_names: list of relative paths of files, index in list is id of file
     @ivar internal_nasl_func_calls: internal nasl language function's calls in *.nasl files
     @ivar unused_decl_nasl: unused function's declarations in *.nasl files
     @ivar internal_func_calls: total internal nasl language function's calls
@@ -44,126 +54,214 @@ class NaslStatistic(BaseNodeVisitor):
     """
     
     def __init__(self):
-        self.FuncCall_nasl_dict = defaultdict(list)
-        self.FuncCall_inc_dict = defaultdict(list)
+        self.FuncCall_nasl_dict = {}
+        self.FuncCall_inc_dict = {}
         
-        self.FuncDecl_nasl_dict = defaultdict(list)
-        self.FuncDecl_inc_dict = defaultdict(list)
+        self.FuncDecl_nasl_dict = {}
+        self.FuncDecl_inc_dict = {}
 
-        self.Include_nasl_dict = defaultdict(list)
-        self.Include_inc_dict = defaultdict(list)
+        self.Include_nasl_dict = {}
+        self.Include_inc_dict = {}
 
-        self.FuncCall_dict = defaultdict(list)
-        self.FuncDecl_dict = defaultdict(list)
+        self.FuncCall_dict = {}
+        self.FuncDecl_dict = {}
+        
+        self.file_names = []
+        self._file_ids = {}
+        # file id => {table name => Counter name => count} for analysed files
+        self._contributions = {}
         
         self.file_name = None
-        self.inc_list = []
+        self._file_id = None
         
         self.internal_nasl_func_calls = {}
-        self.unused_decl_nasl = {}
+        self.unused_decl_nasl = []
         self.internal_func_calls = {}
         self.unused_decl_inc = []
         self.unused_inc = []
     
+    @property
+    def inc_list(self):
+        """Analysed *.inc files"""
+        return [self.file_names[file_id] for file_id in self._contributions
+                if self.file_names[file_id].endswith('.inc')]
+    
+    def file_id(self, file_name):
+        """Return interned id of file"""
+        file_id = self._file_ids.get(file_name)
+        if file_id is None:
+            file_id = self._file_ids[file_name] = len(self.file_names)
+            self.file_names.append(file_name)
+        return file_id
+    
+    def analysed_files(self):
+        """Return sorted list of (file id, file name) of analysed files"""
+        return [(file_id, self.file_names[file_id]) for file_id in sorted(self._contributions)]
+    
     def preprocess_file(self, file_name):
+        """Start analysis of file. Results of previous analysis of file are removed"""
+        self.remove_file(file_name)
         self.file_name = file_name
-
-        if file_name.endswith('.inc'):
-            self.inc_list.append(file_name)
+        self._file_id = self.file_id(file_name)
+        self._contributions[self._file_id] = {}
+    
+    def remove_file(self, file_name):
+        """Remove results of analysis of file from statistic"""
+        file_id = self._file_ids.get(file_name)
+        contribution = self._contributions.pop(file_id, None)
+        if contribution is None:
+            return
+        for table_name, counts in contribution.iteritems():
+            table = getattr(self, table_name)
+            for name in counts:
+                files = table[name]
+                del files[file_id]
+                if not files:
+                    del table[name]
+    
+    def _add(self, table_name, name, file_id, count=1):
+        files = getattr(self, table_name).setdefault(name, Counter())
+        files[file_id] += count
+        self._contributions[file_id].setdefault(table_name, Counter())[name] += count
+    
+    def merge(self, other):
+        """Add results of other statistic. Files analysed in both statistics
+        are taken from other.
+        """
+        for other_id, contribution in other._contributions.iteritems():
+            file_name = other.file_names[other_id]
+            self.remove_file(file_name)
+            file_id = self.file_id(file_name)
+            self._contributions[file_id] = {}
+            for table_name, counts in contribution.iteritems():
+                for name, count in counts.iteritems():
+                    self._add(table_name, name, file_id, count)
         
     def visit_FuncCall(self, node):
-        self._add_to_nasl_or_inc_dict(node.name, self.FuncCall_nasl_dict, self.FuncCall_inc_dict)
-        self.FuncCall_dict[node.name].append(self.file_name)
+        self._add_to_nasl_or_inc_dict(node.name, 'FuncCall_nasl_dict', 'FuncCall_inc_dict')
+        self._add('FuncCall_dict', node.name, self._file_id)
         self.generic_visit(node)
         
     def visit_FuncDecl(self, node):
-        self._add_to_nasl_or_inc_dict(node.name, self.FuncDecl_nasl_dict, self.FuncDecl_inc_dict)
-        self.FuncDecl_dict[node.name].append(self.file_name)
+        self._add_to_nasl_or_inc_dict(node.name, 'FuncDecl_nasl_dict', 'FuncDecl_inc_dict')
+        self._add('FuncDecl_dict', node.name, self._file_id)
         self.generic_visit(node)
 
     def visit_Include(self, node):
-        self._add_to_nasl_or_inc_dict(node.filename[1:-1], self.Include_nasl_dict, self.Include_inc_dict)
+        self._add_to_nasl_or_inc_dict(node.filename[1:-1], 'Include_nasl_dict', 'Include_inc_dict')
         self.generic_visit(node)
     
     def _add_to_nasl_or_inc_dict(self, node_name, nasl_dict, inc_dict):
         if self.file_name.endswith('.nasl'):
-            nasl_dict[node_name].append(self.file_name)
+            self._add(nasl_dict, node_name, self._file_id)
         else:
-            inc_dict[node_name].append(self.file_name)
-    
-    def _cut_decl_function(self, funcDecl_dict, funcCall_dict):
-        unused_func = []
-        
-        for func_name_Decl in funcDecl_dict.keys():
-            if func_name_Decl in funcCall_dict.keys():
-                del funcCall_dict[func_name_Decl]
-            else:
-                unused_func.append(func_name_Decl)
-                
-        return unused_func
+            self._add(inc_dict, node_name, self._file_id)
 
     def finalize_calculations(self):
-        self.internal_nasl_func_calls = self.FuncCall_nasl_dict.copy()
-        self.unused_decl_nasl = self._cut_decl_function(self.FuncDecl_nasl_dict, self.internal_nasl_func_calls)
-        self._cut_decl_function(self.FuncDecl_inc_dict, self.internal_nasl_func_calls)
+        """Calculate derived statistic, it can be called again after changes"""
+        self.internal_nasl_func_calls = dict(
+            (name, files) for name, files in self.FuncCall_nasl_dict.iteritems()
+            if name not in self.FuncDecl_nasl_dict and name not in self.FuncDecl_inc_dict)
+        self.unused_decl_nasl = [func for func in self.FuncDecl_nasl_dict
+                                 if func not in self.FuncCall_nasl_dict]
         
-        self.internal_func_calls = self.FuncCall_dict.copy()
-        self._cut_decl_function(self.FuncDecl_dict, self.internal_func_calls)
+        self.internal_func_calls = dict(
+            (name, files) for name, files in self.FuncCall_dict.iteritems()
+            if name not in self.FuncDecl_dict)
         
         self.unused_decl_inc = [func for func in self.FuncDecl_inc_dict
                                 if func not in self.FuncCall_nasl_dict and func not in self.FuncCall_inc_dict]
     
+        # include() takes name of file without directory
         self.unused_inc = [inc for inc in self.inc_list
-                           if inc not in self.Include_nasl_dict and inc not in self.Include_inc_dict]
+                           if os.path.basename(inc) not in self.Include_nasl_dict and
+                           os.path.basename(inc) not in self.Include_inc_dict]
 
 
-def create_statistic(plugins_dir):
-    from pynasl.naslparse import naslparser
+def collect_statistic(plugins_dir, budget=None, hooks=None):
+    """Return NaslStatistic for nasl scripts in plugins_dir
+    
+    @param plugins_dir: string with path to nasl scripts
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    """
+    from pynasl.batch import BatchParser
     
     stat = NaslStatistic()
     
     logger.info('Files processing started')
-    total_files = 0
-    for root,dirs,files in os.walk(plugins_dir):
-        for name in files:
-            if name.endswith(('.nasl', '.inc')):
-                stat.preprocess_file(name)
-                fullname = os.path.join(root, name)
-                stat.visit(naslparser(fullname, True))
-
-            total_files += 1
-            if total_files % 1000 == 0:
-                logger.info("Processed %s files" % total_files)
+    batch = BatchParser(budget, hooks=hooks)
+    for name, fullname, tree in batch.walk(plugins_dir, ('.nasl', '.inc')):
+        stat.preprocess_file(os.path.relpath(fullname, plugins_dir))
+        with batch.stage('NaslStatistic'):
+            stat.visit(tree)
     logger.info('Files processing finished')
     
     stat.finalize_calculations()
+    return stat
+
+
+def create_statistic(plugins_dir, budget=None, hooks=None, sqlite_path=None, matrix_dir=None):
+    """Collect statistic for nasl scripts and write it to output_dir
+    
+    @param plugins_dir: string with path to nasl scripts
+    @param budget: pynasl.batch.Budget with per-file limits, files over budget are skipped
+    @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+    @param sqlite_path: string with path to SQLite database, statistic is written
+        to it too (see pynasl.visitors.statistic.statdb). Default value - None,
+        that means database isn't written
+    @param matrix_dir: string with path to directory, sparse matrix files x
+        called functions is saved to it (see pynasl.visitors.statistic.matrix).
+        Default value - None, that means matrix isn't saved
+    """
+    stat = collect_statistic(plugins_dir, budget, hooks)
 
     _write_detailed_statistic(stat)
     
     _write_main_statistic(stat, 'statistic.txt')
+    
+    if sqlite_path:
+        from pynasl.visitors.statistic.statdb import StatisticDB
+        
+        db = StatisticDB(sqlite_path)
+        db.write(stat)
+        db.close()
+    
+    if matrix_dir:
+        from pynasl.visitors.statistic.matrix import UsageMatrix
+        
+        UsageMatrix.from_statistic(stat).save(matrix_dir)
 
 
-def write_func_dict_to_csv(func_dict, stat_file_name):
+def write_func_dict_to_csv(func_dict, stat_file_name, file_names=None):
+    """Write dictionary name => list of files or name => Counter of file ids
+    (with list of file names for ids in file_names) to csv file in output_dir
+    """
     with open(os.path.join(output_dir, stat_file_name), "w") as stat_file:
         writer = csv.writer(stat_file, delimiter=';', quoting=csv.QUOTE_NONE, lineterminator='\n')
         writer.writerow( ('Function name', 'Count', 'Files name') )
-        for func_name in func_dict.keys():
-            writer.writerow( (func_name, len(func_dict[func_name]), func_dict[func_name]) )
+        for func_name, files in func_dict.iteritems():
+            if isinstance(files, Counter):
+                count = sum(files.itervalues())
+                files = [file_names[file_id] for file_id in sorted(files)]
+            else:
+                count = len(files)
+            writer.writerow( (func_name, count, files) )
 
     _detailed_stat_file[id(func_dict)] = stat_file_name
             
 
 def _write_detailed_statistic(stat):
-    write_func_dict_to_csv(stat.FuncDecl_nasl_dict, "stat_decl_function_nasl.csv")
-    write_func_dict_to_csv(stat.FuncDecl_inc_dict, "stat_decl_function_inc.csv")
-    write_func_dict_to_csv(stat.FuncDecl_dict, "stat_all_decl.csv")
-    write_func_dict_to_csv(stat.FuncCall_nasl_dict, "stat_call_function_nasl.csv")
-    write_func_dict_to_csv(stat.FuncCall_inc_dict, "stat_call_function_inc.csv")
-    write_func_dict_to_csv(stat.FuncCall_dict, "stat_all_call.csv")
-    write_func_dict_to_csv(stat.Include_nasl_dict, "stat_include_nasl.csv")
-    write_func_dict_to_csv(stat.Include_inc_dict, "stat_include_inc.csv")
-    write_func_dict_to_csv(stat.internal_nasl_func_calls, "stat_call_function_nasl_internal.csv")   
-    write_func_dict_to_csv(stat.internal_func_calls, "stat_internal.csv")
+    write_func_dict_to_csv(stat.FuncDecl_nasl_dict, "stat_decl_function_nasl.csv", stat.file_names)
+    write_func_dict_to_csv(stat.FuncDecl_inc_dict, "stat_decl_function_inc.csv", stat.file_names)
+    write_func_dict_to_csv(stat.FuncDecl_dict, "stat_all_decl.csv", stat.file_names)
+    write_func_dict_to_csv(stat.FuncCall_nasl_dict, "stat_call_function_nasl.csv", stat.file_names)
+    write_func_dict_to_csv(stat.FuncCall_inc_dict, "stat_call_function_inc.csv", stat.file_names)
+    write_func_dict_to_csv(stat.FuncCall_dict, "stat_all_call.csv", stat.file_names)
+    write_func_dict_to_csv(stat.Include_nasl_dict, "stat_include_nasl.csv", stat.file_names)
+    write_func_dict_to_csv(stat.Include_inc_dict, "stat_include_inc.csv", stat.file_names)
+    write_func_dict_to_csv(stat.internal_nasl_func_calls, "stat_call_function_nasl_internal.csv", stat.file_names)   
+    write_func_dict_to_csv(stat.internal_func_calls, "stat_internal.csv", stat.file_names)
     
 
 def _write_main_statistic(stat, file_name):
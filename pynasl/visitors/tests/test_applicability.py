@@ -0,0 +1,46 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Applicability index tests"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.constfold import fold_constants
+from pynasl.visitors.applicability import ApplicabilityIndex, _RequirementsCollector, UNKNOWN
+
+
+class Test(unittest.TestCase):
+
+    def test_collector(self):
+        collector = _RequirementsCollector()
+        collector.visit(fold_constants(naslparse_string(
+            'if (description) { script_require_ports("Services/" + "www", 80); '
+            'script_require_keys("www/apache"); script_exclude_keys(key); }')))
+        self.assertEqual(collector.requirements, {'ports': ['Services/www', 80],
+                                                  'keys': ['www/apache'],
+                                                  'exclude_keys': [UNKNOWN]})
+
+    def test_applicable(self):
+        index = ApplicabilityIndex({
+            'any.nasl': {},
+            'www.nasl': {'ports': ('Services/www', 80)},
+            'apache.nasl': {'ports': (80,), 'keys': ('www/apache', 'www/banner')},
+            'snmp.nasl': {'udp_ports': (161,)},
+            'not_win.nasl': {'exclude_keys': ('Host/windows',)},
+            'unknown.nasl': {'ports': (UNKNOWN,), 'keys': (UNKNOWN,)},
+        })
+        self.assertEqual(index.applicable(), ['any.nasl', 'not_win.nasl', 'unknown.nasl'])
+        self.assertEqual(index.applicable([8080], ['Services/www', 'Host/windows']),
+                         ['any.nasl', 'unknown.nasl', 'www.nasl'])
+        self.assertEqual(index.applicable([80], ['www/apache', 'www/banner'], [161]),
+                         ['any.nasl', 'apache.nasl', 'not_win.nasl', 'snmp.nasl',
+                          'unknown.nasl', 'www.nasl'])
+        self.assertEqual(index.applicable([80], ['www/apache']),
+                         ['any.nasl', 'not_win.nasl', 'unknown.nasl', 'www.nasl'])
+
+
+if __name__ == "__main__":
+    unittest.main()
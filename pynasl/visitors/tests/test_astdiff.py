@@ -0,0 +1,56 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""AST diff tests"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.astdiff import diff_trees, MAIN
+
+
+OLD = """
+function f(x) { return g(x); }
+function h() { return 1; }
+x = f(1);
+display(x);
+"""
+
+NEW = """
+# new comment
+function f(x) { return g(x) + g(2); }
+function k() { return 1; }
+x = f(1);
+display(x);
+display(2);
+"""
+
+
+class Test(unittest.TestCase):
+
+    def test_formatting(self):
+        diff = diff_trees(naslparse_string(OLD),
+                          naslparse_string(OLD.replace('\n', '\n\n  # comment\n')))
+        self.assertFalse(diff.changed)
+
+    def test_changes(self):
+        diff = diff_trees(naslparse_string(OLD), naslparse_string(NEW))
+        self.assertTrue(diff.changed)
+        self.assertEqual(diff.added_functions, ['k'])
+        self.assertEqual(diff.removed_functions, ['h'])
+        self.assertEqual(diff.modified_functions, ['f'])
+        self.assertEqual(diff.added_statements, 1)
+        self.assertEqual(diff.removed_statements, 0)
+        self.assertEqual(diff.added_calls, [(MAIN, 'display', 1), ('f', 'g', 1)])
+        self.assertEqual(diff.removed_calls, [])
+
+    def test_reverse(self):
+        diff = diff_trees(naslparse_string(NEW), naslparse_string(OLD))
+        self.assertEqual(diff.removed_statements, 1)
+        self.assertEqual(diff.removed_calls, [(MAIN, 'display', 1), ('f', 'g', 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Streaming dumpers tests"""
+
+import unittest
+import json
+from StringIO import StringIO
+
+from pynasl.naslparse import naslparse_string
+from pynasl.benchmarks.generator import ScriptGenerator
+from pynasl.visitors.astdump import dump_text, dump_jsonl
+
+
+SCRIPT = """
+x = [1, 2]; ;
+if (a) b(); else ;
+if (a) { b(port:1, "s"); } else { c = 'q' + 2; }
+repeat i++; until i > 3;
+foreach k (l) { continue; }
+for (i = 0; i < 10; i++) break;
+while (!a) --y;
+global_var g;
+function f(a, b) { local_var c; return; }
+a[1] = 1.2.3.4;
+z = -a;
+f() x 3;
+include("http_func.inc");
+"""
+
+
+class Test(unittest.TestCase):
+
+    def check_text(self, script):
+        tree = naslparse_string(script)
+        out = StringIO()
+        dump_text(tree, out)
+        self.assertEqual(out.getvalue(), repr(tree))
+
+    def test_text_same_as_repr(self):
+        self.check_text(SCRIPT)
+
+    def test_text_same_as_repr_generated(self):
+        generator = ScriptGenerator(seed=1, statements=20)
+        for name, script in generator.corpus(5, 2):
+            self.check_text(script)
+
+    def test_jsonl(self):
+        out = StringIO()
+        dump_jsonl(naslparse_string('port = get_http_port(default:80);'), out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        
+        self.assertEqual([record['type'] for record in records],
+                         ['InstrList', 'Affectation', 'VarName', 'FuncCall',
+                          'ArgList', 'ArgAttribute', 'Atom'])
+        self.assertEqual(records[3]['name'], 'get_http_port')
+        self.assertEqual(records[3]['parent'], 1)
+        self.assertEqual(records[3]['field'], 'expr')
+        self.assertEqual(records[5]['att_name'], 'default')
+
+    def test_jsonl_not_utf8(self):
+        out = StringIO()
+        dump_jsonl(naslparse_string('x = "caf\xe9"; y = "\xd0\xb0";'), out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record['value'].encode('latin-1') for record in records
+                          if record['type'] == 'Atom'],
+                         ['"caf\xe9"', '"\xd0\xb0"'])
+
+
+if __name__ == "__main__":
+    unittest.main()
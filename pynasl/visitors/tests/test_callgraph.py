@@ -0,0 +1,170 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Call graph tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.callgraph.callgraph import CallGraph, generate_graph
+from pynasl.visitors.callgraph.compact import CompactCallGraph
+from pynasl.visitors.callgraph.cache import CallGraphCache
+from pynasl.visitors.callgraph.trees import generate_call_trees
+from pynasl.visitors.callgraph.reachability import ReachabilityIndex
+from pynasl.visitors.callgraph.dependencies import DependencyGraph, _DependenciesCollector
+
+
+SCRIPTS = [
+    ('a.inc', 'function a_f() { return b_f(); } function b_f() { return display(1); }'),
+    ('first.nasl', 'script_dependencies("second.nasl"); a_f(); a_f();'),
+    ('second.nasl', 'function c_f() { a_f(); } c_f();'),
+]
+
+
+def _graph(scripts):
+    call_graph = CallGraph()
+    for name, source in scripts:
+        call_graph.set_caller_func(name)
+        call_graph.set_file_name(name)
+        call_graph.visit(naslparse_string(source))
+    return call_graph.g
+
+
+class Test(unittest.TestCase):
+
+    def test_graph(self):
+        graph = _graph(SCRIPTS)
+        self.assertEqual(graph.number_of_edges(), 6)
+        self.assertEqual(sorted(graph.successors('first.nasl')), ['a_f', 'second.nasl'])
+        self.assertEqual(sorted(graph.predecessors('a_f')), ['c_f', 'first.nasl'])
+        self.assertEqual(graph.file_names[graph.node_id('c_f')], 'second.nasl')
+
+    def test_bfs_and_subgraph(self):
+        graph = _graph(SCRIPTS)
+        self.assertEqual(graph.bfs(['second.nasl']), ['second.nasl', 'c_f', 'a_f', 'b_f', 'display'])
+        self.assertEqual(sorted(graph.bfs(['b_f'], reverse=True)),
+                         ['a_f', 'b_f', 'c_f', 'first.nasl', 'second.nasl'])
+        self.assertTrue(graph.reachable('first.nasl', 'display'))
+        self.assertFalse(graph.reachable('a_f', 'c_f'))
+
+        subgraph = graph.subgraph(['c_f', 'a_f', 'second.nasl'])
+        self.assertEqual(sorted(subgraph.edges()),
+                         [('c_f', 'a_f'), ('second.nasl', 'c_f')])
+        self.assertEqual(subgraph.file_names, ['second.nasl', 'a.inc', None])
+
+    def test_incremental_edges(self):
+        graph = CompactCallGraph()
+        graph.add_edge('a', 'b')
+        self.assertEqual(graph.successors('a'), ['b'])
+        graph.add_edge('a', 'c')
+        graph.add_edge('a', 'b')
+        self.assertEqual(graph.successors('a'), ['b', 'c'])
+        self.assertEqual(graph.number_of_edges(), 2)
+
+    def test_cache(self):
+        plugins_dir = tempfile.mkdtemp()
+        try:
+            for name, source in SCRIPTS:
+                with open(os.path.join(plugins_dir, name), 'w') as script:
+                    script.write(source)
+            cache_file = os.path.join(plugins_dir, 'graph.cache')
+            cache = CallGraphCache()
+            self.assertEqual(len(cache.update(plugins_dir)), 3)
+            cache.save(cache_file)
+            self.assertEqual(sorted(cache.graph().edges()), sorted(_graph(SCRIPTS).edges()))
+
+            with open(os.path.join(plugins_dir, 'second.nasl'), 'w') as script:
+                script.write('display(4);')
+            os.remove(os.path.join(plugins_dir, 'first.nasl'))
+            cache = CallGraphCache.load(cache_file)
+            self.assertEqual(cache.update(plugins_dir), set(['first.nasl', 'second.nasl']))
+            graph = cache.graph()
+            self.assertEqual(sorted(graph.edges()), [('a_f', 'b_f'), ('b_f', 'display'),
+                                                     ('second.nasl', 'display')])
+            self.assertEqual(graph.file_names[graph.node_id('a_f')], 'a.inc')
+        finally:
+            shutil.rmtree(plugins_dir)
+
+    def test_trees(self):
+        plugins_dir = tempfile.mkdtemp()
+        try:
+            for name, source in SCRIPTS:
+                with open(os.path.join(plugins_dir, name), 'w') as script:
+                    script.write(source)
+            # syntax error is printed and the rest of script is parsed
+            with open(os.path.join(plugins_dir, 'broken.nasl'), 'w') as script:
+                script.write('a_f(); } c_f();')
+            trees = generate_call_trees(['first.nasl', 'second.nasl', 'broken.nasl',
+                                         'missing.nasl'], plugins_dir)
+            self.assertEqual(sorted(trees), ['broken.nasl', 'first.nasl', 'second.nasl'])
+            self.assertTrue('c_f' in trees['broken.nasl'])
+            for name, tree in trees.iteritems():
+                graph = generate_graph(plugins_dir, name)
+                expected = graph.subgraph(graph.bfs([name]))
+                self.assertEqual(tree.names, expected.names)
+                self.assertEqual(tree.file_names, expected.file_names)
+                self.assertEqual(sorted(tree.edges()), sorted(expected.edges()))
+        finally:
+            shutil.rmtree(plugins_dir)
+
+    def test_reachability(self):
+        graph = _graph(SCRIPTS)
+        # recursion makes a_f and b_f one component
+        graph.add_edge('b_f', 'a_f')
+        index = ReachabilityIndex(graph)
+        self.assertEqual(index.component[graph.node_id('a_f')],
+                         index.component[graph.node_id('b_f')])
+        self.assertTrue(index.reaches('first.nasl', 'display'))
+        self.assertTrue(index.reaches('b_f', 'a_f'))
+        self.assertFalse(index.reaches('a_f', 'c_f'))
+        self.assertFalse(index.reaches('a_f', 'unknown_f'))
+        self.assertEqual(index.callees('second.nasl'), set(['c_f', 'a_f', 'b_f', 'display']))
+        self.assertEqual(index.callers('a_f'),
+                         set(['b_f', 'c_f', 'first.nasl', 'second.nasl']))
+        self.assertEqual(index.impact(['display']), set(['first.nasl', 'second.nasl']))
+        for name in graph:
+            self.assertEqual(index.callees(name), set(graph.bfs([name])[1:]) - set([name]))
+            self.assertEqual(index.callers(name),
+                             set(graph.bfs([name], reverse=True)[1:]) - set([name]))
+
+    def test_reachability_size(self):
+        # plugins with own leaves: bitsets don't grow with number of components
+        graph = CompactCallGraph()
+        for i in xrange(1000):
+            graph.add_edge('%s.nasl' % i, 'f%s' % i)
+        index = ReachabilityIndex(graph)
+        self.assertEqual(len(index.components), 2000)
+        for bitsets in (index._descendants, index._ancestors):
+            self.assertEqual(sum(1 for offset, bitset in bitsets if bitset), 1000)
+            self.assertEqual(sum(bitset.bit_length() for offset, bitset in bitsets), 1000)
+        self.assertTrue(index.reaches('5.nasl', '5.nasl'))
+        self.assertEqual(index.callees('5.nasl'), set(['f5']))
+        self.assertEqual(index.callers('f5'), set(['5.nasl']))
+
+    def test_dependencies(self):
+        collector = _DependenciesCollector()
+        collector.visit(naslparse_string('if (description) { '
+                                         'script_dependencies("a.nasl", \'b.nasl\', x); }'))
+        self.assertEqual(collector.dependencies, ['a.nasl', 'b.nasl'])
+
+        graph = DependencyGraph({'a.nasl': (),
+                                 'b.nasl': ('a.nasl',),
+                                 'c.nasl': ('a.nasl', 'find_service.nes'),
+                                 'd.nasl': ('b.nasl', 'e.nasl'),
+                                 'e.nasl': ('d.nasl',),
+                                 'f.nasl': ('f.nasl',)})
+        self.assertEqual(graph.cycles(), [['d.nasl', 'e.nasl'], ['f.nasl']])
+        self.assertEqual(graph.missing(), {'find_service.nes': set(['c.nasl'])})
+        self.assertEqual(graph.schedule(),
+                         [['a.nasl', 'f.nasl'], ['b.nasl', 'c.nasl'], ['d.nasl', 'e.nasl']])
+        self.assertEqual(graph.schedule({'c.nasl': 5, 'f.nasl': 10}),
+                         [['f.nasl', 'a.nasl'], ['c.nasl', 'b.nasl'], ['d.nasl', 'e.nasl']])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Constant folding tests"""
+
+import unittest
+
+from pynasl.naslAST import Atom, Expression, NaryExpression, VarName, structural_hash
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.constfold import fold_constants
+
+
+class Test(unittest.TestCase):
+
+    def fold_expr(self, expr):
+        tree = fold_constants(naslparse_string("x = %s;" % expr))
+        return tree.elems[0].expr
+
+    def test_strings(self):
+        self.assertEqual(self.fold_expr('"a" + "b" + "c"'), Atom('"abc"'))
+        self.assertEqual(self.fold_expr("'a\\n' + 'b'"), Atom("'a\\nb'"))
+        # different string types aren't folded
+        self.assertEqual(self.fold_expr('"a" + \'b\''),
+                         Expression(Atom('"a"'), '+', Atom("'b'")))
+
+    def test_integers(self):
+        self.assertEqual(self.fold_expr('2 * 3 + 4'), Atom('10'))
+        self.assertEqual(self.fold_expr('7 / 2'), Atom('3'))
+        self.assertEqual(self.fold_expr('7 % 0'), Expression(Atom('7'), '%', Atom('0')))
+        self.assertEqual(self.fold_expr('1 - 2'), Expression(Atom('1'), '-', Atom('2')))
+
+    def test_flattening(self):
+        self.assertEqual(self.fold_expr('"a" + "b" + v + "c" + 1 + 2'),
+                         NaryExpression('+', [Atom('"ab"'), VarName('v'), Atom('"c"'),
+                                              Atom('1'), Atom('2')]))
+        self.assertEqual(self.fold_expr('a || b || c'),
+                         NaryExpression('||', [VarName('a'), VarName('b'), VarName('c')]))
+        # right operand in parentheses isn't flattened
+        self.assertEqual(self.fold_expr('v + (1 + 2)'),
+                         Expression(VarName('v'), '+', Atom('3')))
+
+    def test_hashed_tree(self):
+        # cached hashes of changed nodes and their ancestors are dropped
+        tree = naslparse_string('if (a) { x = "a" + "b"; } y = 1;')
+        expected = naslparse_string('if (a) { x = "ab"; } y = 1;')
+        structural_hash(tree)
+        unchanged = tree.elems[1]
+        tree = fold_constants(tree)
+        self.assertEqual(structural_hash(tree), structural_hash(expected))
+        self.assertEqual(tree, expected)
+        self.assertEqual(hash(tree), hash(expected))
+        self.assertTrue(hasattr(unchanged, '_hash'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Near-duplicate detection tests"""
+
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.fingerprint import Fingerprinter, minhash, similarity, LSHIndex
+
+
+STATEMENTS = ['x%s = f%s(%s);' % (i, i, i) for i in range(20)]
+
+
+def _signature(source, num_perm=64):
+    fingerprinter = Fingerprinter()
+    fingerprinter.visit(naslparse_string(source))
+    return minhash(fingerprinter.shingles, num_perm)
+
+
+class Test(unittest.TestCase):
+
+    def test_minhash(self):
+        self.assertEqual(minhash(set()), None)
+        self.assertEqual(_signature('if (description) { script_id(1); exit(0); }'), None)
+
+        # one shingle fills one bin, other bins are densified from it
+        signature = minhash(set([12345]), 8)
+        self.assertEqual(len(signature), 8)
+        self.assertEqual(len(set(signature)), 8)
+        self.assertEqual(signature, minhash(set([12345]), 8))
+        self.assertEqual(similarity(signature, signature), 1.0)
+        self.assertNotEqual(signature, minhash(set([54321]), 8))
+
+    def test_bands(self):
+        self.assertRaises(ValueError, LSHIndex, 64, 10)
+        index = LSHIndex(8, 4)
+        index.add('a.nasl', tuple(range(8)))
+        self.assertEqual(sorted(index.buckets),
+                         [(0, 0, 1), (1, 2, 3), (2, 4, 5), (3, 6, 7)])
+
+    def test_clusters(self):
+        # b is similar to a and c, but a and c aren't similar to each other
+        index = LSHIndex(4, 4)
+        index.add('a.nasl', (1, 2, 3, 4))
+        index.add('b.nasl', (1, 2, 3, 5))
+        index.add('c.nasl', (9, 2, 3, 5))
+        index.add('d.nasl', (6, 7, 8, 0))
+        self.assertEqual(index.clusters(0.75), [['a.nasl', 'b.nasl', 'c.nasl']])
+        self.assertEqual(index.clusters(1.0), [])
+
+    def test_near_duplicates(self):
+        changed = STATEMENTS[:]
+        changed[10] = 'display(x10);'
+        sources = [('original.nasl', ' '.join(STATEMENTS)),
+                   ('copy.nasl', 'if (description) { script_id(2); exit(0); } ' +
+                    ' '.join(STATEMENTS)),
+                   ('changed.nasl', ' '.join(changed)),
+                   ('other.nasl', 'foreach p (ports) { if (get_port_state(p)) display(p); }')]
+        index = LSHIndex()
+        for name, source in sources:
+            index.add(name, _signature(source))
+        self.assertEqual(similarity(index.signatures[0], index.signatures[1]), 1.0)
+        self.assertTrue(similarity(index.signatures[0], index.signatures[2]) > 0.6)
+        self.assertTrue(similarity(index.signatures[0], index.signatures[3]) < 0.2)
+        self.assertEqual(index.clusters(0.6), [['original.nasl', 'copy.nasl', 'changed.nasl']])
+
+
+if __name__ == "__main__":
+    unittest.main()
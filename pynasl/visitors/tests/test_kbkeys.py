@@ -0,0 +1,113 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Knowledge base keys index tests"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.hashcons import HashConsArena
+from pynasl.visitors.kbkeys import KBKeyIndex, patterns_intersect
+
+
+SCRIPTS = [
+    ('apache_detect.nasl',
+     'port = get_http_port(default:80); name = "Apache"; '
+     'if (x) name = "Apache2"; '
+     'set_kb_item(name:"www/" + port + "/" + name, value:TRUE); '
+     'set_kb_item(name:string("www/banner/", 80), value:b);'),
+    ('apache_vuln.nasl',
+     'if (description) { script_require_keys("www/80/Apache"); } '
+     'banner = get_kb_item("www/banner/80");'),
+    ('iis_vuln.nasl',
+     'if (description) { script_require_keys("www/80/IIS", "Host/OS"); }'),
+    ('loop.nasl',
+     'k = "a"; k = k + "b"; foreach p (ports) replace_kb_item(name:"x/" + p + k, value:1);'),
+]
+
+
+def _index(scripts):
+    index = KBKeyIndex()
+    for name, source in scripts:
+        index.add_file(name, naslparse_string(source))
+    return index
+
+
+class Test(unittest.TestCase):
+
+    def test_intersect(self):
+        self.assertTrue(patterns_intersect('www/*/Apache', 'www/80/Apache'))
+        self.assertTrue(patterns_intersect('www/*/Apache', 'www/80/*'))
+        self.assertTrue(patterns_intersect('*/a', 'b/*'))
+        self.assertFalse(patterns_intersect('www/*/Apache', 'www/80/IIS'))
+        self.assertFalse(patterns_intersect('a*b', 'a*c'))
+
+    def test_patterns(self):
+        index = _index(SCRIPTS)
+        self.assertEqual(sorted(index.produced),
+                         ['www/*/Apache', 'www/*/Apache2', 'www/banner/80', 'x/*a', 'x/*b'])
+        self.assertEqual(index.producers_of('www/80/Apache'), set(['apache_detect.nasl']))
+        self.assertEqual(index.producers_of('www/*'), set(['apache_detect.nasl']))
+        self.assertEqual(index.consumers_of('www/*'), set(['apache_vuln.nasl', 'iis_vuln.nasl']))
+
+    def test_unsatisfiable_and_order(self):
+        index = _index(SCRIPTS)
+        self.assertEqual(index.unsatisfiable(), {'iis_vuln.nasl': ['Host/OS', 'www/80/IIS']})
+        self.assertEqual(index.unsatisfiable(external=['Host/*']),
+                         {'iis_vuln.nasl': ['www/80/IIS']})
+        self.assertEqual(index.dependency_graph().schedule(),
+                         [['apache_detect.nasl', 'loop.nasl'], ['apache_vuln.nasl']])
+
+    def test_unknown_producer(self):
+        # key of get_key() can be any key, including required one
+        index = _index([('a.nasl', 'k = get_key(); set_kb_item(name:k, value:1);'),
+                        ('b.nasl', 'if (description) { script_require_keys("foo/bar"); }')])
+        self.assertEqual(index.unsatisfiable(), {})
+        self.assertEqual(index.producers_of('foo/bar'), set(['a.nasl']))
+        self.assertEqual(index.dependency_graph().schedule(), [['a.nasl'], ['b.nasl']])
+
+    def test_local_key_variable(self):
+        # global reference before function doesn't make k of function global
+        index = _index([('c.nasl', 'display(k); function f() { k = "c/d"; '
+                                   'set_kb_item(name:k, value:1); } f();')])
+        self.assertEqual(sorted(index.produced), ['c/d'])
+
+    def test_add_file_again(self):
+        index = _index(SCRIPTS)
+        index.add_file('apache_detect.nasl', naslparse_string(
+            'set_kb_item(name:"www/80/Apache", value:TRUE);'))
+        self.assertEqual(sorted(index.produced), ['www/80/Apache', 'x/*a', 'x/*b'])
+        index.remove_file('loop.nasl')
+        self.assertEqual(sorted(index.produced), ['www/80/Apache'])
+        self.assertEqual(index.producers_of('www/*'), set(['apache_detect.nasl']))
+
+    def test_tree_isnt_changed(self):
+        arena = HashConsArena()
+        tree = naslparse_string('set_kb_item(name:"a/" + "b", value:1);', arena=arena)
+        before = repr(tree)
+        index = KBKeyIndex()
+        index.add_file('a.nasl', tree)
+        self.assertEqual(repr(tree), before)
+        self.assertEqual(sorted(index.produced), ['a/b'])
+
+    def test_feed_includes(self):
+        plugins_dir = tempfile.mkdtemp()
+        try:
+            for name, source in [('kb.inc', 'KB_PREFIX = "www/";'),
+                                 ('a.nasl', 'include("kb.inc"); '
+                                            'set_kb_item(name:KB_PREFIX + "a", value:1);')]:
+                with open(os.path.join(plugins_dir, name), 'w') as script:
+                    script.write(source)
+            index = KBKeyIndex.from_feed(plugins_dir)
+        finally:
+            shutil.rmtree(plugins_dir)
+        self.assertEqual(index.produced, {'www/a': set(['a.nasl'])})
+
+
+if __name__ == "__main__":
+    unittest.main()
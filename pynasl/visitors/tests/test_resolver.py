@@ -0,0 +1,96 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Scope resolution tests"""
+
+import unittest
+
+from pynasl.naslAST import BaseNodeVisitor
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.resolver import resolve, ARG, LOCAL, GLOBAL, FUNCTION
+
+
+SCRIPT = """
+include("a.inc");
+family = "Web";
+function f(a) {
+  local_var c;
+  global_var g;
+  c = a + family;
+  tmp = c;
+  g = tmp;
+  return inc_f(tmp) + TRUE;
+}
+y = f(a:1);
+"""
+
+INCLUDES = {
+    'a.inc': 'include("b.inc"); function inc_f(x) { return b_f(x); }',
+    'b.inc': 'include("a.inc"); function b_f(x) { return x; }',
+}
+
+
+class _References(BaseNodeVisitor):
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.refs = []
+
+    def visit_VarName(self, node):
+        symbol = self.resolution.lookup(node)
+        self.refs.append((node.value, symbol.kind, symbol.implicit))
+
+    def visit_FuncCall(self, node):
+        symbol = self.resolution.lookup(node)
+        self.refs.append((node.name, symbol.kind, symbol.file_name))
+        self.generic_visit(node)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = naslparse_string(SCRIPT)
+        self.resolution = resolve(self.tree, lambda name: naslparse_string(INCLUDES[name]))
+
+    def test_references(self):
+        refs = _References(self.resolution)
+        refs.visit(self.tree)
+        self.assertEqual(refs.refs, [
+            ('family', GLOBAL, True),
+            ('c', LOCAL, False),
+            ('a', ARG, False),
+            ('family', GLOBAL, True),
+            ('tmp', LOCAL, True),
+            ('c', LOCAL, False),
+            ('g', GLOBAL, False),
+            ('tmp', LOCAL, True),
+            ('inc_f', FUNCTION, 'a.inc'),
+            ('tmp', LOCAL, True),
+            ('TRUE', GLOBAL, True),
+            ('y', GLOBAL, True),
+            ('f', FUNCTION, None),
+        ])
+
+    def test_includes(self):
+        self.assertEqual(self.resolution.includes, ['a.inc', 'b.inc'])
+        self.assertEqual(self.resolution.functions['b_f'].file_name, 'b.inc')
+
+    def test_values(self):
+        self.assertEqual([value.value for value in self.resolution.globals['family'].values],
+                         ['"Web"'])
+
+    def test_statements_order(self):
+        for source in ('display(r); function f() { r = 1; return r; }',
+                       'function f() { r = 1; return r; } display(r);'):
+            resolution = resolve(naslparse_string(source))
+            self.assertEqual(resolution.locals['f']['r'].kind, LOCAL)
+            self.assertEqual(resolution.globals['r'].kind, GLOBAL)
+
+    def test_cache(self):
+        self.assertTrue(resolve(self.tree) is resolve(self.tree))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+# 
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+"""Functions statistic tests"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from pynasl.naslparse import naslparse_string
+from pynasl.visitors.statistic.statistic import NaslStatistic, collect_statistic
+from pynasl.visitors.statistic.statdb import StatisticDB
+from pynasl.visitors.statistic.matrix import UsageMatrix
+
+
+SCRIPTS = [
+    ('a.inc', 'function a_f() { return display(1); } function unused_f() { }'),
+    ('b.inc', 'function b_f() { return a_f(); }'),
+    ('first.nasl', 'include("a.inc"); a_f(); a_f(); display(2);'),
+    ('second.nasl', 'include("a.inc"); function local_f() { } display(3);'),
+]
+
+
+def _statistic(scripts):
+    stat = NaslStatistic()
+    for name, source in scripts:
+        stat.preprocess_file(name)
+        stat.visit(naslparse_string(source))
+    stat.finalize_calculations()
+    return stat
+
+
+def _totals(stat):
+    result = {}
+    for table in ('FuncCall_nasl_dict', 'FuncCall_inc_dict', 'FuncDecl_nasl_dict',
+                  'FuncDecl_inc_dict', 'Include_nasl_dict', 'Include_inc_dict',
+                  'FuncCall_dict', 'FuncDecl_dict'):
+        result[table] = dict((name, dict((stat.file_names[file_id], count)
+                                         for file_id, count in files.iteritems()))
+                             for name, files in getattr(stat, table).iteritems())
+    for derived in ('unused_decl_nasl', 'unused_decl_inc', 'unused_inc'):
+        result[derived] = sorted(getattr(stat, derived))
+    result['internal_func_calls'] = sorted(stat.internal_func_calls)
+    return result
+
+
+class Test(unittest.TestCase):
+
+    def test_counts(self):
+        stat = _statistic(SCRIPTS)
+        totals = _totals(stat)
+        self.assertEqual(totals['FuncCall_dict']['a_f'], {'first.nasl': 2, 'b.inc': 1})
+        self.assertEqual(totals['unused_decl_nasl'], ['local_f'])
+        self.assertEqual(totals['unused_decl_inc'], ['b_f', 'unused_f'])
+        self.assertEqual(totals['unused_inc'], ['b.inc'])
+        self.assertEqual(totals['internal_func_calls'], ['display'])
+
+    def test_merge(self):
+        stat = _statistic(SCRIPTS[:2])
+        stat.merge(_statistic(SCRIPTS[2:]))
+        stat.finalize_calculations()
+        self.assertEqual(_totals(stat), _totals(_statistic(SCRIPTS)))
+
+    def test_remove_and_reanalyse(self):
+        stat = _statistic(SCRIPTS)
+        stat.remove_file('first.nasl')
+        stat.preprocess_file('second.nasl')
+        stat.visit(naslparse_string(SCRIPTS[3][1]))
+        stat.finalize_calculations()
+        expected = _statistic(SCRIPTS[:2] + SCRIPTS[3:])
+        self.assertEqual(_totals(stat), _totals(expected))
+
+    def test_db(self):
+        stat = _statistic(SCRIPTS)
+        db = StatisticDB(':memory:')
+        db.write(stat)
+        self.assertEqual(db.top_callers('a_f'), [('first.nasl', 2), ('b.inc', 1)])
+        self.assertEqual(db.most_called(1), [('a_f', 3, 2)])
+        self.assertEqual(db.most_called(1, 'nasl'), [('a_f', 2, 1)])
+        self.assertEqual(db.unused_declarations('inc'), [('b_f', 'b.inc'), ('unused_f', 'a.inc')])
+        self.assertEqual(db.unused_declarations('nasl'), [('local_f', 'second.nasl')])
+        self.assertEqual(db.unused_includes(), ['b.inc'])
+        self.assertEqual(db.includers('a.inc'), ['first.nasl', 'second.nasl'])
+        db.close()
+
+    def test_db_failed_write(self):
+        db = StatisticDB(':memory:')
+        db.write(_statistic(SCRIPTS))
+        stat = _statistic(SCRIPTS[2:])
+        # duplicate file names break unique index, which is built at the end
+        stat.file_names[stat.file_id('second.nasl')] = 'first.nasl'
+        self.assertRaises(sqlite3.IntegrityError, db.write, stat)
+        self.assertEqual(db.top_callers('a_f'), [('first.nasl', 2), ('b.inc', 1)])
+        self.assertEqual(db.unused_includes(), ['b.inc'])
+        db.close()
+
+    def test_matrix(self):
+        directory = tempfile.mkdtemp()
+        try:
+            UsageMatrix.from_statistic(_statistic(SCRIPTS)).save(directory)
+            matrix = UsageMatrix.load(directory)
+            self.assertEqual(matrix.shape, (4, 2))
+            self.assertEqual(matrix.row('first.nasl'), {'a_f': 2, 'display': 1})
+            self.assertEqual(list(matrix.function_frequencies()), [3, 3])
+            self.assertEqual(list(matrix.document_frequencies()), [2, 3])
+            self.assertEqual(list(matrix.file_totals()), [1, 1, 3, 1])
+            self.assertEqual(matrix.cooccurrence('a_f'), [('display', 1)])
+            similar = matrix.similar_files('a.inc', 2)
+            self.assertEqual(similar[0], ('second.nasl', 1.0))
+            self.assertEqual(similar[1][0], 'first.nasl')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_same_names(self):
+        # scripts with the same name in different subdirectories
+        plugins_dir = tempfile.mkdtemp()
+        try:
+            for name, source in [(('inc', 'a.inc'), 'function a_f() { }'),
+                                 (('x', 'scan.nasl'), 'include("a.inc"); a_f();'),
+                                 (('y', 'scan.nasl'), 'display(1);')]:
+                directory = os.path.join(plugins_dir, name[0])
+                if not os.path.isdir(directory):
+                    os.mkdir(directory)
+                with open(os.path.join(directory, name[1]), 'w') as script:
+                    script.write(source)
+            stat = collect_statistic(plugins_dir)
+        finally:
+            shutil.rmtree(plugins_dir)
+        first, second = os.path.join('x', 'scan.nasl'), os.path.join('y', 'scan.nasl')
+        self.assertEqual(sorted(name for file_id, name in stat.analysed_files()),
+                         [os.path.join('inc', 'a.inc'), first, second])
+        self.assertEqual(stat.unused_inc, [])
+
+        db = StatisticDB(':memory:')
+        db.write(stat)
+        self.assertEqual(db.unused_includes(), [])
+        self.assertEqual(db.includers('a.inc'), [first])
+        db.close()
+
+        stat.remove_file(first)
+        stat.finalize_calculations()
+        self.assertEqual(_totals(stat)['FuncCall_dict'], {'display': {second: 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,293 @@
+#-------------------------------------------------------------------------------
+# Copyright (c) 2011, Kafti team
+#
+# Released under the MIT license. See the LICENSE file for details.
+#-------------------------------------------------------------------------------
+
+"""Persistent cross-reference index of function calls.
+
+Every call is stored in SQLite database with file, line, caller function and
+arguments (names of named arguments and values of literal arguments), so
+questions like "where is http_send_recv called with port:80" are answered
+without parsing:
+
+    xref = XrefIndex('xref.db')
+    xref.update(plugins_dir)
+    for call in xref.calls_with_arg('http_send_recv', 'port', '80'):
+        ...
+
+Index is updated incrementally, only added and changed files are parsed.
+"""
+
+import os
+import sqlite3
+import logging
+
+from pynasl.naslAST import BaseNodeVisitor, Arg, ArgAttribute, ArgList, Atom, IpAddr, lineno, \
+    copy_tree
+
+
+logger = logging.getLogger("xref")
+logger.setLevel(logging.INFO)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    mtime REAL,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    line INTEGER,
+    callee_id INTEGER NOT NULL,
+    caller_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS args (
+    call_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_callee ON calls (callee_id);
+CREATE INDEX IF NOT EXISTS calls_caller ON calls (caller_id);
+CREATE INDEX IF NOT EXISTS calls_file ON calls (file_id);
+CREATE INDEX IF NOT EXISTS args_call ON args (call_id);
+CREATE INDEX IF NOT EXISTS args_name ON args (name, value);
+"""
+
+_CALLS_JOIN = """
+JOIN files ON files.id = calls.file_id
+JOIN functions AS callee ON callee.id = calls.callee_id
+LEFT JOIN functions AS caller ON caller.id = calls.caller_id
+"""
+
+_CALLS_QUERY = "SELECT calls.id, files.name, calls.line, callee.name, caller.name " \
+               "FROM calls" + _CALLS_JOIN
+
+_ARGS_QUERY = "SELECT args.call_id, args.name, args.value " \
+              "FROM args JOIN calls ON calls.id = args.call_id" + _CALLS_JOIN
+
+
+class CallSite(object):
+    """Call of function
+
+    @ivar file_name: name of file with call
+    @ivar line: number of line with call (starting from 1) or None
+    @ivar callee: name of called function
+    @ivar caller: name of function with call, None for calls outside of functions
+    @ivar args: list of (name, value) of arguments. Name is None for positional
+        argument, value is None if argument isn't literal
+    """
+    __slots__ = ['file_name', 'line', 'callee', 'caller', 'args']
+
+    def __init__(self, file_name, line, callee, caller, args):
+        self.file_name = file_name
+        self.line = line
+        self.callee = callee
+        self.caller = caller
+        self.args = args
+
+    def __repr__(self):
+        return "CallSite(%s:%s %s -> %s%s)" % (self.file_name, self.line, self.caller,
+                                                self.callee, self.args)
+
+
+def _arg_value(value):
+    if isinstance(value, (Atom, IpAddr)):
+        return value.value
+    return None
+
+
+class CallSitesCollector(BaseNodeVisitor):
+    """Collects calls of functions of one script
+
+    @ivar calls: list of (line, callee, caller, args), see CallSite
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.caller_func = None
+
+    def visit_FuncDecl(self, node):
+        prev_caller_func = self.caller_func
+        self.caller_func = node.name
+        self.generic_visit(node)
+        self.caller_func = prev_caller_func
+
+    def visit_FuncCall(self, node):
+        args = []
+        if isinstance(node.args_list, ArgList):
+            for arg in node.args_list.args:
+                if isinstance(arg, ArgAttribute):
+                    args.append((arg.att_name, _arg_value(arg.value)))
+                elif isinstance(arg, Arg):
+                    args.append((None, _arg_value(arg.value)))
+        self.calls.append((lineno(node), node.name, self.caller_func, args))
+        self.generic_visit(node)
+
+
+class XrefIndex(object):
+    """Cross-reference index stored in SQLite database"""
+
+    def __init__(self, db_path):
+        """
+        @param db_path: path to database file, it is created if it doesn't exist
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.text_factory = str
+        self._conn.executescript(_SCHEMA)
+        self._load_functions()
+
+    def _load_functions(self):
+        self._functions = dict((name, func_id) for func_id, name in
+                               self._conn.execute("SELECT id, name FROM functions"))
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def _function_id(self, name):
+        if name is None:
+            return None
+        func_id = self._functions.get(name)
+        if func_id is None:
+            cursor = self._conn.execute("INSERT INTO functions (name) VALUES (?)", (name,))
+            func_id = self._functions[name] = cursor.lastrowid
+        return func_id
+
+    def remove_file(self, name):
+        conn = self._conn
+        row = conn.execute("SELECT id FROM files WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM args WHERE call_id IN "
+                     "(SELECT id FROM calls WHERE file_id = ?)", row)
+        conn.execute("DELETE FROM calls WHERE file_id = ?", row)
+        conn.execute("DELETE FROM files WHERE id = ?", row)
+
+    def add_file(self, name, tree, stat=None):
+        """Replace calls of file name with calls from tree. Changes are saved by
+        commit(). Tree isn't changed, constants are folded in its copy
+
+        @param stat: (modification time, size) of file
+        """
+        from pynasl.visitors.constfold import fold_constants
+
+        self.remove_file(name)
+        mtime, size = stat or (None, None)
+        conn = self._conn
+        file_id = conn.execute("INSERT INTO files (name, mtime, size) VALUES (?, ?, ?)",
+                               (name, mtime, size)).lastrowid
+
+        # folded "a" + "b" arguments are literals too
+        collector = CallSitesCollector()
+        if tree is not None:
+            collector.visit(fold_constants(copy_tree(tree)))
+
+        for line, callee, caller, args in collector.calls:
+            call_id = conn.execute("INSERT INTO calls (file_id, line, callee_id, caller_id) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   (file_id, line, self._function_id(callee),
+                                    self._function_id(caller))).lastrowid
+            conn.executemany("INSERT INTO args (call_id, position, name, value) "
+                             "VALUES (?, ?, ?, ?)",
+                             [(call_id, position, arg_name, value)
+                              for position, (arg_name, value) in enumerate(args)])
+
+    def update(self, plugins_dir, budget=None, hooks=None):
+        """Synchronize index with *.nasl and *.inc files in plugins_dir
+
+        @param budget: pynasl.batch.Budget with per-file limits
+        @param hooks: list of pynasl.batch.BatchHooks, e.g. pynasl.profiling.Profiler
+        @return number of parsed files
+        """
+        from pynasl.batch import update_index
+
+        indexed = dict((name, (mtime, size)) for name, mtime, size in
+                       self._conn.execute("SELECT name, mtime, size FROM files"))
+        parsed = []
+
+        def add(name, full_path, tree, stat):
+            # files that can't be parsed are indexed without calls
+            self.add_file(name, tree, stat)
+            parsed.append(name)
+
+        try:
+            with self._conn:
+                changed = update_index(plugins_dir, indexed, self.remove_file, add,
+                                       'Xref', budget, hooks)
+        except:
+            # ids of functions added in rolled back transaction are invalid
+            self._load_functions()
+            raise
+
+        logger.info("%s files changed, %s parsed" % (len(changed), len(parsed)))
+        return len(parsed)
+
+    def _query(self, where, params):
+        rows = self._conn.execute(_CALLS_QUERY + where + " ORDER BY files.name, calls.line",
+                                  params).fetchall()
+        args = dict((row[0], []) for row in rows)
+        if rows:
+            for call_id, arg_name, value in self._conn.execute(
+                    _ARGS_QUERY + where + " ORDER BY args.call_id, args.position", params):
+                args[call_id].append((arg_name, value))
+        return [CallSite(file_name, line, callee, caller, args[call_id])
+                for call_id, file_name, line, callee, caller in rows]
+
+    def calls_of(self, callee):
+        """Return list of CallSite for calls of function callee"""
+        return self._query("WHERE callee.name = ?", (callee,))
+
+    def calls_from(self, caller, file_name=None):
+        """Return list of CallSite for calls in function caller. If caller is
+        None, calls outside of functions of file_name are returned
+        """
+        if caller is None:
+            return self._query("WHERE calls.caller_id IS NULL AND files.name = ?", (file_name,))
+        if file_name is None:
+            return self._query("WHERE caller.name = ?", (caller,))
+        return self._query("WHERE caller.name = ? AND files.name = ?", (caller, file_name))
+
+    def calls_in(self, file_name):
+        """Return list of CallSite for all calls in file"""
+        return self._query("WHERE files.name = ?", (file_name,))
+
+    def calls_with_arg(self, callee, arg_name, value=None):
+        """Return list of CallSite for calls of callee with named argument
+        arg_name. If value is given, only calls where argument is literal with
+        this value (as it is written in script, e.g. '"/"' or '80') are returned
+        """
+        where = "WHERE callee.name = ? AND calls.id IN " \
+                "(SELECT call_id FROM args WHERE name = ?%s)"
+        if value is None:
+            return self._query(where % '', (callee, arg_name))
+        return self._query(where % ' AND value = ?', (callee, arg_name, value))
+
+
+def _log_xref(plugins_dir, db_path, callee):
+    xref = XrefIndex(db_path)
+    xref.update(plugins_dir)
+    calls = xref.calls_of(callee)
+    logger.info("%s calls of %s" % (len(calls), callee))
+    for call in calls[:20]:
+        logger.info("%s" % call)
+    xref.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format='%(asctime)s  %(levelname)-8s %(name)-20s %(message)s',
+                        datefmt='%H:%M:%S')
+    _log_xref(os.environ['KAFTI_NASLSCRIPTS_PATH'], 'xref.db', sys.argv[1])